@@ -5,6 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+El tablero en vivo de citas (citas/eventos/) mantiene conexiones abiertas
+y debe servirse con un servidor ASGI; con WSGI la vista responde 501.
+Con el broker predeterminado (BrokerMemoria) los eventos y sus ids viven en
+el proceso, así que el tablero exige un único worker:
+    uvicorn centro_medico.asgi:application --workers 1
+Para varios workers, TABLERO_BROKER debe apuntar a un broker compartido.
 """
 
 import os
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from django.contrib.messages import constants as messages
 
@@ -44,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir el resto de la cadena (ver pacientes/instrumentacion.py)
+    'pacientes.instrumentacion.InstrumentacionMiddleware',
+    # Lecturas de listados e informes a la réplica (si hay una configurada)
+    'pacientes.enrutador.EnrutadorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,11 +58,53 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Máximo de consultas SQL por vista (ver pacientes/presupuesto.py).
+# En desarrollo una vista que lo supere falla en lugar de degradarse en silencio.
+PRESUPUESTO_CONSULTAS = {
+    'pacientes_lista': 3,
+    'pacientes_historial': 5,
+    'medicos_lista': 3,
+    'citas_lista': 3,
+    'citas_nueva': 4,
+    'citas_editar': 5,
+    'citas_tablero': 3,
+    'consultas_lista': 3,
+    'consultas_nueva': 4,
+    'consultas_editar': 5,
+    'usuarios_lista': 3,
+    'api_lista': 4,
+    'api_detalle': 3,
+}
+
+# Filas por página en los listados paginados por cursor (pacientes/paginacion.py)
+PAGINACION_TAMANO = 50
+
+# Agenda de turnos libres (pacientes/agenda.py)
+AGENDA_HORIZONTE_DIAS = 90
+AGENDA_DURACION_TURNO_MINUTOS = 30
+
+# Recordatorios de citas (manage.py procesar_recordatorios). Enviadores
+# disponibles en pacientes/recordatorios.py: EnvioConsola, EnvioArchivo, EnvioCorreo
+RECORDATORIOS_ENVIADOR = os.environ.get('RECORDATORIOS_ENVIADOR', 'pacientes.recordatorios.EnvioConsola')
+RECORDATORIOS_GRACIA_HORAS = 2
+
+# Tablero en vivo de citas (pacientes/tablero.py). El flujo de eventos
+# necesita un servidor ASGI: uvicorn centro_medico.asgi:application
+# BrokerMemoria numera los eventos por proceso: con él, un único worker
+# (--workers 1); si no, un Last-Event-ID de otro proceso no significa nada
+TABLERO_BROKER = 'pacientes.tablero.BrokerMemoria'
+TABLERO_LATIDO_SEGUNDOS = 15
+TABLERO_HISTORIAL = 500
+
+if DEBUG:
+    MIDDLEWARE.append('pacientes.presupuesto.PresupuestoConsultasMiddleware')
+
 ROOT_URLCONF = 'centro_medico.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mide el render de cada petición (pacientes/instrumentacion.py)
+        'BACKEND': 'pacientes.instrumentacion.PlantillasMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,14 +136,71 @@ WSGI_APPLICATION = 'centro_medico.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'centro_medico',
-        'USER': 'root', 
-        'PASSWORD': 'edi200316',
-        'HOST': 'localhost',
-        'PORT': '3306',
+        'NAME': os.environ.get('DB_NAME', 'centro_medico'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'edi200316'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        # Conexiones persistentes: se reutilizan durante DB_CONN_MAX_AGE
+        # segundos y se verifican antes de reutilizarlas en cada petición
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# DB_ENGINE=sqlite usa un archivo SQLite local (pruebas de carga y benchmark
+# sin servidor MySQL: `manage.py generar_datos` y `manage.py benchmark`)
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+    }
+
+# Réplica de lectura opcional (ver pacientes/enrutador.py): DB_REPLICA_HOST
+# (MySQL) o DB_REPLICA_NAME (SQLite). Mismas credenciales que el primario.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        # En las pruebas la réplica apunta a la base de datos de prueba del primario
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['pacientes.enrutador.EnrutadorLecturas']
+REPLICA_RETRASO_SEGUNDOS = 5
+
+# Caché (datos de referencia de formularios, ver pacientes/referencias.py).
+# Por defecto en memoria del proceso; en producción se puede usar un backend
+# compartido, p. ej.:
+#   CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+#   CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache CACHE_LOCATION=/var/tmp/centro_medico_cache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'centro-medico'),
     }
 }
 
+REFERENCIAS_CACHE_TIMEOUT = 3600
+
+# Con LOG_RENDIMIENTO=DEBUG, una línea por petición con el desglose de tiempos
+# (logger 'pacientes.rendimiento'); INSTRUMENTACION_LOG = False la desactiva del todo
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'pacientes.rendimiento': {
+            'handlers': ['consola'],
+            'level': os.environ.get('LOG_RENDIMIENTO', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 
 # Password validation
@@ -147,6 +251,10 @@ MEDIA_URL = '/media/'
 # Directorio donde se guardan los archivos subidos
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Filas rechazadas de las importaciones de pacientes: tienen datos personales,
+# así que quedan fuera de MEDIA_ROOT (no se sirven) y se descargan por la vista
+IMPORTACION_RECHAZOS_DIR = BASE_DIR / 'importaciones'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,8 @@
+# Configuración para las pruebas: manage.py test --settings=centro_medico.settings_pruebas
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+# Sin réplica configurada, una espejo del primario: EnrutadorTests comprueba
+# con ella qué conexión atiende cada lectura
+if 'replica' not in DATABASES:
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
@@ -30,7 +30,15 @@ urlpatterns = [
     path('pacientes/nuevo/', views.pacientes_nuevo, name='pacientes_nuevo'),
     path('pacientes/<int:id>/editar/', views.pacientes_editar, name='pacientes_editar'),
     path('pacientes/<int:id>/eliminar/', views.pacientes_eliminar, name='pacientes_eliminar'),
+    path('pacientes/<int:id>/historial/', views.pacientes_historial, name='pacientes_historial'),
     path('pacientes/buscar/', views.pacientes_buscar, name='pacientes_buscar'),
+    path('pacientes/importar/', views.pacientes_importar, name='pacientes_importar'),
+    path('pacientes/importar/rechazos/', views.pacientes_importar_rechazos, name='pacientes_importar_rechazos'),
+    path('pacientes/exportar/', views.pacientes_exportar, name='pacientes_exportar'),
+
+    # Antigüedad de la cartera
+    path('cartera/', views.cartera_informe, name='cartera_informe'),
+    path('cartera/exportar/', views.cartera_exportar, name='cartera_exportar'),
 
     # Rutas para Médicos
     path('medicos/', views.medicos_lista, name='medicos_lista'),
@@ -43,12 +51,19 @@ urlpatterns = [
     path('citas/nueva/', views.citas_nueva, name='citas_nueva'),
     path('citas/<int:id>/editar/', views.citas_editar, name='citas_editar'),
     path('citas/cancelar/<int:cita_id>/', views.citas_cancelar, name='citas_cancelar'),
+    path('citas/lote/', views.citas_lote, name='citas_lote'),
+    path('citas/tablero/', views.citas_tablero, name='citas_tablero'),
+    path('citas/eventos/', views.citas_eventos, name='citas_eventos'),
+
+    # Agenda de turnos libres
+    path('agenda/proximos/', views.agenda_proximos_turnos, name='agenda_proximos_turnos'),
 
     # Rutas para Consultas Médicas
     path('consultas/', views.consultas_lista, name='consultas_lista'),
     path('consultas/nueva/', views.consultas_nueva, name='consultas_nueva'),
     path('consultas/<int:id>/editar/', views.consultas_editar, name='consultas_editar'),
     path('consultas/<int:id>/eliminar/', views.consultas_eliminar, name='consultas_eliminar'),
+    path('consultas/buscar/', views.consultas_buscar, name='consultas_buscar'),
 
 
     # Rutas para Usuarios
@@ -57,6 +72,19 @@ urlpatterns = [
     path('usuarios/<int:id>/editar/', views.usuarios_editar, name='usuarios_editar'),
     path('usuarios/<int:id>/eliminar/', views.usuarios_eliminar, name='usuarios_eliminar'),
 
+    # Autocompletado para los selectores de los formularios
+    path('autocompletar/pacientes/', views.autocompletar_pacientes_json, name='autocompletar_pacientes'),
+    path('autocompletar/medicos/', views.autocompletar_medicos_json, name='autocompletar_medicos'),
+    path('autocompletar/citas/', views.autocompletar_citas_json, name='autocompletar_citas'),
+    path('autocompletar/consultas/', views.autocompletar_consultas_json, name='autocompletar_consultas'),
+
+    # API JSON de solo lectura (pacientes/api.py)
+    path('api/v1/<str:recurso>/', views.api_lista, name='api_lista'),
+    path('api/v1/<str:recurso>/<int:id>/', views.api_detalle, name='api_detalle'),
+
+    # Métricas de rendimiento en formato Prometheus
+    path('metrics', views.metricas, name='metricas'),
+
     # Admin
     path('admin/', admin.site.urls),
 ]
@@ -1,5 +1,16 @@
-from django.contrib import admin
-from .models import Paciente, Medico, Cita, Consulta, Factura, Usuario, Especialidad
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from .models import Paciente, Medico, Cita, Consulta, Factura, Usuario, Especialidad, Tarifa, TareaArchivo, ParDuplicado
+from .busqueda import ids_pacientes
+from .indice_consultas import ids_consultas
+from .forms import CitaForm
+from .reservas import reservar_cita, reprogramar_cita, ConflictoDeTurno
+from .facturacion import facturar, FacturacionEnCurso
+from .citas_lote import confirmar_citas, cancelar_citas, reprogramar_citas
+from .duplicados import descartar, fusionar
+from .archivo import encolar
 
 # Personalización para especialidades
 class EspecialidadAdmin(admin.ModelAdmin):
@@ -7,29 +18,142 @@ class EspecialidadAdmin(admin.ModelAdmin):
     search_fields = ('nombre',)
     list_filter = ('nombre',)
 
+# Filtro por el saldo desnormalizado (pacientes/contadores.py), sin sumar facturas
+class SaldoPendienteFilter(admin.SimpleListFilter):
+    title = "saldo pendiente"
+    parameter_name = 'saldo'
+
+    def lookups(self, request, model_admin):
+        return [('con', "Con saldo"), ('sin', "Sin saldo")]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'con':
+            return queryset.filter(saldo_pendiente__gt=0)
+        if self.value() == 'sin':
+            return queryset.filter(saldo_pendiente=0)
+        return queryset
+
+# Médicos y pacientes se eliminan en segundo plano (pacientes/archivo.py),
+# como desde las vistas: el borrado del admin y la acción "Eliminar
+# seleccionados" solo encolan la tarea. La confirmación tampoco recorre el
+# CASCADE: lista los objetos seleccionados, no todo su historial.
+class EliminacionEnSegundoPlano:
+    tipo_archivo = None
+
+    def get_deleted_objects(self, objs, request):
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        encolar(self.tipo_archivo, obj)
+        self.message_user(request, f"{obj} y su historial se eliminarán en segundo plano.", messages.INFO)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            encolar(self.tipo_archivo, obj)
+        self.message_user(request, "Los registros seleccionados se eliminarán en segundo plano.", messages.INFO)
+
 # Personalización para pacientes
-class PacienteAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'apellido', 'documento_identidad', 'telefono', 'correo', 'fecha_nacimiento', 'fecha_registro')
+class PacienteAdmin(EliminacionEnSegundoPlano, admin.ModelAdmin):
+    tipo_archivo = 'paciente'
+    list_display = (
+        'nombre', 'apellido', 'documento_identidad', 'telefono', 'correo', 'fecha_nacimiento', 'fecha_registro',
+        'citas_total', 'ultima_visita', 'saldo_pendiente',
+    )
     search_fields = ('nombre', 'apellido', 'documento_identidad')
-    list_filter = ('fecha_registro', 'fecha_nacimiento')
+    list_filter = ('fecha_registro', 'fecha_nacimiento', 'ultima_visita', SaldoPendienteFilter)
+
+    # Usa el motor de búsqueda indexado en lugar de icontains sobre cada campo,
+    # sin el tope de resultados de la búsqueda rápida: el changelist pagina
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(id__in=ids_pacientes(search_term, limite=None)), False
 
 # Personalización para médicos
-class MedicoAdmin(admin.ModelAdmin):
+class MedicoAdmin(EliminacionEnSegundoPlano, admin.ModelAdmin):
+    tipo_archivo = 'medico'
     list_display = ('nombre', 'apellido', 'especialidad', 'telefono', 'correo')
     search_fields = ('nombre', 'apellido', 'especialidad')
     list_filter = ('especialidad',)
 
+# Página intermedia de la acción "Reprogramar citas seleccionadas"
+class ReprogramarForm(forms.Form):
+    nueva_fecha = forms.DateField(label="Nueva fecha", widget=forms.DateInput(attrs={'type': 'date'}))
+    medico = forms.ModelChoiceField(
+        label="Nuevo médico", queryset=Medico.objects.para_opciones(), required=False,
+        help_text="Vacío para mantener el médico de cada cita.",
+    )
+
 # Personalización para citas médicas
 class CitaAdmin(admin.ModelAdmin):
     list_display = ('paciente', 'medico', 'fecha', 'estado')
     search_fields = ('paciente__nombre', 'medico__nombre', 'motivo')
     list_filter = ('estado', 'fecha')
+    form = CitaForm
+    actions = ['confirmar_seleccionadas', 'cancelar_seleccionadas', 'reprogramar_seleccionadas']
+
+    # Reserva a través del motor de turnos para respetar la unicidad del horario
+    def save_model(self, request, obj, form, change):
+        if change:
+            reprogramar_cita(obj)
+        else:
+            reservar_cita(obj)
+
+    # Operaciones en lote (pacientes/citas_lote.py): un UPDATE por acción
+    @admin.action(description="Confirmar citas seleccionadas")
+    def confirmar_seleccionadas(self, request, queryset):
+        self.message_user(request, str(confirmar_citas(queryset)), messages.SUCCESS)
+
+    @admin.action(description="Cancelar citas seleccionadas")
+    def cancelar_seleccionadas(self, request, queryset):
+        self.message_user(request, str(cancelar_citas(queryset)), messages.SUCCESS)
+
+    # Pide la nueva fecha en una página intermedia y vuelve con el resultado
+    @admin.action(description="Reprogramar citas seleccionadas")
+    def reprogramar_seleccionadas(self, request, queryset):
+        form = ReprogramarForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            try:
+                resultado = reprogramar_citas(queryset, form.cleaned_data['nueva_fecha'], form.cleaned_data['medico'])
+            except ConflictoDeTurno as conflicto:
+                self.message_user(request, str(conflicto), messages.ERROR)
+            else:
+                self.message_user(request, str(resultado), messages.SUCCESS)
+            return None
+        return TemplateResponse(request, 'admin/pacientes/cita/reprogramar.html', {
+            **self.admin_site.each_context(request),
+            'title': "Reprogramar citas",
+            'form': form,
+            'citas': queryset.select_related('paciente', 'medico__especialidad'),
+            'opts': self.model._meta,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 # Personalización para consultas médicas
 class ConsultaAdmin(admin.ModelAdmin):
     list_display = ('cita', 'diagnostico', 'receta')
-    search_fields = ('cita__paciente__nombre', 'diagnostico')
+    # El texto clínico se busca en el índice invertido (ver get_search_results)
+    search_fields = ('cita__paciente__nombre', 'cita__paciente__apellido')
     list_filter = ['cita__fecha']
+    actions = ['facturar_seleccionadas']
+
+    # Nombre del paciente, como siempre, o texto clínico en el índice
+    # invertido (frases y prefijos), sin el tope de la búsqueda rápida
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        por_paciente, duplicados = super().get_search_results(request, queryset, search_term)
+        return por_paciente | queryset.filter(id__in=ids_consultas(search_term, limite=None)), duplicados
+
+    # Misma corrida que `manage.py facturar`, limitada a la selección
+    @admin.action(description="Facturar consultas seleccionadas sin factura")
+    def facturar_seleccionadas(self, request, queryset):
+        try:
+            resumen = facturar(queryset)
+        except FacturacionEnCurso as exc:
+            self.message_user(request, str(exc), messages.ERROR)
+            return
+        self.message_user(request, str(resumen), messages.SUCCESS)
 
 # Personalización para facturas
 class FacturaAdmin(admin.ModelAdmin):
@@ -37,12 +161,55 @@ class FacturaAdmin(admin.ModelAdmin):
     search_fields = ('consulta__cita__paciente__nombre', 'estado_pago')
     list_filter = ('estado_pago', 'fecha')
 
+# Tarifas de facturación por especialidad
+class TarifaAdmin(admin.ModelAdmin):
+    list_display = ('especialidad', 'precio', 'dias_vencimiento')
+    list_editable = ('precio', 'dias_vencimiento')
+
 # Personalización para usuarios del sistema
 class UsuarioAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'correo', 'rol')
     search_fields = ('nombre', 'correo', 'rol')
     list_filter = ('rol',)
 
+# Eliminaciones en segundo plano (manage.py procesar_archivo); solo lectura
+class TareaArchivoAdmin(admin.ModelAdmin):
+    list_display = ('modelo', 'descripcion', 'estado', 'etapa', 'filas', 'updated_at')
+    list_filter = ('estado', 'modelo')
+    readonly_fields = [campo.name for campo in TareaArchivo._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+# Cola de posibles pacientes duplicados (manage.py detectar_duplicados)
+class ParDuplicadoAdmin(admin.ModelAdmin):
+    list_display = ('paciente_a', 'paciente_b', 'puntaje', 'motivos', 'estado')
+    list_filter = ('estado',)
+    list_select_related = ('paciente_a', 'paciente_b')
+    ordering = ('-puntaje',)
+    readonly_fields = ('paciente_a', 'paciente_b', 'puntaje', 'motivos', 'created_at')
+    actions = ['fusionar_seleccionados', 'descartar_seleccionados']
+
+    def has_add_permission(self, request):
+        return False
+
+    # Se conserva el paciente registrado primero; los pares que ya no existen
+    # (su duplicado se fusionó en otro par de la selección) se saltan
+    @admin.action(description="Fusionar: conservar el paciente A")
+    def fusionar_seleccionados(self, request, queryset):
+        fusionados = citas = 0
+        for par_id in list(queryset.filter(estado='Pendiente').order_by('-puntaje').values_list('id', flat=True)):
+            par = ParDuplicado.objects.select_related('paciente_a', 'paciente_b').filter(id=par_id).first()
+            if par is None:
+                continue
+            citas += fusionar(par.paciente_a, par.paciente_b)
+            fusionados += 1
+        self.message_user(request, f"{fusionados} pacientes fusionados, {citas} citas reasignadas.", messages.SUCCESS)
+
+    @admin.action(description="Descartar: no son duplicados")
+    def descartar_seleccionados(self, request, queryset):
+        self.message_user(request, f"{descartar(queryset)} pares descartados.", messages.SUCCESS)
+
 # Registro de los modelos en el panel de administración
 admin.site.register(Paciente, PacienteAdmin)
 admin.site.register(Medico, MedicoAdmin)
@@ -51,4 +218,6 @@ admin.site.register(Consulta, ConsultaAdmin)
 admin.site.register(Factura, FacturaAdmin)
 admin.site.register(Usuario, UsuarioAdmin)
 admin.site.register(Especialidad, EspecialidadAdmin)
-
+admin.site.register(Tarifa, TarifaAdmin)
+admin.site.register(TareaArchivo, TareaArchivoAdmin)
+admin.site.register(ParDuplicado, ParDuplicadoAdmin)
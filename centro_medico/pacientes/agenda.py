@@ -0,0 +1,174 @@
+import datetime
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import HorarioAtencion, Medico, Turno, TurnoLibre
+from .texto import normalizar
+
+# Agenda de médicos: convierte el texto libre de Medico.disponibilidad en
+# ventanas semanales (HorarioAtencion) y mantiene un índice de turnos libres
+# (TurnoLibre) para los próximos AGENDA_HORIZONTE_DIAS días.
+
+HORIZONTE_DIAS = getattr(settings, 'AGENDA_HORIZONTE_DIAS', 90)
+DURACION_TURNO = getattr(settings, 'AGENDA_DURACION_TURNO_MINUTOS', 30)
+LOTE = 1000
+
+DIAS = {
+    'lunes': 0, 'martes': 1, 'miercoles': 2, 'jueves': 3,
+    'viernes': 4, 'sabado': 5, 'sabados': 5, 'domingo': 6, 'domingos': 6,
+}
+PATRON_DIA = '|'.join(sorted(DIAS, key=len, reverse=True))
+RANGO_DIAS = re.compile(rf'\b({PATRON_DIA})\s+(?:a|al|hasta|-)\s+({PATRON_DIA})\b')
+DIA_SUELTO = re.compile(rf'\b({PATRON_DIA})\b')
+HORA = r'(\d{1,2})(?::(\d{2}))?\s*([ap])?\.?\s*m?\.?'
+RANGO_HORAS = re.compile(rf'{HORA}\s*(?:-|a|hasta)\s*{HORA}')
+
+
+def _hora(h, m, sufijo):
+    h, m = int(h), int(m or 0)
+    if sufijo == 'p' and h < 12:
+        h += 12
+    elif sufijo == 'a' and h == 12:
+        h = 0
+    return datetime.time(h, m)
+
+
+# "Lunes a Viernes, 9:00 AM - 5:00 PM; Sábado 9:00 AM - 12:00 PM"
+#   -> [(0, 09:00, 17:00), ..., (4, 09:00, 17:00), (5, 09:00, 12:00)]
+def interpretar_disponibilidad(texto):
+    ventanas = []
+    for segmento in re.split(r'[;\n|]+', normalizar(texto)):
+        horas = []
+        for grupo in RANGO_HORAS.finditer(segmento):
+            try:
+                inicio = _hora(*grupo.groups()[:3])
+                fin = _hora(*grupo.groups()[3:])
+            except ValueError:
+                continue
+            if inicio < fin:
+                horas.append((inicio, fin))
+        sin_horas = RANGO_HORAS.sub(' ', segmento)
+        dias = set()
+        for rango in RANGO_DIAS.finditer(sin_horas):
+            desde, hasta = DIAS[rango.group(1)], DIAS[rango.group(2)]
+            dias.update(range(desde, hasta + 1) if desde <= hasta else [*range(desde, 7), *range(0, hasta + 1)])
+        dias.update(DIAS[dia.group(1)] for dia in DIA_SUELTO.finditer(RANGO_DIAS.sub(' ', sin_horas)))
+        ventanas.extend((dia, inicio, fin) for dia in sorted(dias) for inicio, fin in horas)
+    return ventanas
+
+
+def sincronizar_horarios(medico):
+    with transaction.atomic():
+        HorarioAtencion.objects.filter(medico=medico).delete()
+        HorarioAtencion.objects.bulk_create([
+            HorarioAtencion(medico=medico, dia_semana=dia, hora_inicio=inicio, hora_fin=fin)
+            for dia, inicio, fin in interpretar_disponibilidad(medico.disponibilidad)
+        ])
+
+
+def horas_de_ventana(inicio, fin, duracion=DURACION_TURNO):
+    actual = datetime.datetime.combine(datetime.date.min, inicio)
+    limite = datetime.datetime.combine(datetime.date.min, fin)
+    paso = datetime.timedelta(minutes=duracion)
+    while actual + paso <= limite:
+        yield actual.time()
+        actual += paso
+
+
+def turnos_posibles(horarios, desde, hasta):
+    por_dia = {}
+    for horario in horarios:
+        por_dia.setdefault(horario.dia_semana, []).append(horario)
+    fecha = desde
+    while fecha <= hasta:
+        for horario in por_dia.get(fecha.weekday(), []):
+            for hora in horas_de_ventana(horario.hora_inicio, horario.hora_fin):
+                yield fecha, hora
+        fecha += datetime.timedelta(days=1)
+
+
+# Recalcula los turnos libres de un médico en [desde, hasta]: ventanas
+# semanales menos los turnos ya ocupados, leídos en una sola consulta.
+def regenerar_turnos_libres(medico, desde=None, hasta=None):
+    desde = desde or timezone.localdate()
+    hasta = hasta or desde + datetime.timedelta(days=HORIZONTE_DIAS)
+    ocupados = set(
+        Turno.objects.filter(medico=medico, fecha__range=(desde, hasta)).values_list('fecha', 'hora')
+    )
+    horarios = list(HorarioAtencion.objects.filter(medico=medico))
+    with transaction.atomic():
+        TurnoLibre.objects.filter(medico=medico, fecha__range=(desde, hasta)).delete()
+        lote = []
+        for fecha, hora in turnos_posibles(horarios, desde, hasta):
+            if (fecha, hora) in ocupados:
+                continue
+            lote.append(TurnoLibre(medico=medico, especialidad_id=medico.especialidad_id, fecha=fecha, hora=hora))
+            if len(lote) >= LOTE:
+                TurnoLibre.objects.bulk_create(lote)
+                lote = []
+        TurnoLibre.objects.bulk_create(lote)
+
+
+def regenerar_agenda(desde=None, hasta=None, sincronizar=False):
+    desde = desde or timezone.localdate()
+    TurnoLibre.objects.filter(fecha__lt=desde).delete()
+    total = 0
+    for medico in Medico.objects.only('id', 'especialidad_id', 'disponibilidad').iterator(chunk_size=LOTE):
+        if sincronizar:
+            sincronizar_horarios(medico)
+        regenerar_turnos_libres(medico, desde, hasta)
+        total += 1
+    return total
+
+
+# Recalcula solo los días tocados por una operación en lote (pacientes/citas_lote.py):
+# afectados es un conjunto de (medico_id, fecha)
+def regenerar_dias(afectados):
+    hoy = timezone.localdate()
+    limite = hoy + datetime.timedelta(days=HORIZONTE_DIAS)
+    por_medico = {}
+    for medico_id, fecha in afectados:
+        if hoy <= fecha <= limite:
+            por_medico.setdefault(medico_id, []).append(fecha)
+    for medico in Medico.objects.only('id', 'especialidad_id').filter(id__in=por_medico):
+        fechas = por_medico[medico.id]
+        regenerar_turnos_libres(medico, min(fechas), max(fechas))
+
+
+# Mantenimiento incremental desde las señales de Turno
+def ocupar_turno_libre(turno):
+    TurnoLibre.objects.filter(medico_id=turno.medico_id, fecha=turno.fecha, hora=turno.hora).delete()
+
+
+# Corre al confirmar la transacción: si en ella se volvió a ocupar el mismo
+# turno (una edición que conserva médico, fecha y hora) no se libera
+def liberar_turno(turno):
+    hoy = timezone.localdate()
+    if not hoy <= turno.fecha <= hoy + datetime.timedelta(days=HORIZONTE_DIAS):
+        return
+    if Turno.objects.filter(medico_id=turno.medico_id, fecha=turno.fecha, hora=turno.hora).exists():
+        return
+    horarios = HorarioAtencion.objects.filter(medico_id=turno.medico_id, dia_semana=turno.fecha.weekday())
+    if any(turno.hora in horas_de_ventana(h.hora_inicio, h.hora_fin) for h in horarios):
+        especialidad_id = Medico.objects.filter(id=turno.medico_id).values_list('especialidad_id', flat=True).first()
+        if especialidad_id is None:
+            return
+        TurnoLibre.objects.get_or_create(
+            medico_id=turno.medico_id, fecha=turno.fecha, hora=turno.hora,
+            defaults={'especialidad_id': especialidad_id},
+        )
+
+
+def proximos_turnos_libres(especialidad_id, cantidad=10, desde=None):
+    ahora = timezone.localtime(desde) if desde else timezone.localtime()
+    return (
+        TurnoLibre.objects.select_related('medico')
+        .only('fecha', 'hora', 'medico__nombre', 'medico__apellido')
+        .filter(especialidad_id=especialidad_id)
+        .filter(Q(fecha__gt=ahora.date()) | Q(fecha=ahora.date(), hora__gte=ahora.time()))
+        .order_by('fecha', 'hora', 'medico_id')[:cantidad]
+    )
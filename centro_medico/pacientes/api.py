@@ -0,0 +1,184 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import Paciente, Medico, Cita, Consulta, Factura
+from .paginacion import PaginadorKeyset
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# API JSON de solo lectura (/api/v1/<recurso>/). Cada petición carga
+# únicamente lo que pide:
+#   ?campos=nombre,apellido   columnas de la respuesta -> only()
+#   ?incluir=paciente,medico  relaciones -> select_related / prefetch_related
+#   ?despues=<cursor>         paginación keyset por id (ver paginacion.py)
+#   ?limite=N                 filas por página (hasta API_LIMITE_MAXIMO)
+# ETag y Last-Modified salen de updated_at de las filas devueltas (y de sus
+# relaciones incluidas), así que una petición condicional que no cambió se
+# responde con 304 sin serializar nada.
+
+VERSION = 'v1'
+LIMITE = getattr(settings, 'API_LIMITE', 100)
+LIMITE_MAXIMO = getattr(settings, 'API_LIMITE_MAXIMO', 1000)
+ORDEN = ('id',)
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+class Recurso:
+    def __init__(self, modelo, campos, incluir=None):
+        self.modelo = modelo
+        self.campos = campos
+        # nombre -> (ruta ORM, recurso relacionado, ¿muchos?)
+        self.incluir = incluir or {}
+
+
+RECURSOS = {
+    'pacientes': Recurso(Paciente, [
+        'nombre', 'apellido', 'documento_identidad', 'direccion', 'telefono', 'correo', 'fecha_nacimiento',
+        'fecha_registro', 'created_at', 'updated_at',
+    ]),
+    'medicos': Recurso(Medico, [
+        'nombre', 'apellido', 'especialidad_id', 'telefono', 'correo', 'disponibilidad', 'created_at', 'updated_at',
+    ]),
+    'citas': Recurso(Cita, [
+        'paciente_id', 'medico_id', 'fecha', 'hora', 'estado', 'motivo', 'created_at', 'updated_at',
+    ]),
+    'consultas': Recurso(Consulta, [
+        'cita_id', 'motivo', 'diagnostico', 'receta', 'indicaciones', 'created_at', 'updated_at',
+    ]),
+    'facturas': Recurso(Factura, [
+        'consulta_id', 'fecha', 'total', 'estado_pago', 'fecha_vencimiento', 'created_at', 'updated_at',
+    ]),
+}
+RECURSOS['pacientes'].incluir = {'citas': ('cita_set', RECURSOS['citas'], True)}
+RECURSOS['medicos'].incluir = {'citas': ('cita_set', RECURSOS['citas'], True)}
+RECURSOS['citas'].incluir = {
+    'paciente': ('paciente', RECURSOS['pacientes'], False),
+    'medico': ('medico', RECURSOS['medicos'], False),
+    'consultas': ('consulta_set', RECURSOS['consultas'], True),
+}
+RECURSOS['consultas'].incluir = {
+    'cita': ('cita', RECURSOS['citas'], False),
+    'facturas': ('factura_set', RECURSOS['facturas'], True),
+}
+RECURSOS['facturas'].incluir = {'consulta': ('consulta', RECURSOS['consultas'], False)}
+
+
+def _lista(valor):
+    return [parte for parte in (valor or '').split(',') if parte]
+
+
+# Interpreta ?campos= e ?incluir=; los nombres desconocidos son un error 400
+def interpretar(recurso, parametros):
+    campos = _lista(parametros.get('campos')) or recurso.campos
+    desconocidos = set(campos) - set(recurso.campos)
+    if desconocidos:
+        raise ParametroInvalido(f"Campos no disponibles: {', '.join(sorted(desconocidos))}.")
+    incluir = _lista(parametros.get('incluir'))
+    desconocidos = set(incluir) - set(recurso.incluir)
+    if desconocidos:
+        raise ParametroInvalido(f"Relaciones no disponibles: {', '.join(sorted(desconocidos))}.")
+    return campos, incluir
+
+
+def _columnas(campos):
+    # updated_at siempre se carga: de ahí salen ETag y Last-Modified
+    return ['id', 'updated_at', *[campo for campo in campos if campo != 'updated_at']]
+
+
+def consulta(recurso, campos, incluir):
+    queryset = recurso.modelo.objects.all()
+    columnas = _columnas(campos)
+    for nombre in incluir:
+        ruta, relacionado, muchos = recurso.incluir[nombre]
+        if muchos:
+            campo_inverso = recurso.modelo._meta.get_field(ruta.removesuffix('_set')).field.attname
+            queryset = queryset.prefetch_related(Prefetch(
+                ruta,
+                queryset=relacionado.modelo.objects.only(*_columnas(relacionado.campos), campo_inverso).order_by('id'),
+                to_attr=f'_api_{nombre}',
+            ))
+        else:
+            queryset = queryset.select_related(ruta)
+            columnas += [f'{ruta}__{columna}' for columna in _columnas(relacionado.campos)]
+    return queryset.only(*columnas)
+
+
+def _relacionados(objeto, recurso, incluir):
+    for nombre in incluir:
+        ruta, relacionado, muchos = recurso.incluir[nombre]
+        if muchos:
+            yield nombre, relacionado, getattr(objeto, f'_api_{nombre}')
+        else:
+            relacion = getattr(objeto, ruta)
+            yield nombre, relacionado, relacion
+
+
+def serializar(objeto, recurso, campos, incluir=()):
+    datos = {'id': objeto.id}
+    for campo in campos:
+        datos[campo] = getattr(objeto, campo)
+    for nombre, relacionado, valor in _relacionados(objeto, recurso, incluir):
+        if isinstance(valor, list):
+            datos[nombre] = [serializar(item, relacionado, relacionado.campos) for item in valor]
+        else:
+            datos[nombre] = serializar(valor, relacionado, relacionado.campos) if valor else None
+    return datos
+
+
+# Versión de un conjunto de filas: ids y updated_at de cada fila y de sus
+# relaciones incluidas, más la forma de la respuesta (campos e inclusiones)
+def version(objetos, recurso, campos, incluir):
+    huella = hashlib.md5(f"{VERSION}|{','.join(campos)}|{','.join(incluir)}".encode())
+    ultima = None
+    pendientes = [(objeto, recurso, incluir) for objeto in objetos]
+    while pendientes:
+        objeto, recurso_actual, inclusiones = pendientes.pop()
+        huella.update(f"|{objeto.id}:{objeto.updated_at.timestamp()}".encode())
+        ultima = objeto.updated_at if ultima is None else max(ultima, objeto.updated_at)
+        for _, relacionado, valor in _relacionados(objeto, recurso_actual, inclusiones):
+            items = valor if isinstance(valor, list) else [valor] if valor else []
+            huella.update(f"|{len(items)}".encode())
+            pendientes.extend((item, relacionado, ()) for item in items)
+    return f'"{huella.hexdigest()}"', ultima
+
+
+def pagina(request, recurso, campos, incluir):
+    try:
+        limite = max(1, min(int(request.GET.get('limite', LIMITE)), LIMITE_MAXIMO))
+    except ValueError:
+        raise ParametroInvalido("El parámetro 'limite' debe ser un número.")
+    return PaginadorKeyset(consulta(recurso, campos, incluir), ORDEN, limite).pagina(request)
+
+
+_codificador_django = DjangoJSONEncoder()
+
+
+# Fechas, horas, Decimal (montos) y demás tipos con las formas de
+# DjangoJSONEncoder (datetime en ISO con milisegundos y 'Z' para UTC, Decimal
+# como texto); lo que no conoce, como texto
+def _otro(valor):
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    try:
+        return _codificador_django.default(valor)
+    except TypeError:
+        return str(valor)
+
+
+# orjson es varias veces más rápido que json; si no está instalado se usa
+# json. Con OPT_PASSTHROUGH_DATETIME las fechas también pasan por _otro, así
+# que ambos caminos producen exactamente los mismos bytes
+def a_json(datos):
+    if orjson is not None:
+        return orjson.dumps(datos, default=_otro, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(datos, default=_otro, ensure_ascii=False, separators=(',', ':')).encode()
@@ -0,0 +1,234 @@
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    Cita, Consulta, Factura, HorarioAtencion, Medico, Paciente, RegistroArchivado, TareaArchivo, TerminoConsulta,
+    Turno, TurnoLibre,
+)
+from .reservas import fecha_del_turno
+from .resumenes import (
+    sumar, ACUMULADO, CITAS_POR_ESTADO, CITAS_POR_MEDICO, CONSULTAS_POR_MEDICO, ESTADO_CANCELADA, FACTURAS_POR_ESTADO,
+)
+from . import agenda, contadores, referencias, tablero
+
+# Eliminación de médicos y pacientes en segundo plano. Borrar un médico con
+# años de historia hace que el CASCADE de Django cargue en memoria todas sus
+# citas, consultas y facturas y las borre en una sola transacción larga. En su
+# lugar, la vista solo encola una TareaArchivo y `manage.py procesar_archivo`
+# la ejecuta por etapas, de las tablas hijas a la principal: cada lote copia
+# las filas a RegistroArchivado, ajusta los resúmenes del dashboard y las
+# borra con un DELETE por ids, todo en una transacción corta. La tarea guarda
+# la etapa en curso, así que un proceso interrumpido la retoma donde quedó.
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = getattr(settings, 'ARCHIVO_TAMANO_LOTE', 500)
+# Una tarea En curso sin avances en este tiempo quedó de un proceso que murió
+ABANDONO_SEGUNDOS = getattr(settings, 'ARCHIVO_ABANDONO_SEGUNDOS', 15 * 60)
+
+PENDIENTE = 'Pendiente'
+EN_CURSO = 'En curso'
+TERMINADA = 'Terminada'
+ERROR = 'Error'
+
+
+class Etapa:
+    def __init__(self, nombre, modelo, filtro, archivar=True, anotaciones=None):
+        self.nombre = nombre
+        self.modelo = modelo
+        # Lookup que relaciona la fila con el objeto a eliminar
+        self.filtro = filtro
+        self.archivar = archivar
+        # Columnas extra para los resúmenes; no se archivan
+        self.anotaciones = anotaciones or {}
+
+    def filas(self, objeto_id):
+        return self.modelo.objects.filter(**{self.filtro: objeto_id}).annotate(**self.anotaciones)
+
+
+ETAPAS = {
+    'medico': [
+        Etapa('facturas', Factura, 'consulta__cita__medico_id', anotaciones={'paciente_contador': F('consulta__cita__paciente_id')}),
+        Etapa('terminos', TerminoConsulta, 'consulta__cita__medico_id', archivar=False),
+        Etapa('consultas', Consulta, 'cita__medico_id', anotaciones={
+            'medico_resumen': F('cita__medico_id'), 'paciente_contador': F('cita__paciente_id'),
+        }),
+        Etapa('turnos', Turno, 'medico_id', archivar=False),
+        Etapa('citas', Cita, 'medico_id'),
+        Etapa('turnos_libres', TurnoLibre, 'medico_id', archivar=False),
+        Etapa('horarios', HorarioAtencion, 'medico_id', archivar=False),
+    ],
+    'paciente': [
+        Etapa('facturas', Factura, 'consulta__cita__paciente_id', anotaciones={'paciente_contador': F('consulta__cita__paciente_id')}),
+        Etapa('terminos', TerminoConsulta, 'consulta__cita__paciente_id', archivar=False),
+        Etapa('consultas', Consulta, 'cita__paciente_id', anotaciones={
+            'medico_resumen': F('cita__medico_id'), 'paciente_contador': F('cita__paciente_id'),
+        }),
+        Etapa('turnos', Turno, 'cita__paciente_id', archivar=False),
+        Etapa('citas', Cita, 'paciente_id'),
+    ],
+}
+MODELOS = {'medico': Medico, 'paciente': Paciente}
+
+
+# Lo que cada fila borrada aportaba a los resúmenes (ver resumenes.contribuciones):
+# (metrica, clave, fecha) -> [cantidad, monto]
+def _contribuciones(modelo, filas):
+    cambios = defaultdict(lambda: [0, Decimal('0')])
+    for fila in filas:
+        monto = 0
+        if modelo is Cita:
+            dia = fecha_del_turno(fila['fecha'])
+            claves = [(CITAS_POR_ESTADO, fila['estado'], dia)]
+            if fila['estado'] != ESTADO_CANCELADA:
+                claves.append((CITAS_POR_MEDICO, str(fila['medico_id']), dia))
+        elif modelo is Consulta:
+            claves = [(CONSULTAS_POR_MEDICO, str(fila['medico_resumen']), fecha_del_turno(fila['created_at']))]
+        elif modelo is Factura:
+            claves = [(FACTURAS_POR_ESTADO, fila['estado_pago'], ACUMULADO)]
+            monto = fila['total']
+        else:
+            continue
+        for clave in claves:
+            cambios[clave][0] += 1
+            cambios[clave][1] += monto
+    return cambios
+
+
+def _restar_resumenes(cambios):
+    for (metrica, clave, fecha), (cantidad, monto) in cambios.items():
+        sumar(metrica, clave, fecha, -cantidad, -monto)
+
+
+# Contadores de los pacientes (ver contadores.py) que pierden citas o
+# facturas pendientes al eliminar un médico
+def _restar_contadores(modelo, filas):
+    if modelo is Cita:
+        aportes = [(fila['paciente_id'], 1, Decimal(0)) for fila in filas]
+    elif modelo is Factura:
+        aportes = [
+            (fila['paciente_contador'], 0, fila['total']) for fila in filas
+            if fila['estado_pago'] == contadores.ESTADO_PENDIENTE
+        ]
+    else:
+        return
+    contadores.sumar(contadores.acumular(contadores.nuevos_cambios(), aportes, -1))
+
+
+def encolar(modelo, objeto):
+    tarea = TareaArchivo.objects.filter(modelo=modelo, objeto_id=objeto.pk, estado__in=[PENDIENTE, EN_CURSO]).first()
+    if tarea:
+        return tarea
+    return TareaArchivo.objects.create(modelo=modelo, objeto_id=objeto.pk, descripcion=str(objeto)[:255])
+
+
+# Un lote de una etapa: copiar, ajustar resúmenes y borrar. Devuelve cuántas
+# filas se borraron (0 cuando la etapa terminó).
+def _procesar_lote(tarea, etapa, tamano_lote):
+    afectados = set()
+    with transaction.atomic():
+        # Sin FOR UPDATE: bloquearía también las filas de las tablas unidas
+        # (citas, médico), justo lo que no debe frenar a las reservas
+        filas = list(etapa.filas(tarea.objeto_id).order_by('id').values()[:tamano_lote])
+        if not filas:
+            return 0
+        ids = [fila['id'] for fila in filas]
+        if etapa.archivar:
+            etiqueta = etapa.modelo._meta.label_lower
+            RegistroArchivado.objects.bulk_create([
+                RegistroArchivado(
+                    modelo=etiqueta, objeto_id=fila['id'], tarea=tarea,
+                    datos={campo: valor for campo, valor in fila.items() if campo not in etapa.anotaciones},
+                )
+                for fila in filas
+            ])
+        _restar_resumenes(_contribuciones(etapa.modelo, filas))
+        _restar_contadores(etapa.modelo, filas)
+        if etapa.modelo is Turno:
+            afectados = {(fila['medico_id'], fila['fecha']) for fila in filas}
+        # Las tablas hijas ya se vaciaron: DELETE directo por ids. No se usa
+        # delete(): con receptores de señales el recolector carga cada fila y
+        # las señales de Cita, Consulta y Factura restarían otra vez de los
+        # resúmenes y contadores lo que este lote ya ajustó. _raw_delete es la
+        # única forma del ORM de emitir un DELETE sin recolector ni señales.
+        etapa.modelo.objects.filter(id__in=ids)._raw_delete(etapa.modelo.objects.db)
+        if etapa.modelo is Cita:
+            tablero.publicar_eliminadas((fila['id'], fila['medico_id'], fila['fecha']) for fila in filas)
+        if etapa.modelo is Consulta:
+            contadores.recalcular_visitas({fila['paciente_contador'] for fila in filas})
+        tarea.etapa = etapa.nombre
+        tarea.filas += len(filas)
+        tarea.save(update_fields=['etapa', 'filas', 'updated_at'])
+    if afectados and tarea.modelo == 'paciente':
+        # Los turnos del paciente vuelven a quedar libres
+        agenda.regenerar_dias(afectados)
+    return len(filas)
+
+
+def ejecutar(tarea, tamano_lote=TAMANO_LOTE):
+    etapas = ETAPAS[tarea.modelo]
+    nombres = [etapa.nombre for etapa in etapas]
+    inicio = nombres.index(tarea.etapa) if tarea.etapa in nombres else 0
+    tarea.estado = EN_CURSO
+    tarea.save(update_fields=['estado', 'updated_at'])
+    for etapa in etapas[inicio:]:
+        while _procesar_lote(tarea, etapa, tamano_lote) == tamano_lote:
+            pass
+    # Por último el propio objeto: ya sin filas dependientes, su delete() es
+    # inmediato y las señales ajustan resúmenes y cachés
+    modelo = MODELOS[tarea.modelo]
+    with transaction.atomic():
+        objeto = modelo.objects.filter(pk=tarea.objeto_id).first()
+        if objeto is not None:
+            datos = modelo.objects.filter(pk=objeto.pk).values().first()
+            RegistroArchivado.objects.create(
+                modelo=modelo._meta.label_lower, objeto_id=objeto.pk, datos=datos, tarea=tarea,
+            )
+            objeto.delete()
+            tarea.filas += 1
+        tarea.estado = TERMINADA
+        tarea.etapa = ''
+        tarea.save(update_fields=['estado', 'etapa', 'filas', 'updated_at'])
+    referencias.invalidar_modelo(Factura)
+    return tarea
+
+
+# Toma la siguiente tarea libre y la marca En curso en la misma transacción.
+# Con SKIP LOCKED varios procesos reparten las tareas sin esperarse ni tomar
+# la misma; cada lote de ejecutar() renueva updated_at, así que solo se
+# retoman las En curso que dejaron de avanzar
+def _reclamar():
+    abandono = timezone.now() - datetime.timedelta(seconds=ABANDONO_SEGUNDOS)
+    with transaction.atomic():
+        tarea = (
+            TareaArchivo.objects.select_for_update(skip_locked=True)
+            .filter(Q(estado=PENDIENTE) | Q(estado=EN_CURSO, updated_at__lt=abandono))
+            .order_by('id').first()
+        )
+        if tarea is not None:
+            tarea.estado = EN_CURSO
+            tarea.save(update_fields=['estado', 'updated_at'])
+    return tarea
+
+
+# Procesa las tareas pendientes (y las que quedaron a medias) en orden
+def procesar_tareas(tamano_lote=TAMANO_LOTE):
+    terminadas = []
+    while True:
+        tarea = _reclamar()
+        if tarea is None:
+            return terminadas
+        try:
+            terminadas.append(ejecutar(tarea, tamano_lote))
+        except Exception as exc:
+            logger.exception("Error en la tarea de archivo %s", tarea.id)
+            TareaArchivo.objects.filter(id=tarea.id).update(
+                estado=ERROR, error=str(exc), updated_at=timezone.now(),
+            )
@@ -0,0 +1,157 @@
+import json
+import math
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from .models import Especialidad, Paciente, Medico, Cita, Consulta, Factura, Usuario
+
+# Banco de pruebas de rendimiento: recorre todas las rutas con nombre de
+# centro_medico/urls.py (GET), mide latencia (p50/p95/p99), número de
+# consultas SQL y memoria pico por ruta, y compara contra una línea base JSON.
+
+REPETICIONES = 20
+TOLERANCIA = 0.2
+# Margen absoluto para que las rutas muy rápidas no fallen por ruido
+MARGEN_MS = 5.0
+
+# Ruta -> modelo del que se toma un id para los parámetros <int:...>
+MODELOS_POR_PREFIJO = {
+    'pacientes': Paciente,
+    'medicos': Medico,
+    'citas': Cita,
+    'consultas': Consulta,
+    'usuarios': Usuario,
+}
+
+# Parámetros GET representativos para las rutas que los necesitan
+PARAMETROS = {
+    'pacientes_buscar': lambda: {'q': 'garc'},
+    'autocompletar_pacientes': lambda: {'q': 'mar'},
+    'autocompletar_medicos': lambda: {'q': 'l'},
+    'autocompletar_citas': lambda: {'q': 'jo'},
+    'autocompletar_consultas': lambda: {'q': 'migr'},
+    'consultas_buscar': lambda: {'q': '"gripe común" paracetamol'},
+    'agenda_proximos_turnos': lambda: {'especialidad': Especialidad.objects.values_list('id', flat=True).first() or 0},
+}
+
+FILAS = [Especialidad, Paciente, Medico, Cita, Consulta, Factura, Usuario]
+
+
+def _patrones():
+    for patron in get_resolver().url_patterns:
+        if isinstance(patron, URLResolver):
+            # El admin y los includes de terceros quedan fuera
+            continue
+        if isinstance(patron, URLPattern) and patron.name:
+            yield patron
+
+
+def rutas():
+    resultado = []
+    for patron in _patrones():
+        ruta = str(patron.pattern)
+        kwargs = {}
+        for nombre in patron.pattern.converters:
+            modelo = MODELOS_POR_PREFIJO.get(ruta.split('/', 1)[0])
+            valor = modelo.objects.order_by('id').values_list('id', flat=True).first() if modelo else None
+            if valor is None:
+                break
+            kwargs[nombre] = valor
+        else:
+            resultado.append((patron.name, ruta, kwargs))
+    return resultado
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def medir(cliente, url, parametros, repeticiones):
+    latencias = []
+    consultas = []
+    memoria = 0
+    estado = None
+    # Primera petición de calentamiento (plantillas compiladas, cachés)
+    cliente.get(url, parametros)
+    for _ in range(repeticiones):
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url, parametros)
+            if respuesta.streaming:
+                for _ in respuesta.streaming_content:
+                    pass
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        memoria = max(memoria, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        consultas.append(len(capturadas))
+        estado = respuesta.status_code
+    return {
+        'url': url,
+        'estado': estado,
+        'p50_ms': round(percentil(latencias, 50), 3),
+        'p95_ms': round(percentil(latencias, 95), 3),
+        'p99_ms': round(percentil(latencias, 99), 3),
+        'consultas': max(consultas),
+        'memoria_pico_kb': round(memoria / 1024, 1),
+    }
+
+
+def ejecutar(repeticiones=REPETICIONES, incluir=None, excluir=(), salida=None):
+    # Con DEBUG y ALLOWED_HOSTS vacío Django acepta 'localhost'
+    hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')]
+    cliente = Client(SERVER_NAME=hosts[0] if hosts else 'localhost', raise_request_exception=False)
+    resultados = {}
+    for nombre, ruta, kwargs in rutas():
+        if (incluir and nombre not in incluir) or nombre in excluir:
+            continue
+        url = '/' + ruta
+        for clave, valor in kwargs.items():
+            url = url.replace(f'<int:{clave}>', str(valor))
+        parametros = PARAMETROS[nombre]() if nombre in PARAMETROS else {}
+        resultados[nombre] = medir(cliente, url, parametros, repeticiones)
+        if salida:
+            salida(nombre, resultados[nombre])
+    return {
+        'motor': connection.vendor,
+        'repeticiones': repeticiones,
+        'filas': {modelo.__name__: modelo.objects.count() for modelo in FILAS},
+        'rutas': resultados,
+    }
+
+
+# Regresiones de `actual` frente a `base`: más consultas, o un p95 que supera
+# la línea base en más de `tolerancia` (fracción) y de MARGEN_MS.
+def comparar(base, actual, tolerancia=TOLERANCIA, margen_ms=MARGEN_MS):
+    regresiones = []
+    for nombre, medida in actual['rutas'].items():
+        anterior = base.get('rutas', {}).get(nombre)
+        if anterior is None:
+            continue
+        if medida['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: {anterior['consultas']} -> {medida['consultas']} consultas")
+        limite = anterior['p95_ms'] * (1 + tolerancia) + margen_ms
+        if medida['p95_ms'] > limite:
+            regresiones.append(f"{nombre}: p95 {anterior['p95_ms']} ms -> {medida['p95_ms']} ms")
+        if medida['estado'] != anterior['estado']:
+            regresiones.append(f"{nombre}: estado {anterior['estado']} -> {medida['estado']}")
+    return regresiones
+
+
+def guardar(resultado, ruta):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
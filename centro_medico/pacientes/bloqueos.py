@@ -0,0 +1,43 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import connection
+
+# Bloqueos con nombre para las corridas que no deben ejecutarse dos veces a
+# la vez (facturación). En MySQL se usa GET_LOCK: lo mantiene la conexión y
+# no una transacción, así que la corrida puede seguir confirmando cada lote
+# por separado, y el servidor lo libera por sí solo si el proceso muere, sin
+# plazos de expiración. SQLite (desarrollo y benchmark) no tiene bloqueos con
+# nombre; ahí basta un bloqueo del proceso.
+
+_bloqueos_locales = {}
+_guardia = threading.Lock()
+
+
+def _nombre(nombre):
+    # GET_LOCK es por servidor: se distingue la base de datos
+    return f"{connection.settings_dict['NAME']}:{nombre}"[-64:]
+
+
+# Cede True si se obtuvo el bloqueo y False si ya lo tiene otro proceso
+@contextmanager
+def bloqueo(nombre):
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", [_nombre(nombre)])
+            obtenido = cursor.fetchone()[0] == 1
+        try:
+            yield obtenido
+        finally:
+            if obtenido:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", [_nombre(nombre)])
+        return
+    with _guardia:
+        local = _bloqueos_locales.setdefault(nombre, threading.Lock())
+    obtenido = local.acquire(blocking=False)
+    try:
+        yield obtenido
+    finally:
+        if obtenido:
+            local.release()
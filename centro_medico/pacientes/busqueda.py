@@ -0,0 +1,166 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, When, Value, IntegerField, Q
+
+from .models import Paciente, Medico, Cita
+from .texto import normalizar, tokens, similitud
+
+# Motor de búsqueda de pacientes con tres rutas:
+#   1. documento_identidad exacto (índice único)
+#   2. prefijos sobre nombre/apellido normalizados (índices b-tree, LIKE 'x%')
+#   3. coincidencia aproximada: FULLTEXT en MySQL o trigramas en la aplicación
+
+LIMITE_RESULTADOS = getattr(settings, 'BUSQUEDA_PACIENTES_LIMITE', 50)
+CANDIDATOS_APROXIMADOS = 500
+SIMILITUD_MINIMA = 0.3
+
+CAMPOS_RESULTADO = ('id', 'nombre', 'apellido', 'documento_identidad', 'telefono')
+
+PATRON_DOCUMENTO = re.compile(r'^[\w.-]*\d[\w.-]*$')
+
+
+def parece_documento(texto):
+    return bool(PATRON_DOCUMENTO.match(texto.strip()))
+
+
+def buscar_por_documento(texto):
+    documento = texto.strip()
+    return list(Paciente.objects.only(*CAMPOS_RESULTADO).filter(documento_identidad=documento)[:1])
+
+
+def filtro_prefijos(palabras):
+    condicion = Q()
+    for palabra in palabras:
+        condicion &= Q(nombre_normalizado__startswith=palabra) | Q(apellido_normalizado__startswith=palabra)
+    return condicion
+
+
+def buscar_por_prefijo(palabras, limite):
+    primera = palabras[0]
+    ranking = Case(
+        When(Q(apellido_normalizado=primera) | Q(nombre_normalizado=primera), then=Value(2)),
+        When(apellido_normalizado__startswith=primera, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    queryset = (
+        Paciente.objects.only(*CAMPOS_RESULTADO)
+        .filter(filtro_prefijos(palabras))
+        .annotate(relevancia=ranking)
+        .order_by('-relevancia', 'apellido_normalizado', 'nombre_normalizado', 'id')
+    )
+    return list(queryset[:limite])
+
+
+def buscar_aproximado(texto, palabras, limite):
+    if connection.vendor == 'mysql':
+        return buscar_fulltext(texto, limite)
+    return buscar_trigramas(texto, palabras, limite)
+
+
+# MySQL: índice FULLTEXT (parser ngram) creado en la migración 0004
+def buscar_fulltext(texto, limite):
+    tabla = Paciente._meta.db_table
+    sql = (
+        f'SELECT id, nombre, apellido, documento_identidad, telefono, '
+        f'MATCH(nombre_normalizado, apellido_normalizado) AGAINST (%s IN NATURAL LANGUAGE MODE) AS relevancia '
+        f'FROM {tabla} '
+        f'WHERE MATCH(nombre_normalizado, apellido_normalizado) AGAINST (%s IN NATURAL LANGUAGE MODE) '
+        f'ORDER BY relevancia DESC, id'
+    )
+    consulta = normalizar(texto)
+    parametros = [consulta, consulta]
+    if limite is not None:
+        sql += ' LIMIT %s'
+        parametros.append(limite)
+    return list(Paciente.objects.raw(sql, parametros))
+
+
+# Otros motores: se acota el conjunto candidato por las dos primeras letras de
+# cada palabra (consulta por índice) y se ordena por similitud de trigramas.
+def buscar_trigramas(texto, palabras, limite):
+    condicion = Q()
+    for palabra in palabras:
+        raiz = palabra[:2]
+        condicion |= Q(nombre_normalizado__startswith=raiz) | Q(apellido_normalizado__startswith=raiz)
+    candidatos = Paciente.objects.only(*CAMPOS_RESULTADO, 'nombre_normalizado', 'apellido_normalizado').filter(condicion)
+    consulta = normalizar(texto)
+    puntuados = []
+    for paciente in candidatos[:CANDIDATOS_APROXIMADOS]:
+        completo = f'{paciente.nombre_normalizado} {paciente.apellido_normalizado}'
+        puntaje = max(
+            similitud(consulta, completo),
+            max(similitud(p, paciente.apellido_normalizado) for p in palabras),
+            max(similitud(p, paciente.nombre_normalizado) for p in palabras),
+        )
+        if puntaje >= SIMILITUD_MINIMA:
+            paciente.relevancia = puntaje
+            puntuados.append(paciente)
+    puntuados.sort(key=lambda p: (-p.relevancia, p.id))
+    return puntuados[:limite]
+
+
+def buscar_pacientes(texto, limite=LIMITE_RESULTADOS):
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    if parece_documento(texto):
+        resultado = buscar_por_documento(texto)
+        if resultado:
+            return resultado
+    palabras = tokens(texto)
+    if not palabras:
+        return []
+    resultado = buscar_por_prefijo(palabras, limite)
+    if resultado:
+        return resultado
+    return buscar_aproximado(texto, palabras, limite)
+
+
+# Identificadores de los pacientes encontrados, para filtrar querysets (admin).
+# Con limite=None se devuelven todos: el admin pagina el resultado por su cuenta
+def ids_pacientes(texto, limite=LIMITE_RESULTADOS):
+    return [paciente.id for paciente in buscar_pacientes(texto, limite)]
+
+
+# Autocompletado: solo prefijos (siempre por índice) y proyecciones mínimas
+LIMITE_AUTOCOMPLETAR = 10
+
+
+def autocompletar_pacientes(texto):
+    texto = (texto or '').strip()
+    queryset = Paciente.objects.only('id', 'nombre', 'apellido', 'documento_identidad')
+    if parece_documento(texto):
+        return queryset.filter(documento_identidad__startswith=texto).order_by('documento_identidad')
+    palabras = tokens(texto)
+    if not palabras:
+        return queryset.none()
+    return queryset.filter(filtro_prefijos(palabras)).order_by('apellido_normalizado', 'nombre_normalizado', 'id')
+
+
+def autocompletar_medicos(texto, especialidad_id=None):
+    condicion = Q()
+    for palabra in (texto or '').split():
+        condicion &= Q(nombre__istartswith=palabra) | Q(apellido__istartswith=palabra)
+    queryset = Medico.objects.select_related('especialidad').only(
+        'id', 'nombre', 'apellido', 'especialidad__nombre',
+    ).filter(condicion)
+    if especialidad_id:
+        queryset = queryset.filter(especialidad_id=especialidad_id)
+    return queryset.order_by('apellido', 'nombre', 'id')
+
+
+# Citas activas cuyo paciente coincide con el prefijo, las más recientes primero
+def autocompletar_citas(texto):
+    palabras = tokens(texto)
+    if not palabras:
+        return Cita.objects.none()
+    condicion = Q()
+    for palabra in palabras:
+        condicion &= (
+            Q(paciente__nombre_normalizado__startswith=palabra)
+            | Q(paciente__apellido_normalizado__startswith=palabra)
+        )
+    return Cita.objects.para_opciones().filter(condicion).exclude(estado='Cancelada')
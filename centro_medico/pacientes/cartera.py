@@ -0,0 +1,135 @@
+import csv
+import datetime
+import io
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import Factura
+from . import referencias
+
+# Antigüedad de la cartera: facturas pendientes repartidas en tramos según
+# los días transcurridos desde fecha_vencimiento, agrupadas por paciente o
+# por especialidad del médico. Todo el reparto se hace en una sola consulta
+# agregada (SUM(CASE ...) con GROUP BY) sobre el índice (estado_pago,
+# fecha_vencimiento). El resultado se guarda en caché por día y se invalida
+# con cualquier cambio de Factura (ver signals.py).
+
+# (columna, días vencidos desde, hasta)
+TRAMOS = [
+    ('dias_0_30', 0, 30),
+    ('dias_31_60', 31, 60),
+    ('dias_61_90', 61, 90),
+    ('dias_90_mas', 91, None),
+]
+
+AGRUPACIONES = {
+    'paciente': {
+        'campos': {
+            'paciente_id': F('consulta__cita__paciente_id'),
+            'documento': F('consulta__cita__paciente__documento_identidad'),
+            'nombre': F('consulta__cita__paciente__nombre'),
+            'apellido': F('consulta__cita__paciente__apellido'),
+        },
+        'encabezados': ['Paciente ID', 'Documento', 'Nombre', 'Apellido'],
+    },
+    'especialidad': {
+        'campos': {
+            'especialidad_id': F('consulta__cita__medico__especialidad_id'),
+            'especialidad': F('consulta__cita__medico__especialidad__nombre'),
+        },
+        'encabezados': ['Especialidad ID', 'Especialidad'],
+    },
+}
+ENCABEZADOS_MONTOS = ['Facturas', 'Por vencer', '0-30 días', '31-60 días', '61-90 días', 'Más de 90 días', 'Total']
+
+# Los informes más grandes se sirven siempre desde la base de datos
+MAXIMO_FILAS_CACHE = getattr(settings, 'CARTERA_MAXIMO_FILAS_CACHE', 5000)
+TAMANO_LOTE = 2000
+
+MONTO = DecimalField(max_digits=14, decimal_places=2)
+CENTAVOS = Decimal('0.01')
+
+
+def _suma_si(condicion):
+    return Sum(Case(When(condicion, then='total'), default=Value(Decimal('0')), output_field=MONTO))
+
+
+def consulta_cartera(agrupacion, hoy=None):
+    hoy = hoy or timezone.localdate()
+    campos = AGRUPACIONES[agrupacion]['campos']
+    montos = {
+        'facturas': Count('id'),
+        'por_vencer': _suma_si(Q(fecha_vencimiento__gt=hoy) | Q(fecha_vencimiento__isnull=True)),
+    }
+    for columna, desde, hasta in TRAMOS:
+        condicion = Q(fecha_vencimiento__lte=hoy - datetime.timedelta(days=desde))
+        if hasta is not None:
+            condicion &= Q(fecha_vencimiento__gte=hoy - datetime.timedelta(days=hasta))
+        montos[columna] = _suma_si(condicion)
+    montos['total'] = Sum('total')
+    return (
+        Factura.objects.filter(estado_pago='Pendiente')
+        .values(**campos).annotate(**montos)
+        .values_list(*campos, *montos)
+        .order_by('-total', *campos)
+    )
+
+
+def encabezados(agrupacion):
+    return AGRUPACIONES[agrupacion]['encabezados'] + ENCABEZADOS_MONTOS
+
+
+# SQLite suma los decimales como flotantes; se normalizan a centavos
+def _redondear(fila):
+    return tuple(valor.quantize(CENTAVOS) if isinstance(valor, Decimal) else valor for valor in fila)
+
+
+def _clave(agrupacion, hoy):
+    return f'cartera:{agrupacion}:{hoy.isoformat()}:v{referencias.version(referencias.CARTERA)}'
+
+
+# Filas del informe. Si está en caché se leen de ahí; si no, se recorren
+# desde la base de datos y se guardan al terminar, salvo que el informe
+# supere MAXIMO_FILAS_CACHE.
+def filas_cartera(agrupacion, hoy=None):
+    hoy = hoy or timezone.localdate()
+    clave = _clave(agrupacion, hoy)
+    guardadas = cache.get(clave)
+    if guardadas is not None:
+        yield from guardadas
+        return
+    acumuladas = []
+    for fila in consulta_cartera(agrupacion, hoy).iterator(chunk_size=TAMANO_LOTE):
+        fila = _redondear(fila)
+        if acumuladas is not None:
+            acumuladas.append(fila)
+            if len(acumuladas) > MAXIMO_FILAS_CACHE:
+                acumuladas = None
+        yield fila
+    if acumuladas is not None:
+        cache.set(clave, acumuladas, 60 * 60 * 24)
+
+
+def totales(filas):
+    suma = [0] + [Decimal('0')] * (len(ENCABEZADOS_MONTOS) - 1)
+    for fila in filas:
+        for i, valor in enumerate(fila[-len(ENCABEZADOS_MONTOS):]):
+            suma[i] += valor or 0
+    return suma
+
+
+def exportar_csv(agrupacion, hoy=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezados(agrupacion))
+    for i, fila in enumerate(filas_cartera(agrupacion, hoy), 1):
+        writer.writerow(fila)
+        if i % TAMANO_LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
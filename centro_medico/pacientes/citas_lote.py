@@ -0,0 +1,211 @@
+import datetime
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from .models import Cita, Consulta, Turno
+from .reservas import ConflictoDeTurno, ESTADO_CANCELADA, fecha_del_turno
+from .resumenes import sumar, CITAS_POR_ESTADO, CITAS_POR_MEDICO
+from . import agenda, tablero
+
+# Operaciones en lote sobre un conjunto de citas (p. ej. todas las de un
+# médico en un día): confirmar, cancelar y reprogramar. Cada operación es una
+# transacción que bloquea las filas, las cambia con un único UPDATE y ajusta
+# turnos, resúmenes del dashboard y turnos libres por conjuntos, sin guardar
+# cita por cita (los UPDATE masivos no emiten señales).
+
+ESTADO_PENDIENTE = 'Pendiente'
+ESTADO_CONFIRMADA = 'Confirmada'
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_CONFIRMADA)
+
+
+class ResultadoLote:
+    def __init__(self, accion):
+        self.accion = accion
+        self.actualizadas = 0
+        # (cita_id, motivo) de las citas que no se pudieron cambiar
+        self.omitidas = []
+
+    def __str__(self):
+        texto = f"{self.actualizadas} citas {self.accion}."
+        if self.omitidas:
+            texto += f" {len(self.omitidas)} omitidas: " + '; '.join(f"#{id} {motivo}" for id, motivo in self.omitidas)
+        return texto
+
+    def como_dict(self):
+        return {
+            'accion': self.accion,
+            'actualizadas': self.actualizadas,
+            'omitidas': [{'cita_id': id, 'motivo': motivo} for id, motivo in self.omitidas],
+        }
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def filtrar_citas(ids=None, medico=None, fecha=None, estado=None):
+    citas = Cita.objects.all()
+    if ids:
+        citas = citas.filter(id__in=ids)
+    if medico:
+        citas = citas.filter(medico=medico)
+    if fecha:
+        # Rango sobre el DateTimeField (usa el índice) en lugar de __date
+        citas = citas.filter(fecha__gte=_inicio_del_dia(fecha), fecha__lt=_inicio_del_dia(fecha + datetime.timedelta(days=1)))
+    if estado:
+        citas = citas.filter(estado=estado)
+    return citas
+
+
+def _bloquear(citas, estados):
+    return list(
+        citas.select_for_update().filter(estado__in=estados).order_by('id')
+        .values_list('id', 'estado', 'fecha', 'hora', 'medico_id')
+    )
+
+
+# Ajuste de CITAS_POR_ESTADO y de la carga de los médicos (CITAS_POR_MEDICO):
+# una llamada a sumar por (estado, día) y por (médico, día) afectados
+def _ajustar_resumenes(cambios, carga=None):
+    for (estado, dia), cantidad in cambios.items():
+        if cantidad:
+            sumar(CITAS_POR_ESTADO, estado, dia, cantidad)
+    for (medico_id, dia), cantidad in (carga or {}).items():
+        if cantidad:
+            sumar(CITAS_POR_MEDICO, str(medico_id), dia, cantidad)
+
+
+def _liberar_turnos(ids):
+    turnos = Turno.objects.filter(cita_id__in=ids)
+    afectados = set(turnos.values_list('medico_id', 'fecha'))
+    # Turno no tiene dependencias en CASCADE; los turnos libres de los días
+    # afectados se regeneran igualmente al final de la operación
+    turnos.delete()
+    return afectados
+
+
+def confirmar_citas(citas):
+    resultado = ResultadoLote('confirmadas')
+    with transaction.atomic():
+        filas = _bloquear(citas, (ESTADO_PENDIENTE,))
+        if filas:
+            resultado.actualizadas = Cita.objects.filter(id__in=[fila[0] for fila in filas]).update(
+                estado=ESTADO_CONFIRMADA, updated_at=timezone.now(),
+            )
+            cambios = Counter()
+            for _, estado, fecha, _, _ in filas:
+                cambios[(estado, fecha_del_turno(fecha))] -= 1
+                cambios[(ESTADO_CONFIRMADA, fecha_del_turno(fecha))] += 1
+            _ajustar_resumenes(cambios)
+            tablero.publicar(tablero.CONFIRMADA, [fila[0] for fila in filas])
+    return resultado
+
+
+def cancelar_citas(citas):
+    resultado = ResultadoLote('canceladas')
+    afectados = set()
+    with transaction.atomic():
+        filas = _bloquear(citas, ESTADOS_ACTIVOS)
+        if filas:
+            ids = [fila[0] for fila in filas]
+            resultado.actualizadas = Cita.objects.filter(id__in=ids).update(
+                estado=ESTADO_CANCELADA, updated_at=timezone.now(),
+            )
+            afectados = _liberar_turnos(ids)
+            cambios = Counter()
+            carga = Counter()
+            for _, estado, fecha, _, medico_id in filas:
+                cambios[(estado, fecha_del_turno(fecha))] -= 1
+                cambios[(ESTADO_CANCELADA, fecha_del_turno(fecha))] += 1
+                carga[(medico_id, fecha_del_turno(fecha))] -= 1
+            _ajustar_resumenes(cambios, carga)
+            tablero.publicar(tablero.CANCELADA, ids)
+    if filas:
+        agenda.regenerar_dias(afectados)
+    return resultado
+
+
+# Mueve las citas activas a otra fecha (misma hora) y, opcionalmente, a otro
+# médico. Los conflictos se buscan en una sola consulta sobre Turno; las
+# citas que chocan con un turno ocupado, entre sí o que ya tienen consulta
+# se omiten y se informan, el resto se mueve.
+def reprogramar_citas(citas, nueva_fecha, medico=None):
+    resultado = ResultadoLote('reprogramadas')
+    afectados = set()
+    with transaction.atomic():
+        atendidas = set(
+            citas.filter(estado__in=ESTADOS_ACTIVOS, id__in=Consulta.objects.values('cita_id'))
+            .values_list('id', flat=True)
+        )
+        filas = [fila for fila in _bloquear(citas, ESTADOS_ACTIVOS) if fila[0] not in atendidas]
+        resultado.omitidas.extend((id, "ya tiene una consulta registrada") for id in sorted(atendidas))
+        if not filas:
+            return resultado
+        ids = [fila[0] for fila in filas]
+        destino = {fila[0]: medico.id if medico else fila[4] for fila in filas}
+        ocupados = set(
+            Turno.objects.filter(
+                fecha=nueva_fecha, medico_id__in=set(destino.values()), hora__in={fila[3] for fila in filas},
+            ).exclude(cita_id__in=ids).values_list('medico_id', 'hora')
+        )
+        movidas = []
+        for fila in filas:
+            clave = (destino[fila[0]], fila[3])
+            if clave in ocupados:
+                resultado.omitidas.append((fila[0], f"el turno de las {fila[3]:%H:%M} ya está ocupado"))
+                continue
+            ocupados.add(clave)
+            movidas.append(fila)
+        if not movidas:
+            return resultado
+        ids = [fila[0] for fila in movidas]
+        nuevas_fechas = {
+            fila[0]: timezone.make_aware(datetime.datetime.combine(nueva_fecha, fila[3])) for fila in movidas
+        }
+        cambios = {'fecha': Case(
+            *[When(id=id, then=Value(fecha)) for id, fecha in nuevas_fechas.items()],
+            output_field=DateTimeField(),
+        )}
+        if 'fecha' in cambios or 'hora' in cambios:
+            # Igual que reprogramar_cita: el recordatorio enviado era de la fecha anterior
+            cambios['recordatorio_enviado'] = None
+        if medico:
+            cambios['medico_id'] = medico.id
+        resultado.actualizadas = Cita.objects.filter(id__in=ids).update(updated_at=timezone.now(), **cambios)
+        afectados = _liberar_turnos(ids)
+        try:
+            Turno.objects.bulk_create([
+                Turno(medico_id=destino[id], fecha=nueva_fecha, hora=hora, cita_id=id)
+                for id, _, _, hora, _ in movidas
+            ])
+        except IntegrityError:
+            # Otra reserva ocupó uno de los turnos durante la operación
+            raise ConflictoDeTurno(None)
+        afectados |= {(medico_id, nueva_fecha) for medico_id in set(destino.values())}
+        contador = Counter()
+        carga = Counter()
+        for id, estado, fecha, _, medico_id in movidas:
+            contador[(estado, fecha_del_turno(fecha))] -= 1
+            contador[(estado, nueva_fecha)] += 1
+            carga[(medico_id, fecha_del_turno(fecha))] -= 1
+            carga[(destino[id], nueva_fecha)] += 1
+        _ajustar_resumenes(contador, carga)
+        tablero.publicar(tablero.REPROGRAMADA, ids, {id: (medico_id, fecha) for id, _, fecha, _, medico_id in movidas})
+    agenda.regenerar_dias(afectados)
+    return resultado
+
+
+ACCIONES = {
+    'confirmar': confirmar_citas,
+    'cancelar': cancelar_citas,
+    'reprogramar': reprogramar_citas,
+}
+
+
+def ejecutar(accion, citas, nueva_fecha=None, medico=None):
+    if accion == 'reprogramar':
+        return reprogramar_citas(citas, nueva_fecha, medico)
+    return ACCIONES[accion](citas)
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DateTimeField, DecimalField, Exists, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Cita, Consulta, Factura, Paciente
+
+# Contadores desnormalizados de cada paciente, para listar, ordenar y filtrar
+# sin COUNT/SUM correlacionados sobre citas, consultas y facturas:
+#   citas_total      citas registradas (de cualquier estado)
+#   saldo_pendiente  suma de sus facturas pendientes
+#   ultima_visita    fecha de su última cita con consulta
+# Los dos primeros se mantienen como los resúmenes del dashboard: cada objeto
+# aporta (paciente_id, citas, saldo) y al guardarlo se aplica la diferencia
+# con un UPDATE ... SET x = x + n en la misma transacción. La última visita
+# no se puede restar: crece con Greatest() y se recalcula al borrar.
+# La carga del día de cada médico es la métrica CITAS_POR_MEDICO de
+# ResumenDiario (ver resumenes.py). `manage.py reconciliar_contadores`
+# corrige periódicamente las desviaciones, por lotes de pacientes.
+
+TAMANO_LOTE = getattr(settings, 'CONTADORES_TAMANO_LOTE', 1000)
+ESTADO_PENDIENTE = 'Pendiente'
+
+
+def _paciente_de_consulta(consulta_id):
+    return Cita.objects.filter(consulta__id=consulta_id).values_list('paciente_id', flat=True).first()
+
+
+def contribuciones(objeto):
+    if isinstance(objeto, Cita):
+        return [(objeto.paciente_id, 1, Decimal(0))]
+    if isinstance(objeto, Factura) and objeto.estado_pago == ESTADO_PENDIENTE:
+        paciente_id = _paciente_de_consulta(objeto.consulta_id)
+        if paciente_id is None:
+            return []
+        return [(paciente_id, 0, Decimal(objeto.total))]
+    return []
+
+
+# cambios: paciente_id -> [citas, saldo]. Un solo UPDATE para todos los
+# pacientes, con el incremento de cada uno en un CASE
+def sumar(cambios):
+    cambios = {id: (citas, saldo) for id, (citas, saldo) in cambios.items() if citas or saldo}
+    if not cambios:
+        return
+    citas = [When(id=id, then=Value(n)) for id, (n, _) in cambios.items() if n]
+    saldos = [When(id=id, then=Value(monto)) for id, (_, monto) in cambios.items() if monto]
+    campos = {}
+    if citas:
+        campos['citas_total'] = F('citas_total') + Case(*citas, default=Value(0), output_field=IntegerField())
+    if saldos:
+        campos['saldo_pendiente'] = F('saldo_pendiente') + Case(
+            *saldos, default=Value(Decimal(0)), output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+    Paciente.objects.filter(id__in=list(cambios)).update(**campos)
+
+
+def acumular(cambios, filas, signo=1):
+    for paciente_id, citas, saldo in filas:
+        cambios[paciente_id][0] += signo * citas
+        cambios[paciente_id][1] += signo * saldo
+    return cambios
+
+
+def nuevos_cambios():
+    return defaultdict(lambda: [0, Decimal(0)])
+
+
+def aplicar(anteriores, nuevas):
+    if anteriores == nuevas:
+        return
+    sumar(acumular(acumular(nuevos_cambios(), anteriores, -1), nuevas))
+
+
+def registrar_visita(paciente_id, fecha):
+    fecha = Value(fecha, output_field=DateTimeField())
+    Paciente.objects.filter(id=paciente_id).update(ultima_visita=Greatest(Coalesce('ultima_visita', fecha), fecha))
+
+
+def _ultima_visita():
+    return Subquery(
+        Cita.objects.filter(paciente_id=OuterRef('pk'))
+        .filter(Exists(Consulta.objects.filter(cita_id=OuterRef('pk'))))
+        .order_by('-fecha').values('fecha')[:1],
+        output_field=DateTimeField(),
+    )
+
+
+def recalcular_visitas(paciente_ids):
+    paciente_ids = {id for id in paciente_ids if id}
+    if paciente_ids:
+        Paciente.objects.filter(id__in=paciente_ids).update(ultima_visita=_ultima_visita())
+
+
+# Valores reales de un rango de pacientes: id -> (citas, saldo, ultima_visita)
+def calcular(desde_id, hasta_id):
+    reales = defaultdict(lambda: [0, Decimal(0), None])
+    rango = {'paciente_id__gt': desde_id, 'paciente_id__lte': hasta_id}
+    for fila in Cita.objects.filter(**rango).values('paciente_id').annotate(n=Count('id')).order_by():
+        reales[fila['paciente_id']][0] = fila['n']
+    facturas = (
+        Factura.objects.filter(estado_pago=ESTADO_PENDIENTE, consulta__cita__paciente_id__gt=desde_id,
+                               consulta__cita__paciente_id__lte=hasta_id)
+        .values('consulta__cita__paciente_id').annotate(total=Sum('total')).order_by()
+    )
+    for fila in facturas:
+        reales[fila['consulta__cita__paciente_id']][1] = fila['total']
+    visitas = (
+        Cita.objects.filter(**rango).filter(Exists(Consulta.objects.filter(cita_id=OuterRef('pk'))))
+        .values('paciente_id').annotate(ultima=Max('fecha')).order_by()
+    )
+    for fila in visitas:
+        reales[fila['paciente_id']][2] = fila['ultima']
+    return reales
+
+
+# Recorre los pacientes por id y corrige los que se desviaron. Cada lote
+# bloquea sus filas antes de contar, así una cita que se está creando en
+# paralelo aplica su incremento después de la corrección y no se pierde.
+def reconciliar(tamano_lote=TAMANO_LOTE, desde_id=0, progreso=None):
+    corregidos = 0
+    revisados = 0
+    ultimo_id = desde_id
+    while True:
+        with transaction.atomic():
+            lote = list(
+                Paciente.objects.select_for_update().filter(id__gt=ultimo_id).order_by('id')
+                .values_list('id', 'citas_total', 'saldo_pendiente', 'ultima_visita')[:tamano_lote]
+            )
+            if not lote:
+                return corregidos
+            reales = calcular(ultimo_id, lote[-1][0])
+            desviados = [
+                Paciente(id=id, citas_total=real[0], saldo_pendiente=real[1], ultima_visita=real[2])
+                for id, *actual in lote
+                for real in [reales.get(id, (0, Decimal(0), None))]
+                if list(actual) != list(real)
+            ]
+            Paciente.objects.bulk_update(desviados, ['citas_total', 'saldo_pendiente', 'ultima_visita'])
+        corregidos += len(desviados)
+        revisados += len(lote)
+        ultimo_id = lote[-1][0]
+        if progreso:
+            progreso(revisados, corregidos, ultimo_id)
+        if len(lote) < tamano_lote:
+            return corregidos
@@ -0,0 +1,195 @@
+import logging
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cita, Factura, Paciente, ParDuplicado, RegistroArchivado
+from .texto import digitos, fonetica, trigramas
+from . import contadores, referencias
+
+# Detección de pacientes duplicados (el mismo paciente registrado dos veces
+# con errores de tipeo o el documento y el teléfono escritos de otra forma).
+# Comparar todos contra todos es O(n²); en su lugar cada paciente recibe unas
+# claves de bloqueo y solo se comparan los pacientes que comparten alguna:
+#   a:<apellido fonético>:<inicial fonética del nombre>
+#   f:<fecha de nacimiento>
+#   t:<últimos dígitos del teléfono>
+#   d:<documento sin puntos ni guiones>
+# Una primera pasada por lotes de id guarda solo los ids de cada bloque; las
+# fichas (nombre, documento, teléfono, fecha) se leen después por tandas de
+# bloques y se descartan al terminar cada tanda, así la memoria no crece con
+# el texto de toda la tabla. Dentro de cada bloque solo los pares cuya
+# similitud de trigramas del nombre puede superar el umbral se puntúan rasgo
+# por rasgo. Los pares resultantes quedan en ParDuplicado para revisión;
+# `fusionar` pasa las citas del duplicado al paciente conservado con un único
+# UPDATE.
+
+logger = logging.getLogger(__name__)
+
+UMBRAL = getattr(settings, 'DUPLICADOS_UMBRAL', 0.6)
+# Bloques mayores (p. ej. un teléfono de relleno repetido) no discriminan: se omiten
+BLOQUE_MAXIMO = getattr(settings, 'DUPLICADOS_BLOQUE_MAXIMO', 1000)
+TAMANO_LOTE = 2000
+DIGITOS_TELEFONO = 8
+# Peso de cada rasgo en el puntaje (suman 1)
+PESOS = {'nombre': 0.55, 'fecha': 0.2, 'documento': 0.15, 'telefono': 0.1}
+
+PENDIENTE = 'Pendiente'
+DESCARTADO = 'Descartado'
+
+
+class FusionInvalida(ValueError):
+    pass
+
+
+def documento_normalizado(valor):
+    return re.sub(r'[^0-9a-z]', '', (valor or '').casefold())
+
+
+# (nombre completo, documento, teléfono, fecha de nacimiento) ya normalizados
+def ficha(nombre, apellido, documento, telefono, fecha_nacimiento):
+    return (
+        f'{nombre} {apellido}', documento_normalizado(documento),
+        digitos(telefono)[-DIGITOS_TELEFONO:], fecha_nacimiento,
+    )
+
+
+def claves(nombre, apellido, documento, telefono, fecha_nacimiento):
+    resultado = []
+    apellido_fonetico = fonetica(apellido).split()
+    if apellido_fonetico:
+        resultado.append(f'a:{apellido_fonetico[0]}:{fonetica(nombre)[:1]}')
+    if fecha_nacimiento:
+        resultado.append(f'f:{fecha_nacimiento.isoformat()}')
+    telefono = digitos(telefono)[-DIGITOS_TELEFONO:]
+    if len(telefono) >= 6:
+        resultado.append(f't:{telefono}')
+    documento = documento_normalizado(documento)
+    if documento:
+        resultado.append(f'd:{documento}')
+    return resultado
+
+
+def puntuar(a, b, similitud_nombre):
+    motivos = [f'nombre {similitud_nombre:.2f}']
+    puntaje = PESOS['nombre'] * similitud_nombre
+    for rasgo, valor_a, valor_b in (('documento', a[1], b[1]), ('telefono', a[2], b[2]), ('fecha', a[3], b[3])):
+        if valor_a and valor_a == valor_b:
+            puntaje += PESOS[rasgo]
+            motivos.append(rasgo)
+    return round(puntaje, 4), ', '.join(motivos)
+
+
+# Pares (i, j, similitud) de un bloque, i < j, con similitud de nombre >= minimo
+def _candidatos(textos, minimo):
+    conjuntos = [trigramas(texto) for texto in textos]
+    pares = []
+    for i, a in enumerate(conjuntos):
+        for j in range(i + 1, len(conjuntos)):
+            b = conjuntos[j]
+            valor = len(a & b) / len(a | b) if a and b else 0.0
+            if valor >= minimo:
+                pares.append((i, j, valor))
+    return pares
+
+
+CAMPOS = ('nombre_normalizado', 'apellido_normalizado', 'documento_identidad', 'telefono', 'fecha_nacimiento')
+
+
+def _pacientes(tamano_lote):
+    ultimo_id = 0
+    while True:
+        lote = list(Paciente.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', *CAMPOS)[:tamano_lote])
+        if not lote:
+            return
+        yield from lote
+        ultimo_id = lote[-1][0]
+
+
+# (clave, ids) de los bloques con al menos un par por comparar
+def _bloques(tamano_lote):
+    bloques = defaultdict(list)
+    for id, *campos in _pacientes(tamano_lote):
+        for clave in claves(*campos):
+            bloques[clave].append(id)
+    for clave, ids in bloques.items():
+        if len(ids) > BLOQUE_MAXIMO:
+            logger.warning("Bloque %s omitido: %s pacientes", clave, len(ids))
+        elif len(ids) > 1:
+            yield clave, ids
+
+
+def _fichas(ids):
+    return {
+        id: ficha(*campos)
+        for id, *campos in Paciente.objects.filter(id__in=ids).values_list('id', *CAMPOS)
+    }
+
+
+# Bloques agrupados hasta reunir unos tamano_lote pacientes, con sus fichas
+def _tandas(bloques, tamano_lote):
+    tanda, ids = [], set()
+    for bloque in bloques:
+        tanda.append(bloque)
+        ids.update(bloque[1])
+        if len(ids) >= tamano_lote:
+            yield tanda, _fichas(ids)
+            tanda, ids = [], set()
+    if tanda:
+        yield tanda, _fichas(ids)
+
+
+def detectar(umbral=UMBRAL, tamano_lote=TAMANO_LOTE):
+    # Similitud de nombre mínima para que el par pueda alcanzar el umbral
+    minimo = max(0.0, (umbral - (1 - PESOS['nombre'])) / PESOS['nombre'])
+    antes = ParDuplicado.objects.count()
+    vistos = set()
+    for tanda, fichas in _tandas(_bloques(tamano_lote), tamano_lote):
+        pares = []
+        for clave, ids in tanda:
+            for i, j, similitud in _candidatos([fichas[id][0] for id in ids], minimo):
+                # Los ids de cada bloque están en orden creciente
+                par = (ids[i], ids[j])
+                if par in vistos:
+                    continue
+                vistos.add(par)
+                puntaje, motivos = puntuar(fichas[par[0]], fichas[par[1]], similitud)
+                if puntaje >= umbral:
+                    pares.append(ParDuplicado(paciente_a_id=par[0], paciente_b_id=par[1], puntaje=puntaje, motivos=motivos))
+        # Los pares ya en la cola (pendientes o descartados) no se duplican
+        ParDuplicado.objects.bulk_create(pares, batch_size=tamano_lote, ignore_conflicts=True)
+    return ParDuplicado.objects.count() - antes
+
+
+def descartar(pares):
+    return pares.filter(estado=PENDIENTE).update(estado=DESCARTADO, updated_at=timezone.now())
+
+
+# Pasa las citas (y con ellas consultas y facturas) del duplicado al paciente
+# conservado y elimina el duplicado, dejando una copia en RegistroArchivado
+def fusionar(conservar, duplicado):
+    if conservar.pk == duplicado.pk:
+        raise FusionInvalida("No se puede fusionar un paciente consigo mismo.")
+    with transaction.atomic():
+        movidas = Cita.objects.filter(paciente_id=duplicado.pk).update(
+            paciente_id=conservar.pk, updated_at=timezone.now(),
+        )
+        datos = Paciente.objects.filter(pk=duplicado.pk).values().first()
+        # Los contadores del duplicado pasan al conservado
+        Paciente.objects.filter(pk=conservar.pk).update(
+            citas_total=F('citas_total') + datos['citas_total'],
+            saldo_pendiente=F('saldo_pendiente') + datos['saldo_pendiente'],
+        )
+        contadores.recalcular_visitas([conservar.pk])
+        RegistroArchivado.objects.create(
+            modelo=Paciente._meta.label_lower, objeto_id=duplicado.pk, datos={**datos, 'fusionado_en': conservar.pk},
+        )
+        # Sin citas, el delete solo arrastra sus pares en la cola
+        duplicado.delete()
+    # El UPDATE masivo no emite señales: la cartera agrupa por paciente
+    referencias.invalidar_modelo(Factura)
+    return movidas
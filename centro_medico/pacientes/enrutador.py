@@ -0,0 +1,96 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Réplica de lectura: los listados, la búsqueda y los informes leen de la
+# réplica ('replica' en DATABASES) y todo lo demás va al primario. Para no
+# leer datos desactualizados por el retraso de replicación:
+#   - en cuanto una petición escribe, el resto de sus lecturas van al primario;
+#   - tras una petición que modifica datos, el navegador recibe la cookie
+#     COOKIE_PRIMARIO y sus peticiones siguientes usan el primario durante
+#     REPLICA_RETRASO_SEGUNDOS.
+
+ALIAS_REPLICA = 'replica'
+COOKIE_PRIMARIO = 'usar_primario'
+RETRASO_SEGUNDOS = getattr(settings, 'REPLICA_RETRASO_SEGUNDOS', 5)
+SUFIJOS_REPLICA = ('_lista',)
+RUTAS_REPLICA = getattr(settings, 'RUTAS_REPLICA', {
+    'pacientes_buscar', 'pacientes_exportar', 'cartera_informe', 'cartera_exportar', 'consultas_buscar',
+    'api_lista', 'api_detalle',
+})
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _Estado:
+    def __init__(self, lectura):
+        self.lectura = lectura
+        self.escribio = False
+
+
+_estado = ContextVar('enrutador_estado', default=None)
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in connections.settings
+
+
+def ruta_de_lectura(url_name):
+    return bool(url_name) and (url_name in RUTAS_REPLICA or url_name.endswith(SUFIJOS_REPLICA))
+
+
+class EnrutadorLecturas:
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado and estado.lectura and not estado.escribio and replica_configurada():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado:
+            estado.escribio = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != ALIAS_REPLICA
+
+
+def _iterar_en_replica(contenido, estado):
+    token = _estado.set(estado)
+    try:
+        yield from contenido
+    finally:
+        _estado.reset(token)
+
+
+class EnrutadorMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _estado.set(_Estado(lectura=False))
+        try:
+            response = self.get_response(request)
+            estado = _estado.get()
+        finally:
+            _estado.reset(token)
+        if request.method not in METODOS_SEGUROS:
+            response.set_cookie(COOKIE_PRIMARIO, '1', max_age=RETRASO_SEGUNDOS, httponly=True, samesite='Lax')
+        elif response.streaming and estado.lectura:
+            # Las exportaciones leen mientras se envía la respuesta
+            response.streaming_content = _iterar_en_replica(response.streaming_content, estado)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        estado.lectura = (
+            request.method in METODOS_SEGUROS
+            and COOKIE_PRIMARIO not in request.COOKIES
+            and ruta_de_lectura(request.resolver_match.url_name)
+        )
@@ -0,0 +1,108 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .bloqueos import bloqueo
+from .models import Consulta, Factura, Tarifa
+from .resumenes import sumar, FACTURAS_POR_ESTADO, ACUMULADO
+from . import contadores, referencias
+
+# Corrida de facturación: crea una factura pendiente por cada consulta que
+# todavía no tiene ninguna. La selección es un anti-join (NOT EXISTS) y se
+# recorre por id en lotes; cada lote se inserta en su propia transacción, así
+# que una corrida interrumpida se retoma volviendo a ejecutarla.
+
+TAMANO_LOTE = 1000
+BLOQUEO = 'facturacion'
+
+
+class FacturacionEnCurso(Exception):
+    pass
+
+
+class Resumen:
+    def __init__(self):
+        self.facturas = 0
+        self.monto = Decimal('0')
+        self.sin_tarifa = 0
+
+    def __str__(self):
+        texto = f"{self.facturas} facturas creadas por {self.monto}."
+        if self.sin_tarifa:
+            texto += f" {self.sin_tarifa} consultas sin tarifa para su especialidad."
+        return texto
+
+
+def consultas_sin_factura(consultas=None):
+    consultas = Consulta.objects.all() if consultas is None else consultas
+    return consultas.filter(~Exists(Factura.objects.filter(consulta_id=OuterRef('pk'))))
+
+
+def tarifas():
+    return {
+        tarifa.especialidad_id: tarifa
+        for tarifa in Tarifa.objects.only('especialidad_id', 'precio', 'dias_vencimiento')
+    }
+
+
+def _facturar_lote(filas, precios, hoy, resumen, simular):
+    facturas = []
+    saldos = contadores.nuevos_cambios()
+    for consulta_id, especialidad_id, paciente_id in filas:
+        tarifa = precios.get(especialidad_id)
+        if tarifa is None:
+            resumen.sin_tarifa += 1
+            continue
+        saldos[paciente_id][1] += tarifa.precio
+        facturas.append(Factura(
+            consulta_id=consulta_id, total=tarifa.precio, estado_pago='Pendiente',
+            fecha_vencimiento=hoy + datetime.timedelta(days=tarifa.dias_vencimiento),
+        ))
+    if not facturas:
+        return
+    monto = sum(factura.total for factura in facturas)
+    if not simular:
+        with transaction.atomic():
+            Factura.objects.bulk_create(facturas)
+            # bulk_create no emite señales: el resumen del dashboard se ajusta aquí
+            sumar(FACTURAS_POR_ESTADO, 'Pendiente', ACUMULADO, len(facturas), monto)
+            contadores.sumar(saldos)
+        referencias.invalidar_modelo(Factura)
+    resumen.facturas += len(facturas)
+    resumen.monto += monto
+
+
+def _corrida(consultas, hasta, tamano_lote, simular):
+    pendientes = consultas_sin_factura(consultas)
+    if hasta:
+        # Rango sobre el DateTimeField en lugar de __date: usa el índice y,
+        # en MySQL, descarta las particiones posteriores
+        fin = timezone.make_aware(datetime.datetime.combine(hasta + datetime.timedelta(days=1), datetime.time.min))
+        pendientes = pendientes.filter(created_at__lt=fin)
+    precios = tarifas()
+    hoy = timezone.localdate()
+    resumen = Resumen()
+    ultimo_id = 0
+    while True:
+        lote = list(
+            pendientes.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', 'cita__medico__especialidad_id', 'cita__paciente_id')[:tamano_lote]
+        )
+        if not lote:
+            return resumen
+        _facturar_lote(lote, precios, hoy, resumen, simular)
+        ultimo_id = lote[-1][0]
+
+
+def facturar(consultas=None, hasta=None, tamano_lote=TAMANO_LOTE, simular=False):
+    if simular:
+        return _corrida(consultas, hasta, tamano_lote, simular)
+    # Evita dos corridas simultáneas con un bloqueo de la base de datos (ver
+    # bloqueos.py); cada lote se sigue confirmando en su propia transacción
+    with bloqueo(BLOQUEO) as obtenido:
+        if not obtenido:
+            raise FacturacionEnCurso("Ya hay una corrida de facturación en curso.")
+        return _corrida(consultas, hasta, tamano_lote, simular)
@@ -1,6 +1,36 @@
 from django import forms
-from .models import Paciente, Medico, Cita, Consulta, Usuario, Especialidad, Factura
+from .models import Paciente, Medico, Cita, Consulta, Usuario, Especialidad, Factura, TerminoConsulta
 from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils import timezone
+import datetime
+
+from .reservas import ConflictoDeTurno, fecha_del_turno, turno_ocupado
+from .citas_lote import ACCIONES
+from . import referencias
+
+# Selector con autocompletado: un campo oculto con el id y un cuadro de texto
+# que consulta un endpoint JSON (static/js/autocompletar.js). Solo se carga la
+# etiqueta de la opción seleccionada, no la tabla completa.
+class AutocompletarWidget(forms.TextInput):
+    template_name = 'widgets/autocompletar.html'
+
+    def __init__(self, url_name, queryset, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+        self.queryset = queryset
+
+    def etiqueta(self, value):
+        if value in (None, ''):
+            return ''
+        objeto = self.queryset.filter(pk=value).first()
+        return str(objeto) if objeto else ''
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = reverse(self.url_name)
+        context['widget']['etiqueta'] = self.etiqueta(value)
+        return context
 
 # Formulario para Paciente
 class PacienteForm(forms.ModelForm):
@@ -20,6 +50,10 @@ class MedicoForm(forms.ModelForm):
     class Meta:
         model = Medico
         fields = ['nombre', 'apellido', 'especialidad', 'telefono', 'correo', 'disponibilidad']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['especialidad'].widget.choices = referencias.choices_especialidades()
     
     # Validación de correo electrónico
     def clean_correo(self):
@@ -32,15 +66,32 @@ class MedicoForm(forms.ModelForm):
 class CitaForm(forms.ModelForm):
     class Meta:
         model = Cita
-        fields = ['paciente', 'medico', 'fecha', 'hora', 'estado']
+        fields = ['paciente', 'medico', 'fecha', 'hora', 'estado', 'motivo']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['paciente'].queryset = Paciente.objects.para_opciones()
+        self.fields['medico'].queryset = Medico.objects.para_opciones()
+        # Las opciones se buscan por autocompletado; el queryset solo valida el id enviado
+        self.fields['paciente'].widget = AutocompletarWidget('autocompletar_pacientes', Paciente.objects.para_opciones())
+        self.fields['medico'].widget = AutocompletarWidget('autocompletar_medicos', Medico.objects.para_opciones())
     
-    # Validación de disponibilidad de la cita
-    def clean_fecha(self):
-        fecha = self.cleaned_data.get('fecha')
-        hora = self.cleaned_data.get('hora')
-        if Cita.objects.filter(fecha=fecha, hora=hora).exists():
-            raise ValidationError('Ya existe una cita en esta fecha y hora.')
-        return fecha
+    # Validación de disponibilidad del turno del médico. Es solo un aviso
+    # temprano: la garantía la da la restricción única de Turno al reservar.
+    def clean(self):
+        cleaned_data = super().clean()
+        medico = cleaned_data.get('medico')
+        fecha = cleaned_data.get('fecha')
+        hora = cleaned_data.get('hora')
+        if fecha and hora:
+            # El formulario envía solo el día; la hora de la cita va en 'hora'
+            fecha = timezone.make_aware(datetime.datetime.combine(fecha_del_turno(fecha), hora))
+            cleaned_data['fecha'] = fecha
+        if medico and fecha and hora and cleaned_data.get('estado') != 'Cancelada':
+            turno = turno_ocupado(medico.id, fecha, hora, excluir_cita=self.instance.pk)
+            if turno:
+                raise ValidationError(str(ConflictoDeTurno(turno)))
+        return cleaned_data
 
 # Formulario para Consulta
 class ConsultaForm(forms.ModelForm):
@@ -48,13 +99,17 @@ class ConsultaForm(forms.ModelForm):
         model = Consulta
         fields = ['cita', 'motivo', 'diagnostico', 'receta', 'indicaciones']
         widgets = {
-            'cita': forms.Select(attrs={'class': 'form-select'}),
             'motivo': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
             'diagnostico': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'receta': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'indicaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['cita'].queryset = Cita.objects.para_opciones()
+        self.fields['cita'].widget = AutocompletarWidget('autocompletar_citas', Cita.objects.para_opciones())
+
     def clean(self):
         cleaned_data = super().clean()
         motivo = cleaned_data.get('motivo')
@@ -111,3 +166,67 @@ class EspecialidadForm(forms.ModelForm):
             raise ValidationError('Ya existe una especialidad con este nombre.')
         return nombre
 
+# Búsqueda en el texto clínico de las consultas (ver pacientes/indice_consultas.py)
+class BusquedaConsultasForm(forms.Form):
+    q = forms.CharField(
+        label="Buscar", max_length=200,
+        help_text='Términos, prefijos (amoxi*) o frases entre comillas ("dolor de cabeza").',
+    )
+    campo = forms.ChoiceField(label="En", required=False, choices=[('', 'Todos los campos')] + TerminoConsulta.CAMPOS)
+    desde = forms.DateField(label="Desde", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    hasta = forms.DateField(label="Hasta", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde, hasta = cleaned_data.get('desde'), cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'.")
+        return cleaned_data
+
+# Ids marcados en un listado (varias casillas con el mismo nombre)
+class ListaIdsField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(id) for id in value]
+        except (TypeError, ValueError):
+            raise ValidationError("Identificadores de cita inválidos.")
+
+# Operación en lote sobre las citas marcadas o sobre las que cumplan el filtro
+class CitasLoteForm(forms.Form):
+    accion = forms.ChoiceField(label="Acción", choices=[(accion, accion.capitalize()) for accion in ACCIONES])
+    ids = ListaIdsField(required=False)
+    medico = forms.ModelChoiceField(label="Médico", queryset=Medico.objects.para_opciones(), required=False)
+    fecha = forms.DateField(label="Fecha", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    nueva_fecha = forms.DateField(label="Nueva fecha", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    nuevo_medico = forms.ModelChoiceField(label="Nuevo médico", queryset=Medico.objects.para_opciones(), required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['medico'].widget = AutocompletarWidget('autocompletar_medicos', Medico.objects.para_opciones())
+        self.fields['nuevo_medico'].widget = AutocompletarWidget('autocompletar_medicos', Medico.objects.para_opciones())
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Nunca se opera sobre todas las citas por omisión
+        if not (cleaned_data.get('ids') or cleaned_data.get('medico') or cleaned_data.get('fecha')):
+            raise ValidationError("Marque citas o filtre por médico y/o fecha.")
+        if cleaned_data.get('accion') == 'reprogramar' and not cleaned_data.get('nueva_fecha'):
+            self.add_error('nueva_fecha', "Indique la nueva fecha para reprogramar.")
+        return cleaned_data
+
+# Médico y día que muestra el tablero en vivo (ver pacientes/tablero.py)
+class TableroForm(forms.Form):
+    medico = forms.ModelChoiceField(label="Médico", queryset=Medico.objects.para_opciones(), required=False)
+    fecha = forms.DateField(label="Día", required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['medico'].widget = AutocompletarWidget('autocompletar_medicos', Medico.objects.para_opciones())
+
+    def medico_id(self):
+        medico = self.cleaned_data.get('medico')
+        return medico.id if medico else None
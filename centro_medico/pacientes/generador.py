@@ -0,0 +1,352 @@
+import contextlib
+import datetime
+import random
+from array import array
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Especialidad, Medico, Paciente, Cita, Consulta, Factura, Usuario, Turno
+from .agenda import regenerar_agenda
+from .resumenes import reconstruir
+from .indice_consultas import reindexar
+from .contadores import reconciliar
+from . import referencias
+
+# Generador de datos sintéticos para pruebas de carga. Todo se inserta con
+# bulk_create en lotes; los ids se leen de vuelta por rango (MySQL no los
+# devuelve en bulk_create), así que la memoria depende del número de
+# pacientes (8 bytes por id) y no del de citas.
+
+TAMANO_LOTE = 5000
+
+# Escalas predefinidas: número de pacientes. El resto de tablas se deriva
+# de las proporciones de PROPORCIONES.
+ESCALAS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '5m': 5_000_000,
+}
+
+PROPORCIONES = {
+    'pacientes_por_medico': 400,
+    'citas_por_paciente': 1.5,
+    'consultas_por_cita_atendida': 0.8,
+    'facturas_por_consulta': 0.9,
+    'medicos_por_secretaria': 5,
+}
+
+ESPECIALIDADES = [
+    ('Medicina General', Decimal('25')), ('Pediatría', Decimal('35')), ('Ginecología', Decimal('40')),
+    ('Cardiología', Decimal('60')), ('Dermatología', Decimal('45')), ('Traumatología', Decimal('50')),
+    ('Oftalmología', Decimal('45')), ('Otorrinolaringología', Decimal('45')), ('Neurología', Decimal('70')),
+    ('Psiquiatría', Decimal('55')), ('Endocrinología', Decimal('55')), ('Gastroenterología', Decimal('60')),
+    ('Urología', Decimal('50')), ('Neumología', Decimal('55')), ('Nutrición', Decimal('30')),
+]
+
+NOMBRES = [
+    'María', 'José', 'Ana', 'Luis', 'Carmen', 'Juan', 'Rosa', 'Carlos', 'Lucía', 'Jorge', 'Elena', 'Pedro',
+    'Sofía', 'Miguel', 'Valentina', 'Andrés', 'Camila', 'Diego', 'Isabel', 'Fernando', 'Gabriela', 'Javier',
+    'Paula', 'Ricardo', 'Daniela', 'Santiago', 'Mónica', 'Raúl', 'Patricia', 'Héctor', 'Verónica', 'Óscar',
+]
+APELLIDOS = [
+    'García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez', 'Martín',
+    'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Alonso', 'Gutiérrez',
+    'Navarro', 'Torres', 'Domínguez', 'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano', 'Blanco', 'Molina',
+    'Morales', 'Suárez', 'Ortega', 'Delgado', 'Castro', 'Ortiz', 'Rubio', 'Marín', 'Sanz', 'Núñez',
+]
+CALLES = ['Av. Amazonas', 'Calle Bolívar', 'Av. 10 de Agosto', 'Calle Sucre', 'Av. Colón', 'Calle Olmedo']
+DISPONIBILIDADES = [
+    'Lunes a Viernes, 9:00 AM - 5:00 PM',
+    'Lunes a Viernes, 8:00 AM - 1:00 PM',
+    'Lunes a Jueves, 2:00 PM - 7:00 PM',
+    'Lunes a Viernes, 9:00 AM - 1:00 PM; Sábado 9:00 AM - 12:00 PM',
+]
+MOTIVOS = ['Control', 'Dolor de cabeza', 'Fiebre', 'Chequeo anual', 'Dolor abdominal', 'Revisión de exámenes', 'Tos persistente']
+DIAGNOSTICOS = ['Sano', 'Gripe común', 'Migraña', 'Gastritis', 'Hipertensión', 'Dermatitis', 'Faringitis']
+
+# Horas de turno: de 8:00 a 16:30 cada media hora
+HORAS = [datetime.time(8 + i // 2, 30 * (i % 2)) for i in range(18)]
+DIAS_PASADOS = 730
+DIAS_FUTUROS = 60
+
+
+class Resultado(dict):
+    def __str__(self):
+        return ', '.join(f"{cantidad} {tabla}" for tabla, cantidad in self.items())
+
+
+# bulk_create aplica auto_now/auto_now_add con la hora actual; para que las
+# fechas sigan una distribución realista se desactivan durante la carga.
+@contextlib.contextmanager
+def _fechas_manuales(*modelos):
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for modelo in modelos for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _insertar(modelo, filas, tamano_lote):
+    lote = []
+    total = 0
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            with transaction.atomic():
+                modelo.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        with transaction.atomic():
+            modelo.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def _ultimo_id(modelo):
+    return modelo.objects.aggregate(m=Max('id'))['m'] or 0
+
+
+def _ids_desde(modelo, ultimo_id, tamano_lote):
+    ids = array('q')
+    while True:
+        lote = list(modelo.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:tamano_lote])
+        if not lote:
+            return ids
+        ids.extend(lote)
+        ultimo_id = lote[-1]
+
+
+def _momento(dia, hora=datetime.time(9, 0)):
+    return timezone.make_aware(datetime.datetime.combine(dia, hora))
+
+
+class Generador:
+    def __init__(self, pacientes, semilla=0, tamano_lote=TAMANO_LOTE, hoy=None, agenda=False):
+        self.n_pacientes = pacientes
+        self.agenda = agenda
+        self.rng = random.Random(semilla)
+        self.tamano_lote = tamano_lote
+        self.hoy = hoy or timezone.localdate()
+        self.n_medicos = max(3, pacientes // PROPORCIONES['pacientes_por_medico'])
+        # Días hábiles de la ventana de citas; cada uno tiene len(HORAS) turnos por médico
+        inicio = self.hoy - datetime.timedelta(days=DIAS_PASADOS)
+        self.dias = [
+            dia for dia in (inicio + datetime.timedelta(days=i) for i in range(DIAS_PASADOS + DIAS_FUTUROS))
+            if dia.weekday() < 5
+        ]
+
+    def _persona(self):
+        return self.rng.choice(NOMBRES), self.rng.choice(APELLIDOS)
+
+    def _telefono(self):
+        return f"09{self.rng.randrange(10**8):08d}"
+
+    def _fecha_pasada(self, dias):
+        return self.hoy - datetime.timedelta(days=int(dias * self.rng.random() ** 0.7))
+
+    def especialidades(self):
+        Especialidad.objects.bulk_create(
+            [Especialidad(nombre=nombre) for nombre, _ in ESPECIALIDADES], ignore_conflicts=True,
+        )
+        tarifas = dict(ESPECIALIDADES)
+        return {
+            id: tarifas.get(nombre, Decimal('40'))
+            for id, nombre in Especialidad.objects.values_list('id', 'nombre')
+        }
+
+    def medicos(self, especialidades):
+        nombres = dict(Especialidad.objects.filter(id__in=especialidades).values_list('id', 'nombre'))
+        ids = list(nombres)
+        # Medicina General y Pediatría concentran más médicos
+        pesos = [4 if nombres[i] in ('Medicina General', 'Pediatría') else 1 for i in ids]
+        ultimo = _ultimo_id(Medico)
+
+        def filas():
+            for i in range(self.n_medicos):
+                nombre, apellido = self._persona()
+                creado = _momento(self._fecha_pasada(DIAS_PASADOS * 2))
+                yield Medico(
+                    nombre=nombre, apellido=apellido, especialidad_id=self.rng.choices(ids, pesos)[0],
+                    telefono=self._telefono(), correo=f"medico{ultimo + i + 1}@centro.test",
+                    disponibilidad=self.rng.choice(DISPONIBILIDADES), created_at=creado, updated_at=creado,
+                )
+        _insertar(Medico, filas(), self.tamano_lote)
+        return list(Medico.objects.filter(id__gt=ultimo).order_by('id').values_list('id', 'especialidad_id'))
+
+    def pacientes(self):
+        ultimo = _ultimo_id(Paciente)
+
+        def filas():
+            for i in range(self.n_pacientes):
+                nombre, apellido = self._persona()
+                # Edades entre 0 y 95 años, con moda en los 40
+                edad = int(self.rng.triangular(0, 95, 40))
+                registro = _momento(self._fecha_pasada(DIAS_PASADOS * 2), HORAS[self.rng.randrange(len(HORAS))])
+                paciente = Paciente(
+                    nombre=nombre, apellido=f"{apellido} {self.rng.choice(APELLIDOS)}",
+                    documento_identidad=f"{10**9 + ultimo + i + 1}",
+                    direccion=f"{self.rng.choice(CALLES)} {self.rng.randrange(1, 2000)}",
+                    telefono=self._telefono(), correo=f"paciente{ultimo + i + 1}@correo.test",
+                    fecha_nacimiento=self.hoy - datetime.timedelta(days=edad * 365 + self.rng.randrange(365)),
+                    fecha_registro=registro, created_at=registro, updated_at=registro,
+                )
+                paciente.normalizar_nombres()
+                yield paciente
+        _insertar(Paciente, filas(), self.tamano_lote)
+        return _ids_desde(Paciente, ultimo, self.tamano_lote)
+
+    def _estado(self, dia):
+        if dia < self.hoy:
+            return self.rng.choices(['Confirmada', 'Cancelada', 'Ausente', 'Pendiente'], [75, 12, 8, 5])[0]
+        return self.rng.choices(['Pendiente', 'Confirmada', 'Cancelada'], [70, 25, 5])[0]
+
+    def citas(self, medicos, pacientes):
+        total = int(len(pacientes) * PROPORCIONES['citas_por_paciente'])
+        # Popularidad de los médicos con cola larga (tipo Zipf)
+        pesos = [1 / (rango + 1) ** 0.8 for rango in range(len(medicos))]
+        self.rng.shuffle(pesos)
+        suma = sum(pesos)
+        capacidad = len(self.dias) * len(HORAS)
+        ultimo = _ultimo_id(Cita)
+
+        def filas():
+            for (medico_id, _), peso in zip(medicos, pesos):
+                cantidad = min(capacidad, round(total * peso / suma))
+                # Turnos distintos por médico: nunca choca con la restricción única de Turno
+                for turno in sorted(self.rng.sample(range(capacidad), cantidad)):
+                    dia, hora = self.dias[turno // len(HORAS)], HORAS[turno % len(HORAS)]
+                    # Algunos pacientes vuelven mucho más que otros
+                    paciente_id = pacientes[int(len(pacientes) * self.rng.random() ** 1.5)]
+                    fecha = _momento(dia, hora)
+                    creada = fecha - datetime.timedelta(days=self.rng.randrange(1, 30))
+                    yield Cita(
+                        paciente_id=paciente_id, medico_id=medico_id, fecha=fecha, hora=hora,
+                        estado=self._estado(dia), motivo=self.rng.choice(MOTIVOS),
+                        created_at=creada, updated_at=creada,
+                    )
+        _insertar(Cita, filas(), self.tamano_lote)
+        return ultimo
+
+    # Turno de cada cita activa (misma lógica que la migración 0005)
+    def turnos(self, desde_id):
+        total = 0
+        while True:
+            lote = list(
+                Cita.objects.filter(id__gt=desde_id).exclude(estado='Cancelada')
+                .order_by('id').values_list('id', 'medico_id', 'fecha', 'hora')[:self.tamano_lote]
+            )
+            if not lote:
+                return total
+            Turno.objects.bulk_create([
+                Turno(cita_id=id, medico_id=medico_id, fecha=timezone.localdate(fecha), hora=hora)
+                for id, medico_id, fecha, hora in lote
+            ], ignore_conflicts=True)
+            total += len(lote)
+            desde_id = lote[-1][0]
+
+    def consultas(self, desde_cita_id):
+        ultimo = _ultimo_id(Consulta)
+        limite = _momento(self.hoy, datetime.time(0, 0))
+
+        def filas():
+            desde_id = desde_cita_id
+            while True:
+                lote = list(
+                    Cita.objects.filter(id__gt=desde_id, fecha__lt=limite).exclude(estado='Cancelada')
+                    .order_by('id').values_list('id', 'fecha', 'motivo')[:self.tamano_lote]
+                )
+                if not lote:
+                    return
+                for cita_id, fecha, motivo in lote:
+                    if self.rng.random() < PROPORCIONES['consultas_por_cita_atendida']:
+                        creada = fecha + datetime.timedelta(minutes=self.rng.randrange(10, 40))
+                        yield Consulta(
+                            cita_id=cita_id, motivo=motivo, diagnostico=self.rng.choice(DIAGNOSTICOS),
+                            receta='Paracetamol 500 mg cada 8 horas', indicaciones='Reposo e hidratación',
+                            created_at=creada, updated_at=creada,
+                        )
+                desde_id = lote[-1][0]
+        _insertar(Consulta, filas(), self.tamano_lote)
+        return ultimo
+
+    def facturas(self, desde_consulta_id, tarifas):
+        def filas():
+            desde_id = desde_consulta_id
+            while True:
+                lote = list(
+                    Consulta.objects.filter(id__gt=desde_id).order_by('id')
+                    .values_list('id', 'created_at', 'cita__medico__especialidad_id')[:self.tamano_lote]
+                )
+                if not lote:
+                    return
+                for consulta_id, creada, especialidad_id in lote:
+                    if self.rng.random() >= PROPORCIONES['facturas_por_consulta']:
+                        continue
+                    fecha = timezone.localdate(creada)
+                    # Las facturas antiguas casi siempre están pagadas
+                    pagada = self.rng.random() < (0.95 if (self.hoy - fecha).days > 60 else 0.5)
+                    total = (tarifas.get(especialidad_id, Decimal('40')) * Decimal(self.rng.uniform(0.8, 1.6))).quantize(Decimal('0.01'))
+                    yield Factura(
+                        consulta_id=consulta_id, fecha=fecha, total=total,
+                        estado_pago='Pagado' if pagada else 'Pendiente',
+                        fecha_vencimiento=fecha + datetime.timedelta(days=30),
+                        created_at=creada, updated_at=creada,
+                    )
+                desde_id = lote[-1][0]
+        return _insertar(Factura, filas(), self.tamano_lote)
+
+    def usuarios(self, medicos):
+        ultimo = _ultimo_id(Usuario)
+        secretarias = max(1, len(medicos) // PROPORCIONES['medicos_por_secretaria'])
+        roles = ['Medico'] * len(medicos) + ['Secretaria'] * secretarias + ['Administrador'] * 2
+
+        def filas():
+            for i, rol in enumerate(roles):
+                nombre, apellido = self._persona()
+                creado = _momento(self._fecha_pasada(DIAS_PASADOS * 2))
+                yield Usuario(
+                    nombre=f"{nombre} {apellido}", correo=f"usuario{ultimo + i + 1}@centro.test", rol=rol,
+                    contrasena='!', created_at=creado, updated_at=creado,
+                )
+        return _insertar(Usuario, filas(), self.tamano_lote)
+
+    def generar(self):
+        with _fechas_manuales(Medico, Paciente, Cita, Consulta, Factura, Usuario):
+            tarifas = self.especialidades()
+            medicos = self.medicos(tarifas)
+            pacientes = self.pacientes()
+            desde_cita = self.citas(medicos, pacientes)
+            turnos = self.turnos(desde_cita)
+            desde_consulta = self.consultas(desde_cita)
+            facturas = self.facturas(desde_consulta, tarifas)
+            usuarios = self.usuarios(medicos)
+        resultado = Resultado(
+            especialidades=len(tarifas), medicos=len(medicos), pacientes=len(pacientes),
+            citas=Cita.objects.filter(id__gt=desde_cita).count(), turnos=turnos,
+            consultas=Consulta.objects.filter(id__gt=desde_consulta).count(),
+            facturas=facturas, usuarios=usuarios,
+        )
+        # bulk_create no emite señales: se recalculan los datos derivados
+        reconstruir()
+        reconciliar(self.tamano_lote)
+        reindexar(self.tamano_lote, desde_id=desde_consulta)
+        if self.agenda:
+            regenerar_agenda(self.hoy, sincronizar=True)
+        referencias.invalidar(referencias.ESPECIALIDADES, referencias.CARTERA)
+        return resultado
+
+
+def generar_datos(pacientes, semilla=0, tamano_lote=TAMANO_LOTE, hoy=None, agenda=False):
+    return Generador(pacientes, semilla, tamano_lote, hoy, agenda).generar()
@@ -0,0 +1,200 @@
+import codecs
+import csv
+import datetime
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Paciente
+from .resumenes import sumar, PACIENTES_NUEVOS
+
+# Importación y exportación masiva de pacientes. Las filas se leen y se
+# escriben de forma incremental, así que la memoria usada depende del tamaño
+# del lote y no del tamaño del archivo.
+
+COLUMNAS = ['nombre', 'apellido', 'documento_identidad', 'direccion', 'telefono', 'correo', 'fecha_nacimiento']
+# Campos del modelo que no vienen en el archivo y no se validan por fila
+NO_IMPORTADOS = [campo.name for campo in Paciente._meta.fields if campo.name not in COLUMNAS]
+TAMANO_LOTE = 1000
+
+
+class Resumen:
+    def __init__(self):
+        self.insertados = 0
+        self.rechazados = 0
+
+    def __str__(self):
+        return f"{self.insertados} pacientes importados, {self.rechazados} filas rechazadas."
+
+
+# El archivo se lee como UTF-8 (con o sin BOM). Se comprueba entero antes de
+# importar, por bloques, para no cortar la importación a mitad de camino; un
+# CSV guardado por Excel suele venir en cp1252
+def es_utf8(subido):
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for bloque in subido.chunks():
+            decodificador.decode(bloque)
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    finally:
+        subido.seek(0)
+    return True
+
+
+def leer_filas(archivo, formato='csv'):
+    if formato == 'jsonl':
+        for linea in archivo:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                fila = None
+            yield fila if isinstance(fila, dict) else {'_error': f"JSON inválido: {linea[:80]}"}
+    else:
+        yield from csv.DictReader(archivo)
+
+
+def validar_fila(fila):
+    if '_error' in fila:
+        raise ValidationError(fila['_error'])
+    datos = {columna: str(fila.get(columna) or '').strip() for columna in COLUMNAS}
+    faltantes = [columna for columna, valor in datos.items() if not valor]
+    if faltantes:
+        raise ValidationError(f"Faltan campos obligatorios: {', '.join(faltantes)}.")
+    try:
+        datos['fecha_nacimiento'] = datetime.date.fromisoformat(datos['fecha_nacimiento'])
+    except ValueError:
+        raise ValidationError(f"La fecha de nacimiento '{datos['fecha_nacimiento']}' debe tener el formato AAAA-MM-DD.")
+    paciente = Paciente(**datos)
+    # Validadores y max_length de cada columna: un valor demasiado largo se
+    # rechaza aquí y no como DataError a mitad de la importación
+    try:
+        paciente.clean_fields(exclude=NO_IMPORTADOS)
+    except ValidationError as error:
+        raise ValidationError([
+            f"{campo}: {' '.join(mensajes)}" for campo, mensajes in error.message_dict.items()
+        ])
+    # bulk_create no llama a save(), que es quien rellena estas columnas
+    paciente.normalizar_nombres()
+    return paciente
+
+
+class EscritorRechazos:
+    def __init__(self, destino):
+        self.writer = csv.writer(destino) if destino is not None else None
+        if self.writer:
+            self.writer.writerow(COLUMNAS + ['error'])
+
+    def escribir(self, fila, error):
+        if self.writer:
+            self.writer.writerow([fila.get(columna, '') for columna in COLUMNAS] + [error])
+
+
+def _insertar_lote(lote, escritor, resumen):
+    # Una sola consulta por lote para descartar documentos ya registrados
+    existentes = set(
+        Paciente.objects.filter(documento_identidad__in=[p.documento_identidad for p, _ in lote])
+        .values_list('documento_identidad', flat=True)
+    )
+    nuevos = []
+    for paciente, fila in lote:
+        if paciente.documento_identidad in existentes:
+            escritor.escribir(fila, 'Ya existe un paciente con este número de documento.')
+            resumen.rechazados += 1
+        else:
+            nuevos.append((paciente, fila))
+    try:
+        with transaction.atomic():
+            Paciente.objects.bulk_create([paciente for paciente, _ in nuevos])
+            _registrar_nuevos(len(nuevos))
+    except IntegrityError:
+        # Otro proceso insertó alguno de los documentos entre la consulta y el
+        # insert: se reintenta fila por fila y se rechazan solo las que fallan
+        nuevos = _insertar_por_fila(nuevos, escritor, resumen)
+        with transaction.atomic():
+            _registrar_nuevos(len(nuevos))
+    resumen.insertados += len(nuevos)
+
+
+def _insertar_por_fila(lote, escritor, resumen):
+    insertados = []
+    for paciente, fila in lote:
+        try:
+            with transaction.atomic():
+                Paciente.objects.bulk_create([paciente])
+        except IntegrityError:
+            escritor.escribir(fila, 'Ya existe un paciente con este número de documento.')
+            resumen.rechazados += 1
+        except DataError:
+            escritor.escribir(fila, 'La base de datos rechazó alguno de los valores.')
+            resumen.rechazados += 1
+        else:
+            insertados.append((paciente, fila))
+    return insertados
+
+
+def _registrar_nuevos(cantidad):
+    # bulk_create no emite señales: se actualiza el resumen del día a mano
+    if cantidad:
+        sumar(PACIENTES_NUEVOS, '', timezone.localdate(), cantidad)
+
+
+def importar_pacientes(filas, tamano_lote=TAMANO_LOTE, rechazos=None):
+    resumen = Resumen()
+    escritor = EscritorRechazos(rechazos)
+    lote, documentos = [], set()
+    for fila in filas:
+        try:
+            paciente = validar_fila(fila)
+        except ValidationError as error:
+            escritor.escribir(fila, ' '.join(error.messages))
+            resumen.rechazados += 1
+            continue
+        if paciente.documento_identidad in documentos:
+            escritor.escribir(fila, 'Documento repetido dentro del archivo.')
+            resumen.rechazados += 1
+            continue
+        documentos.add(paciente.documento_identidad)
+        lote.append((paciente, fila))
+        if len(lote) >= tamano_lote:
+            _insertar_lote(lote, escritor, resumen)
+            lote, documentos = [], set()
+    if lote:
+        _insertar_lote(lote, escritor, resumen)
+    return resumen
+
+
+# Recorre la tabla por lotes de id (sin OFFSET ni cargar todo en memoria)
+def lotes_de_pacientes(tamano_lote=TAMANO_LOTE):
+    ultimo_id = 0
+    while True:
+        lote = list(Paciente.objects.only('id', *COLUMNAS).filter(id__gt=ultimo_id).order_by('id')[:tamano_lote])
+        if not lote:
+            return
+        yield lote
+        ultimo_id = lote[-1].id
+
+
+# Genera el CSV por fragmentos, uno por lote, para StreamingHttpResponse
+def exportar_pacientes_csv(tamano_lote=TAMANO_LOTE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS)
+    for lote in lotes_de_pacientes(tamano_lote):
+        for paciente in lote:
+            writer.writerow([
+                paciente.fecha_nacimiento.isoformat() if columna == 'fecha_nacimiento' else getattr(paciente, columna)
+                for columna in COLUMNAS
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,209 @@
+import datetime
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from .models import Consulta, TerminoConsulta
+from .texto import tokens
+
+# Búsqueda en el texto de las consultas (motivo, diagnóstico, receta e
+# indicaciones) mediante un índice invertido propio: TerminoConsulta guarda
+# cada término normalizado con sus posiciones, indexado por (termino,
+# consulta). Funciona igual en MySQL y SQLite y admite:
+#   amoxicilina           término exacto
+#   amoxi*                prefijo (termino LIKE 'amoxi%', por índice)
+#   "dolor de cabeza"     frase (se comprueban las posiciones)
+# Todos los términos deben aparecer (AND). Los resultados se ordenan por
+# frecuencia de los términos ponderada según el campo donde aparecen.
+
+CAMPOS_INDEXADOS = {'m': 'motivo', 'd': 'diagnostico', 'r': 'receta', 'i': 'indicaciones'}
+PESOS = {'d': 3, 'r': 2, 'm': 1, 'i': 1}
+LARGO_TERMINO = TerminoConsulta._meta.get_field('termino').max_length
+# Palabras demasiado frecuentes para servir de filtro; no se indexan pero
+# cuentan para las posiciones, así "dolor de cabeza" sigue siendo una frase
+VACIAS = frozenset(
+    'a al con de del e el en la las lo los o para por que se sin su un una y'.split()
+)
+
+LIMITE_RESULTADOS = getattr(settings, 'BUSQUEDA_CONSULTAS_LIMITE', 50)
+# Candidatos revisados como máximo para verificar las frases
+MAXIMO_CANDIDATOS_FRASE = 5000
+TAMANO_PAGINA_FRASE = 200
+TAMANO_LOTE = 1000
+
+PATRON_CONSULTA = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def _termino(palabra):
+    return palabra[:LARGO_TERMINO]
+
+
+def terminos(consulta_id, textos):
+    for campo, texto in textos.items():
+        posiciones = defaultdict(list)
+        for i, palabra in enumerate(tokens(texto)):
+            if palabra not in VACIAS:
+                posiciones[_termino(palabra)].append(i)
+        for termino, lista in posiciones.items():
+            yield TerminoConsulta(
+                termino=termino, consulta_id=consulta_id, campo=campo,
+                frecuencia=min(len(lista), 32767), posiciones=' '.join(map(str, lista)),
+            )
+
+
+def indexar(consulta):
+    textos = {campo: getattr(consulta, nombre) for campo, nombre in CAMPOS_INDEXADOS.items()}
+    with transaction.atomic():
+        TerminoConsulta.objects.filter(consulta_id=consulta.pk).delete()
+        TerminoConsulta.objects.bulk_create(terminos(consulta.pk, textos))
+
+
+# Reconstruye el índice recorriendo las consultas por id en lotes; cada lote
+# se reemplaza en su propia transacción, así que se puede retomar con desde_id.
+def reindexar(tamano_lote=TAMANO_LOTE, desde_id=0, progreso=None):
+    total = 0
+    ultimo_id = desde_id
+    while True:
+        lote = list(
+            Consulta.objects.filter(id__gt=ultimo_id).order_by('id')
+            .values_list('id', *CAMPOS_INDEXADOS.values())[:tamano_lote]
+        )
+        if not lote:
+            return total
+        filas = [
+            termino
+            for consulta_id, *textos in lote
+            for termino in terminos(consulta_id, dict(zip(CAMPOS_INDEXADOS, textos)))
+        ]
+        with transaction.atomic():
+            TerminoConsulta.objects.filter(consulta_id__gt=ultimo_id, consulta_id__lte=lote[-1][0]).delete()
+            TerminoConsulta.objects.bulk_create(filas, batch_size=tamano_lote)
+        total += len(lote)
+        ultimo_id = lote[-1][0]
+        if progreso:
+            progreso(total, ultimo_id)
+        if len(lote) < tamano_lote:
+            return total
+
+
+# Consulta de búsqueda interpretada: condiciones que debe cumplir cada
+# consulta (una por término o prefijo) y frases a verificar por posiciones.
+class Busqueda:
+    def __init__(self):
+        self.condiciones = []
+        self.frases = []
+
+    def __bool__(self):
+        return bool(self.condiciones)
+
+
+def interpretar(texto):
+    busqueda = Busqueda()
+    for frase, palabra in PATRON_CONSULTA.findall(texto or ''):
+        if frase:
+            # (desplazamiento dentro de la frase, término)
+            partes = [(i, _termino(p)) for i, p in enumerate(tokens(frase)) if p not in VACIAS]
+            busqueda.condiciones.extend(Q(termino=termino) for _, termino in partes)
+            if len(partes) > 1:
+                busqueda.frases.append(partes)
+            continue
+        palabras = [p for p in tokens(palabra) if p not in VACIAS]
+        for i, p in enumerate(palabras):
+            if palabra.endswith('*') and i == len(palabras) - 1:
+                busqueda.condiciones.append(Q(termino__startswith=_termino(p)))
+            else:
+                busqueda.condiciones.append(Q(termino=_termino(p)))
+    return busqueda
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def consultas_coincidentes(busqueda, desde=None, hasta=None, campos=None):
+    filtro_campos = Q(campo__in=campos) if campos else Q()
+    consultas = Consulta.objects.all()
+    # Rango sobre cita.fecha (DateTimeField) sin __date, para usar el índice
+    if desde:
+        consultas = consultas.filter(cita__fecha__gte=_inicio_del_dia(desde))
+    if hasta:
+        consultas = consultas.filter(cita__fecha__lt=_inicio_del_dia(hasta + datetime.timedelta(days=1)))
+    for condicion in busqueda.condiciones:
+        consultas = consultas.filter(
+            id__in=TerminoConsulta.objects.filter(condicion, filtro_campos).values('consulta_id')
+        )
+    cualquiera = Q()
+    for condicion in busqueda.condiciones:
+        cualquiera |= condicion
+    peso = Case(
+        *[When(campo=campo, then=Value(valor)) for campo, valor in PESOS.items()],
+        default=Value(1), output_field=IntegerField(),
+    )
+    puntaje = (
+        TerminoConsulta.objects.filter(cualquiera, filtro_campos, consulta_id=OuterRef('pk'))
+        .order_by().values('consulta_id').annotate(puntaje=Sum(peso * F('frecuencia'))).values('puntaje')
+    )
+    return (
+        consultas.annotate(relevancia=Subquery(puntaje, output_field=IntegerField()))
+        .select_related('cita__paciente', 'cita__medico')
+        .only(
+            'id', 'diagnostico', 'receta', 'cita__fecha',
+            'cita__paciente__nombre', 'cita__paciente__apellido', 'cita__paciente__documento_identidad',
+            'cita__medico__nombre', 'cita__medico__apellido',
+        )
+        .order_by('-relevancia', '-cita__fecha', '-id')
+    )
+
+
+def _contiene(posiciones, frase):
+    (desplazamiento, primero), *resto = frase
+    for inicio in posiciones.get(primero, ()):
+        base = inicio - desplazamiento
+        if all(base + i in posiciones.get(termino, ()) for i, termino in resto):
+            return True
+    return False
+
+
+# Recorre los candidatos ya ordenados por página y se queda con los que
+# contienen todas las frases en un mismo campo
+def _filtrar_frases(consultas, frases, campos, limite):
+    terminos_frases = {termino for frase in frases for _, termino in frase}
+    resultado = []
+    for inicio in range(0, MAXIMO_CANDIDATOS_FRASE, TAMANO_PAGINA_FRASE):
+        pagina = list(consultas[inicio:inicio + TAMANO_PAGINA_FRASE])
+        posiciones = defaultdict(dict)
+        filas = TerminoConsulta.objects.filter(
+            consulta_id__in=[consulta.id for consulta in pagina], termino__in=terminos_frases,
+        ).values_list('consulta_id', 'campo', 'termino', 'posiciones')
+        for consulta_id, campo, termino, lista in filas:
+            if not campos or campo in campos:
+                posiciones[consulta_id].setdefault(campo, {})[termino] = {int(p) for p in lista.split()}
+        for consulta in pagina:
+            por_campo = posiciones[consulta.id].values()
+            if all(any(_contiene(mapa, frase) for mapa in por_campo) for frase in frases):
+                resultado.append(consulta)
+                if len(resultado) == limite:
+                    return resultado
+        if len(pagina) < TAMANO_PAGINA_FRASE:
+            break
+    return resultado
+
+
+def buscar_consultas(texto, desde=None, hasta=None, campos=None, limite=LIMITE_RESULTADOS):
+    busqueda = interpretar(texto)
+    if not busqueda:
+        return []
+    consultas = consultas_coincidentes(busqueda, desde, hasta, campos)
+    if busqueda.frases:
+        return _filtrar_frases(consultas, busqueda.frases, campos, limite)
+    return list(consultas[:limite])
+
+
+# Identificadores de las consultas encontradas, para filtrar querysets (admin).
+# Con limite=None se devuelven todas: el admin pagina el resultado por su cuenta
+def ids_consultas(texto, limite=LIMITE_RESULTADOS):
+    return [consulta.id for consulta in buscar_consultas(texto, limite=limite)]
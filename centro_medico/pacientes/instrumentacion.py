@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+# Instrumentación por petición: tiempo total, tiempo y número de consultas
+# SQL (y cuántas se repiten con los mismos parámetros), tiempo de render de
+# plantillas y tamaño de la respuesta, por nombre de ruta. Se publica en la
+# cabecera Server-Timing, en una línea de log (logger 'pacientes.rendimiento')
+# y en histogramas en memoria que expone /metrics en formato Prometheus.
+# El render se mide con el backend de plantillas PlantillasMedidas
+# (TEMPLATES en settings.py); la línea de log es de nivel DEBUG.
+# Los histogramas son del proceso: con varios workers cada uno tiene los suyos.
+
+logger = logging.getLogger('pacientes.rendimiento')
+
+PREFIJO = 'centro_medico'
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+BUCKETS_BYTES = (1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000)
+# Rutas que no se miden: el propio endpoint de métricas y el flujo del
+# tablero, una conexión que dura horas
+RUTAS_EXCLUIDAS = getattr(settings, 'INSTRUMENTACION_RUTAS_EXCLUIDAS', {'metricas', 'citas_eventos'})
+LOG_ACTIVO = getattr(settings, 'INSTRUMENTACION_LOG', True)
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.db = 0.0
+        self.consultas = 0
+        self.duplicadas = 0
+        self.plantillas = 0.0
+        self._vistas = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - inicio
+            self.consultas += 1
+            clave = (sql, repr(params)) if not many else sql
+            if clave in self._vistas:
+                self.duplicadas += 1
+            else:
+                self._vistas.add(clave)
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+
+# El render de una plantilla de nivel superior (render(), TemplateResponse)
+# pasa por el Template del backend; los {% include %} no, así que no se
+# cuentan dos veces. Fuera de una petición medida se renderiza sin más. El
+# SQL que se ejecuta durante el render (querysets perezosos) aparece tanto en
+# db como en tpl.
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _medicion_actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.plantillas += time.perf_counter() - inicio
+
+
+class PlantillasMedidas(DjangoTemplates):
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name).template, self)
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.series = {}
+
+    def observar(self, ruta, valor):
+        serie = self.series.get(ruta)
+        if serie is None:
+            serie = self.series[ruta] = [[0] * len(self.buckets), 0, 0.0]
+        conteos = serie[0]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                conteos[i] += 1
+        serie[1] += 1
+        serie[2] += valor
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        for ruta, (conteos, cantidad, suma) in sorted(self.series.items()):
+            for limite, conteo in zip(self.buckets, conteos):
+                lineas.append(f'{self.nombre}_bucket{{ruta="{ruta}",le="{limite}"}} {conteo}')
+            lineas.append(f'{self.nombre}_bucket{{ruta="{ruta}",le="+Inf"}} {cantidad}')
+            lineas.append(f'{self.nombre}_sum{{ruta="{ruta}"}} {suma}')
+            lineas.append(f'{self.nombre}_count{{ruta="{ruta}"}} {cantidad}')
+        return lineas
+
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.series = {}
+
+    def sumar(self, etiquetas, valor=1):
+        self.series[etiquetas] = self.series.get(etiquetas, 0) + valor
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} counter']
+        for etiquetas, valor in sorted(self.series.items()):
+            texto = ','.join(f'{clave}="{valor_etiqueta}"' for clave, valor_etiqueta in etiquetas)
+            lineas.append(f'{self.nombre}{{{texto}}} {valor}')
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.peticiones = Contador(f'{PREFIJO}_peticiones_total', 'Peticiones atendidas por ruta, método y estado.')
+        self.duplicadas = Contador(f'{PREFIJO}_consultas_duplicadas_total', 'Consultas SQL repetidas con los mismos parámetros.')
+        self.histogramas = {
+            'total': Histograma(f'{PREFIJO}_peticion_segundos', 'Duración total de la petición.', BUCKETS_SEGUNDOS),
+            'db': Histograma(f'{PREFIJO}_db_segundos', 'Tiempo en consultas SQL por petición.', BUCKETS_SEGUNDOS),
+            'plantillas': Histograma(f'{PREFIJO}_plantillas_segundos', 'Tiempo de render de plantillas por petición.', BUCKETS_SEGUNDOS),
+            'consultas': Histograma(f'{PREFIJO}_consultas', 'Consultas SQL por petición.', BUCKETS_CONSULTAS),
+            'bytes': Histograma(f'{PREFIJO}_respuesta_bytes', 'Tamaño del cuerpo de la respuesta.', BUCKETS_BYTES),
+        }
+
+    def registrar(self, ruta, metodo, estado, valores):
+        with self._lock:
+            self.peticiones.sumar((('ruta', ruta), ('metodo', metodo), ('estado', str(estado))))
+            if valores['duplicadas']:
+                self.duplicadas.sumar((('ruta', ruta),), valores['duplicadas'])
+            for clave, histograma in self.histogramas.items():
+                if valores.get(clave) is not None:
+                    histograma.observar(ruta, valores[clave])
+
+    def exponer(self):
+        with self._lock:
+            lineas = self.peticiones.exponer() + self.duplicadas.exponer()
+            for histograma in self.histogramas.values():
+                lineas += histograma.exponer()
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+
+def _server_timing(valores):
+    return ', '.join([
+        f'db;dur={valores["db"] * 1000:.1f};desc="{valores["consultas"]} consultas, {valores["duplicadas"]} duplicadas"',
+        f'tpl;dur={valores["plantillas"] * 1000:.1f}',
+        f'total;dur={valores["total"] * 1000:.1f}',
+    ])
+
+
+class InstrumentacionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        token = _medicion_actual.set(medicion)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(token)
+        coincidencia = getattr(request, 'resolver_match', None)
+        ruta = (coincidencia.url_name if coincidencia else None) or 'sin_ruta'
+        if ruta in RUTAS_EXCLUIDAS:
+            return response
+        # El tamaño de las respuestas en streaming no se conoce hasta enviarlas
+        valores = {
+            'total': medicion.total(),
+            'db': medicion.db,
+            'plantillas': medicion.plantillas,
+            'consultas': medicion.consultas,
+            'duplicadas': medicion.duplicadas,
+            'bytes': None if response.streaming else len(response.content),
+        }
+        registro.registrar(ruta, request.method, response.status_code, valores)
+        response['Server-Timing'] = _server_timing(valores)
+        if LOG_ACTIVO and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'ruta=%s metodo=%s estado=%s total_ms=%.1f db_ms=%.1f consultas=%d duplicadas=%d plantillas_ms=%.1f bytes=%s',
+                ruta, request.method, response.status_code, valores['total'] * 1000, valores['db'] * 1000,
+                valores['consultas'], valores['duplicadas'], valores['plantillas'] * 1000,
+                '-' if valores['bytes'] is None else valores['bytes'],
+                extra={'ruta': ruta, 'metricas': valores},
+            )
+        return response
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes import benchmark
+
+
+class Command(BaseCommand):
+    help = "Mide latencia, consultas y memoria de cada ruta y la compara con una línea base JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=benchmark.REPETICIONES)
+        parser.add_argument('--rutas', nargs='*', help="Nombres de ruta a medir (por defecto todas).")
+        parser.add_argument('--excluir', nargs='*', default=[], help="Nombres de ruta a omitir.")
+        parser.add_argument('--salida', help="Archivo JSON donde se guarda el resultado (línea base).")
+        parser.add_argument('--comparar', help="Línea base JSON contra la que se buscan regresiones.")
+        parser.add_argument('--tolerancia', type=float, default=benchmark.TOLERANCIA,
+                            help="Aumento relativo de p95 permitido (0.2 = 20%%).")
+
+    def escribir(self, nombre, medida):
+        self.stdout.write(
+            f"{nombre:<28} {medida['estado']}  p50 {medida['p50_ms']:>9.2f} ms  p95 {medida['p95_ms']:>9.2f} ms  "
+            f"p99 {medida['p99_ms']:>9.2f} ms  {medida['consultas']:>4} consultas  {medida['memoria_pico_kb']:>9.1f} KB"
+        )
+
+    def handle(self, *args, **options):
+        base = None
+        if options['comparar']:
+            try:
+                base = benchmark.cargar(options['comparar'])
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"No se pudo leer la línea base: {exc}")
+        resultado = benchmark.ejecutar(
+            options['repeticiones'], options['rutas'], options['excluir'], salida=self.escribir,
+        )
+        if options['salida']:
+            benchmark.guardar(resultado, options['salida'])
+            self.stdout.write(self.style.SUCCESS(f"Resultado guardado en {options['salida']}."))
+        if base is not None:
+            regresiones = benchmark.comparar(base, resultado, options['tolerancia'])
+            if regresiones:
+                raise CommandError("Regresiones de rendimiento:\n  " + "\n  ".join(regresiones))
+            self.stdout.write(self.style.SUCCESS("Sin regresiones frente a la línea base."))
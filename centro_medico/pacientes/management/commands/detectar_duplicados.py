@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pacientes.duplicados import detectar, TAMANO_LOTE, UMBRAL
+
+
+class Command(BaseCommand):
+    help = "Busca pacientes posiblemente duplicados y los deja en la cola de revisión del admin."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--umbral', type=float, default=UMBRAL, help="Puntaje mínimo (0 a 1) de un par candidato.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Pacientes leídos por consulta.")
+
+    def handle(self, *args, **options):
+        nuevos = detectar(options['umbral'], options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"{nuevos} pares nuevos en la cola de revisión."))
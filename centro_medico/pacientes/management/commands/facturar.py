@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.facturacion import facturar, FacturacionEnCurso, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Crea en lote las facturas de las consultas que aún no tienen una, con la tarifa de su especialidad."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help="Solo consultas registradas hasta esta fecha (AAAA-MM-DD), p. ej. fin de mes.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Consultas por lote.")
+        parser.add_argument('--simular', action='store_true', help="Calcula el resultado sin crear facturas.")
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            try:
+                hasta = datetime.date.fromisoformat(options['hasta'])
+            except ValueError:
+                raise CommandError("La fecha --hasta debe tener el formato AAAA-MM-DD.")
+        try:
+            resumen = facturar(hasta=hasta, tamano_lote=options['lote'], simular=options['simular'])
+        except FacturacionEnCurso as exc:
+            raise CommandError(str(exc))
+        prefijo = "Simulación: " if options['simular'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefijo}{resumen}"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.generador import generar_datos, ESCALAS, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Genera datos sintéticos de la clínica para pruebas de carga (bulk_create por lotes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', choices=list(ESCALAS), default='10k', help="Número de pacientes predefinido.")
+        parser.add_argument('--pacientes', type=int, help="Número exacto de pacientes (reemplaza --escala).")
+        parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador aleatorio.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por bulk_create.")
+        parser.add_argument('--agenda', action='store_true', help="Regenera también horarios y turnos libres.")
+
+    def handle(self, *args, **options):
+        pacientes = options['pacientes'] or ESCALAS[options['escala']]
+        if pacientes <= 0:
+            raise CommandError("El número de pacientes debe ser positivo.")
+        resultado = generar_datos(pacientes, options['semilla'], options['lote'], agenda=options['agenda'])
+        self.stdout.write(self.style.SUCCESS(f"Datos generados: {resultado}."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.importacion import importar_pacientes, leer_filas, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Importa pacientes desde un archivo CSV o JSONL en lotes con bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo a importar.")
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Por defecto se deduce de la extensión.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por bulk_create.")
+        parser.add_argument('--rechazos', help="Archivo CSV donde se escriben las filas rechazadas.")
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('jsonl' if options['archivo'].endswith(('.jsonl', '.json')) else 'csv')
+        try:
+            archivo = open(options['archivo'], newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(f"No se pudo abrir el archivo: {exc}")
+        rechazos = open(options['rechazos'], 'w', newline='', encoding='utf-8') if options['rechazos'] else None
+        try:
+            resumen = importar_pacientes(leer_filas(archivo, formato), options['lote'], rechazos)
+        finally:
+            archivo.close()
+            if rechazos:
+                rechazos.close()
+        self.stdout.write(self.style.SUCCESS(str(resumen)))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.cartera import AGRUPACIONES, encabezados, exportar_csv, filas_cartera
+from pacientes.xlsx import generar_xlsx
+
+
+class Command(BaseCommand):
+    help = "Exporta la antigüedad de la cartera (facturas pendientes por tramos de vencimiento)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agrupacion', choices=list(AGRUPACIONES), default='paciente')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--salida', help="Archivo de salida (por defecto la salida estándar, solo CSV).")
+
+    def handle(self, *args, **options):
+        agrupacion = options['agrupacion']
+        if options['formato'] == 'xlsx' and not options['salida']:
+            raise CommandError("El formato xlsx requiere --salida.")
+        if not options['salida']:
+            for fragmento in exportar_csv(agrupacion):
+                self.stdout.write(fragmento, ending='')
+            return
+        if options['formato'] == 'xlsx':
+            fragmentos = generar_xlsx(encabezados(agrupacion), filas_cartera(agrupacion), hoja='Cartera')
+        else:
+            fragmentos = (fragmento.encode('utf-8') for fragmento in exportar_csv(agrupacion))
+        with open(options['salida'], 'wb') as archivo:
+            for fragmento in fragmentos:
+                archivo.write(fragmento)
+        self.stdout.write(self.style.SUCCESS(f"Informe guardado en {options['salida']}."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.particiones import (
+    cerrar_anios, particionar, particiones, ParticionNoDisponible, SUFIJO_ANTERIOR, TABLAS, TAMANO_LOTE,
+)
+
+
+class Command(BaseCommand):
+    help = "Particiona por año la tabla de citas (MySQL), copiando las filas en lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tablas', nargs='*', help=f"Tablas a particionar: {', '.join(TABLAS)} (todas por defecto).")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por lote.")
+        parser.add_argument(
+            '--cerrar-anios', action='store_true',
+            help="En tablas ya particionadas, separa los años terminados de la partición actual.",
+        )
+
+    def handle(self, *args, **options):
+        desconocidas = set(options['tablas']) - set(TABLAS)
+        if desconocidas:
+            raise CommandError(f"Tablas desconocidas: {', '.join(sorted(desconocidas))}.")
+        for nombre in options['tablas'] or TABLAS:
+            modelo, columna = TABLAS[nombre]
+            try:
+                if options['cerrar_anios']:
+                    anios = cerrar_anios(modelo, columna)
+                    self.stdout.write(f"{nombre}: años cerrados {', '.join(map(str, anios)) or '(ninguno)'}.")
+                    continue
+                if particiones(modelo):
+                    self.stdout.write(f"{nombre}: ya está particionada.")
+                    continue
+
+                def progreso(total, ultimo_id):
+                    self.stdout.write(f"{nombre}: {total} filas copiadas (último id {ultimo_id})")
+
+                total = particionar(modelo, columna, options['lote'], progreso if options['verbosity'] > 1 else None)
+            except ParticionNoDisponible as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(
+                f"{nombre}: {total} filas en la tabla particionada. La original quedó como "
+                f"{modelo._meta.db_table}{SUFIJO_ANTERIOR}; bórrela cuando haya verificado los datos."
+            ))
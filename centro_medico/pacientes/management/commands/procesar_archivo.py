@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pacientes.archivo import procesar_tareas, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las eliminaciones de médicos y pacientes encoladas, archivando sus datos en lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Filas por lote.")
+        parser.add_argument('--bucle', action='store_true', help="Repite el proceso indefinidamente.")
+        parser.add_argument('--intervalo', type=int, default=60, help="Segundos entre pasadas con --bucle.")
+
+    def handle(self, *args, **options):
+        while True:
+            for tarea in procesar_tareas(options['lote']):
+                self.stdout.write(f"{tarea}: {tarea.filas} filas archivadas.")
+            if not options['bucle']:
+                return
+            close_old_connections()
+            try:
+                time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from pacientes.recordatorios import enviador_configurado, procesar
+
+
+class Command(BaseCommand):
+    help = "Envía recordatorios de las citas de las próximas 24-48 h y marca como ausentes las citas pendientes pasadas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bucle', action='store_true', help="Repite el proceso indefinidamente.")
+        parser.add_argument('--intervalo', type=int, default=300, help="Segundos entre pasadas con --bucle.")
+        parser.add_argument('--enviador', help="Ruta de la clase enviadora (reemplaza RECORDATORIOS_ENVIADOR).")
+
+    def handle(self, *args, **options):
+        enviador = import_string(options['enviador'])() if options['enviador'] else enviador_configurado()
+        while True:
+            enviados, ausentes = procesar(enviador)
+            self.stdout.write(f"{enviados} recordatorios enviados, {ausentes} citas marcadas como ausentes.")
+            if not options['bucle']:
+                return
+            # Un proceso de larga duración no debe quedarse con conexiones caducadas
+            close_old_connections()
+            try:
+                time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from pacientes.contadores import reconciliar, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Recalcula por lotes los contadores de los pacientes y corrige los que se desviaron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Pacientes por lote.")
+        parser.add_argument('--desde-id', type=int, default=0, help="Retoma una corrida interrumpida tras este id.")
+
+    def handle(self, *args, **options):
+        def progreso(revisados, corregidos, ultimo_id):
+            self.stdout.write(f"{revisados} pacientes revisados, {corregidos} corregidos (último id {ultimo_id})")
+
+        corregidos = reconciliar(options['lote'], options['desde_id'], progreso if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f"{corregidos} pacientes con contadores corregidos."))
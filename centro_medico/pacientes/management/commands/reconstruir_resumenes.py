@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pacientes.resumenes import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los resúmenes diarios del dashboard."
+
+    def handle(self, *args, **options):
+        total = reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"{total} filas de resumen regeneradas."))
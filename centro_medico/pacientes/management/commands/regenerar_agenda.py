@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pacientes.agenda import regenerar_agenda, HORIZONTE_DIAS
+
+
+class Command(BaseCommand):
+    help = "Recalcula el índice de turnos libres de todos los médicos (ejecutar a diario)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=HORIZONTE_DIAS, help="Horizonte en días desde hoy.")
+        parser.add_argument(
+            '--horarios', action='store_true',
+            help="Reinterpreta también Medico.disponibilidad antes de recalcular.",
+        )
+
+    def handle(self, *args, **options):
+        desde = timezone.localdate()
+        hasta = desde + datetime.timedelta(days=options['dias'])
+        total = regenerar_agenda(desde, hasta, sincronizar=options['horarios'])
+        self.stdout.write(self.style.SUCCESS(f"Agenda regenerada para {total} médicos hasta {hasta}."))
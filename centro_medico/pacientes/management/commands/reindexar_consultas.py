@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from pacientes.indice_consultas import reindexar, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda del texto de las consultas, en lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Consultas por lote.")
+        parser.add_argument('--desde-id', type=int, default=0, help="Retoma una reconstrucción interrumpida tras este id.")
+
+    def handle(self, *args, **options):
+        def progreso(total, ultimo_id):
+            self.stdout.write(f"{total} consultas indexadas (último id {ultimo_id})")
+
+        total = reindexar(options['lote'], options['desde_id'], progreso if options['verbosity'] > 1 else None)
+        self.stdout.write(self.style.SUCCESS(f"{total} consultas indexadas."))
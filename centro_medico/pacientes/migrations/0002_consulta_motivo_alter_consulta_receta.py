@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='motivo',
+            field=models.TextField(default='Sin motivo', max_length=255, verbose_name='Motivo de la consulta'),
+        ),
+        migrations.AlterField(
+            model_name='consulta',
+            name='receta',
+            field=models.TextField(verbose_name='Tratamiento/Receta'),
+        ),
+    ]
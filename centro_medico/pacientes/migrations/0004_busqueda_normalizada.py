@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:56
+
+from django.db import migrations, models
+
+from pacientes.texto import normalizar
+
+LOTE = 1000
+
+
+def rellenar_normalizados(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    ultimo_id = 0
+    while True:
+        lote = list(Paciente.objects.filter(id__gt=ultimo_id).order_by('id').only('id', 'nombre', 'apellido')[:LOTE])
+        if not lote:
+            break
+        for paciente in lote:
+            paciente.nombre_normalizado = normalizar(paciente.nombre)
+            paciente.apellido_normalizado = normalizar(paciente.apellido)
+        Paciente.objects.bulk_update(lote, ['nombre_normalizado', 'apellido_normalizado'])
+        ultimo_id = lote[-1].id
+
+
+# Índice FULLTEXT (parser ngram) para la búsqueda aproximada; solo MySQL
+def crear_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'ALTER TABLE pacientes_paciente ADD FULLTEXT INDEX paciente_nombres_ft '
+            '(nombre_normalizado, apellido_normalizado) WITH PARSER ngram'
+        )
+
+
+def eliminar_fulltext(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE pacientes_paciente DROP INDEX paciente_nombres_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='apellido_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='nombre_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['apellido_normalizado', 'nombre_normalizado'], name='paciente_apellido_nombre_idx'),
+        ),
+        migrations.RunPython(rellenar_normalizados, migrations.RunPython.noop),
+        migrations.RunPython(crear_fulltext, eliminar_fulltext),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+LOTE = 1000
+
+
+# Crea el turno de cada cita activa existente. Si los datos históricos ya
+# tienen horarios duplicados se conserva el turno de la cita más antigua.
+def crear_turnos(apps, schema_editor):
+    Cita = apps.get_model('pacientes', 'Cita')
+    Turno = apps.get_model('pacientes', 'Turno')
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Cita.objects.filter(id__gt=ultimo_id).exclude(estado='Cancelada')
+            .order_by('id').only('id', 'medico_id', 'fecha', 'hora')[:LOTE]
+        )
+        if not lote:
+            break
+        Turno.objects.bulk_create([
+            Turno(
+                medico_id=cita.medico_id, hora=cita.hora, cita_id=cita.id,
+                fecha=timezone.localdate(cita.fecha) if timezone.is_aware(cita.fecha) else cita.fecha.date(),
+            )
+            for cita in lote
+        ], ignore_conflicts=True)
+        ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_busqueda_normalizada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Turno',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('cita', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='turno', to='pacientes.cita')),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.medico')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('medico', 'fecha', 'hora'), name='turno_unico_medico_fecha_hora')],
+            },
+        ),
+        migrations.RunPython(crear_turnos, migrations.RunPython.noop),
+    ]
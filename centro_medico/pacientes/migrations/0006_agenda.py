@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from pacientes.agenda import interpretar_disponibilidad
+
+
+# Interpreta la disponibilidad en texto de los médicos existentes. El índice
+# de turnos libres se genera después con `manage.py regenerar_agenda`.
+def crear_horarios(apps, schema_editor):
+    Medico = apps.get_model('pacientes', 'Medico')
+    HorarioAtencion = apps.get_model('pacientes', 'HorarioAtencion')
+    for medico in Medico.objects.only('id', 'disponibilidad').iterator(chunk_size=1000):
+        HorarioAtencion.objects.bulk_create([
+            HorarioAtencion(medico_id=medico.id, dia_semana=dia, hora_inicio=inicio, hora_fin=fin)
+            for dia, inicio, fin in interpretar_disponibilidad(medico.disponibilidad)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_turnos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HorarioAtencion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo')])),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='horarios', to='pacientes.medico')),
+            ],
+            options={
+                'ordering': ['medico', 'dia_semana', 'hora_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TurnoLibre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('especialidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.especialidad')),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.medico')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['especialidad', 'fecha', 'hora'], name='turno_libre_esp_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('medico', 'fecha', 'hora'), name='turno_libre_unico')],
+            },
+        ),
+        migrations.RunPython(crear_horarios, migrations.RunPython.noop),
+    ]
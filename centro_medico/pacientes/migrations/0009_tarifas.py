@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:11
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarifa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0.01)])),
+                ('dias_vencimiento', models.PositiveSmallIntegerField(default=30)),
+                ('especialidad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tarifa', to='pacientes.especialidad')),
+            ],
+        ),
+    ]
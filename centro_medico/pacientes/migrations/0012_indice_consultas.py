@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0011_indice_historial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termino', models.CharField(max_length=40)),
+                ('campo', models.CharField(choices=[('m', 'Motivo'), ('d', 'Diagnóstico'), ('r', 'Receta'), ('i', 'Indicaciones')], max_length=1)),
+                ('frecuencia', models.PositiveSmallIntegerField()),
+                ('posiciones', models.TextField()),
+                ('consulta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='pacientes.consulta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['termino', 'consulta'], name='termino_consulta_idx')],
+                'constraints': [models.UniqueConstraint(fields=('consulta', 'campo', 'termino'), name='termino_consulta_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:27
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0012_indice_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('medico', 'Médico'), ('paciente', 'Paciente')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('descripcion', models.CharField(blank=True, max_length=255)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('En curso', 'En curso'), ('Terminada', 'Terminada'), ('Error', 'Error')], default='Pendiente', max_length=20)),
+                ('etapa', models.CharField(blank=True, max_length=30)),
+                ('filas', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='tarea_archivo_estado_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegistroArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50)),
+                ('objeto_id', models.BigIntegerField()),
+                ('datos', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archivado_en', models.DateTimeField(auto_now_add=True)),
+                ('tarea', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pacientes.tareaarchivo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='registro_archivado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0013_archivo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='medico',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.medico'),
+        ),
+        migrations.AlterField(
+            model_name='cita',
+            name='paciente',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.paciente'),
+        ),
+        migrations.AlterField(
+            model_name='consulta',
+            name='cita',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.cita'),
+        ),
+        migrations.AlterField(
+            model_name='factura',
+            name='consulta',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.consulta'),
+        ),
+        migrations.AlterField(
+            model_name='terminoconsulta',
+            name='consulta',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='pacientes.consulta'),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='cita',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='turno', to='pacientes.cita'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['updated_at'], name='cita_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['updated_at'], name='consulta_updated_idx'),
+        ),
+    ]
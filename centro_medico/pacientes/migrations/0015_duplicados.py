@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0014_particiones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParDuplicado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puntaje', models.FloatField()),
+                ('motivos', models.CharField(max_length=255)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Descartado', 'Descartado')], default='Pendiente', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('paciente_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pacientes.paciente')),
+                ('paciente_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pacientes.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', '-puntaje'], name='par_duplicado_estado_idx')],
+                'constraints': [models.UniqueConstraint(fields=('paciente_a', 'paciente_b'), name='par_duplicado_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:36
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, Max, OuterRef, Sum
+
+LOTE = 1000
+
+
+# Valores iniciales de los contadores, por lotes de pacientes; después los
+# mantiene pacientes/contadores.py
+def rellenar_contadores(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    Cita = apps.get_model('pacientes', 'Cita')
+    Consulta = apps.get_model('pacientes', 'Consulta')
+    Factura = apps.get_model('pacientes', 'Factura')
+    ultimo_id = 0
+    while True:
+        lote = list(Paciente.objects.filter(id__gt=ultimo_id).order_by('id').only('id')[:LOTE])
+        if not lote:
+            break
+        rango = {'paciente_id__gt': ultimo_id, 'paciente_id__lte': lote[-1].id}
+        citas = dict(
+            Cita.objects.filter(**rango).values('paciente_id').annotate(n=Count('id'))
+            .values_list('paciente_id', 'n').order_by()
+        )
+        saldos = dict(
+            Factura.objects.filter(
+                estado_pago='Pendiente', consulta__cita__paciente_id__gt=ultimo_id,
+                consulta__cita__paciente_id__lte=lote[-1].id,
+            ).values('consulta__cita__paciente_id').annotate(total=Sum('total'))
+            .values_list('consulta__cita__paciente_id', 'total').order_by()
+        )
+        visitas = dict(
+            Cita.objects.filter(**rango).filter(Exists(Consulta.objects.filter(cita_id=OuterRef('pk'))))
+            .values('paciente_id').annotate(ultima=Max('fecha')).values_list('paciente_id', 'ultima').order_by()
+        )
+        for paciente in lote:
+            paciente.citas_total = citas.get(paciente.id, 0)
+            paciente.saldo_pendiente = saldos.get(paciente.id, 0)
+            paciente.ultima_visita = visitas.get(paciente.id)
+        Paciente.objects.bulk_update(lote, ['citas_total', 'saldo_pendiente', 'ultima_visita'])
+        ultimo_id = lote[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0015_duplicados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='citas_total',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='ultima_visita',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['saldo_pendiente', 'id'], name='paciente_saldo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['citas_total', 'id'], name='paciente_citas_total_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['ultima_visita'], name='paciente_ultima_visita_idx'),
+        ),
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0016_contadores'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='consulta',
+            name='consulta_updated_idx',
+        ),
+        migrations.AlterField(
+            model_name='cita',
+            name='medico',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.medico'),
+        ),
+        migrations.AlterField(
+            model_name='cita',
+            name='paciente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.paciente'),
+        ),
+        migrations.AlterField(
+            model_name='consulta',
+            name='cita',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.cita'),
+        ),
+        migrations.AlterField(
+            model_name='factura',
+            name='consulta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='pacientes.consulta'),
+        ),
+        migrations.AlterField(
+            model_name='terminoconsulta',
+            name='consulta',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos', to='pacientes.consulta'),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='cita',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='turno', to='pacientes.cita'),
+        ),
+    ]
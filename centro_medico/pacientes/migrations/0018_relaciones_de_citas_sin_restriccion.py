@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0017_claves_foraneas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cita',
+            name='medico',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.medico'),
+        ),
+        migrations.AlterField(
+            model_name='cita',
+            name='paciente',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.paciente'),
+        ),
+        migrations.AlterField(
+            model_name='consulta',
+            name='cita',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='pacientes.cita'),
+        ),
+        migrations.AlterField(
+            model_name='turno',
+            name='cita',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='turno', to='pacientes.cita'),
+        ),
+    ]
@@ -1,9 +1,14 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+import datetime
 import re
 
+from .texto import normalizar
+from .querysets import PacienteQuerySet, MedicoQuerySet, CitaQuerySet, ConsultaQuerySet, UsuarioQuerySet
+
 # Validación personalizada para correo electrónico
 def validate_email(value):
     if not re.match(r"[^@]+@[^@]+\.[^@]+", value):
@@ -38,10 +43,45 @@ class Paciente(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Copias sin acentos y en minúsculas para la búsqueda por prefijo (pacientes/busqueda.py)
+    nombre_normalizado = models.CharField(max_length=100, default='', editable=False, db_index=True)
+    apellido_normalizado = models.CharField(max_length=100, default='', editable=False, db_index=True)
+    # Contadores desnormalizados (ver pacientes/contadores.py): se actualizan
+    # con F() junto con cada cita, consulta y factura
+    citas_total = models.IntegerField(default=0, editable=False)
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    ultima_visita = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PacienteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Clave de orden de la paginación por cursor (pacientes/paginacion.py)
+            models.Index(fields=['created_at', 'id'], name='paciente_created_id_idx'),
+            # Búsqueda por prefijo de apellido y nombre (pacientes/busqueda.py)
+            models.Index(fields=['apellido_normalizado', 'nombre_normalizado'], name='paciente_apellido_nombre_idx'),
+            # Filtro por fecha de registro (PacienteAdmin.list_filter, pacientes nuevos por día)
+            models.Index(fields=['fecha_registro'], name='paciente_fecha_registro_idx'),
+            # Orden y filtro por contadores en el listado y en el admin
+            models.Index(fields=['saldo_pendiente', 'id'], name='paciente_saldo_idx'),
+            models.Index(fields=['citas_total', 'id'], name='paciente_citas_total_idx'),
+            models.Index(fields=['ultima_visita'], name='paciente_ultima_visita_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre} {self.apellido}"
 
+    def normalizar_nombres(self):
+        self.nombre_normalizado = normalizar(self.nombre)
+        self.apellido_normalizado = normalizar(self.apellido)
+
+    def save(self, *args, **kwargs):
+        self.normalizar_nombres()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre', 'apellido'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'nombre_normalizado', 'apellido_normalizado'}
+        super().save(*args, **kwargs)
+
     def clean(self):
         if not self.nombre or not self.apellido:
             raise ValidationError("El nombre y apellido son obligatorios.")
@@ -63,6 +103,16 @@ class Medico(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MedicoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Clave de orden de la paginación por cursor (pacientes/paginacion.py)
+            models.Index(fields=['created_at', 'id'], name='medico_created_id_idx'),
+            # MedicoForm.clean_correo
+            models.Index(fields=['correo'], name='medico_correo_idx'),
+        ]
+
     def __str__(self):
         return f"Dr. {self.nombre} {self.apellido} ({self.especialidad})"
 
@@ -76,17 +126,40 @@ class Medico(models.Model):
         if not self.correo:
             raise ValidationError("El correo electrónico es obligatorio.")
 
-# Modelo para Citas Médicas
+# Modelo para Citas Médicas. En MySQL la tabla se puede particionar por año
+# de `fecha` (ver pacientes/particiones.py), y MySQL no admite claves
+# foráneas en tablas particionadas ni hacia ellas: las relaciones de y hacia
+# citas no tienen restricción en la base (db_constraint=False) en ningún
+# motor, así el esquema coincide con las migraciones antes y después de
+# particionar. El CASCADE lo hace Django.
 class Cita(models.Model):
-    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE)
-    medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, db_constraint=False)
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE, db_constraint=False)
     fecha = models.DateTimeField(default=timezone.now)
     hora = models.TimeField()
-    estado = models.CharField(max_length=20, choices=[('Pendiente', 'Pendiente'), ('Confirmada', 'Confirmada'), ('Cancelada', 'Cancelada')], default='Pendiente')
+    estado = models.CharField(max_length=20, choices=[('Pendiente', 'Pendiente'), ('Confirmada', 'Confirmada'), ('Cancelada', 'Cancelada'), ('Ausente', 'No asistió')], default='Pendiente')
     motivo = models.TextField(null=True, blank=True)  # Agregado el campo 'motivo'
+    # Momento en que se envió el recordatorio (ver pacientes/recordatorios.py)
+    recordatorio_enviado = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CitaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Clave de orden de la paginación por cursor (pacientes/paginacion.py)
+            models.Index(fields=['fecha', 'hora', 'id'], name='cita_fecha_hora_id_idx'),
+            # CitaAdmin.list_filter y recordatorios: estado + rango de fechas
+            models.Index(fields=['estado', 'fecha'], name='cita_estado_fecha_idx'),
+            # Agenda de un médico por día y hora
+            models.Index(fields=['medico', 'fecha', 'hora'], name='cita_medico_fecha_hora_idx'),
+            # Historial clínico de un paciente, paginado por fecha
+            models.Index(fields=['paciente', 'fecha', 'hora', 'id'], name='cita_paciente_fecha_idx'),
+            # Filas modificadas durante la copia a la tabla particionada
+            models.Index(fields=['updated_at'], name='cita_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Cita de {self.paciente} con {self.medico} en {self.fecha}"
 
@@ -96,9 +169,65 @@ class Cita(models.Model):
         if not self.motivo:
             raise ValidationError("El motivo de la cita es obligatorio.")
 
+# Turno ocupado por una cita activa: la restricción única sobre
+# (medico, fecha, hora) impide reservar dos veces el mismo horario.
+# Las citas canceladas liberan su turno (ver pacientes/reservas.py).
+class Turno(models.Model):
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    hora = models.TimeField()
+    # Sin restricción en la base: ver Cita
+    cita = models.OneToOneField(Cita, on_delete=models.CASCADE, related_name='turno', db_constraint=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medico', 'fecha', 'hora'], name='turno_unico_medico_fecha_hora'),
+        ]
+
+    def __str__(self):
+        return f"{self.medico_id} - {self.fecha} {self.hora}"
+
+DIAS_SEMANA = [
+    (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+    (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+]
+
+# Ventana semanal de atención de un médico, derivada de Medico.disponibilidad
+class HorarioAtencion(models.Model):
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE, related_name='horarios')
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA)
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+
+    class Meta:
+        ordering = ['medico', 'dia_semana', 'hora_inicio']
+
+    def __str__(self):
+        return f"{self.get_dia_semana_display()} {self.hora_inicio:%H:%M} - {self.hora_fin:%H:%M}"
+
+# Índice precalculado de turnos libres (ver pacientes/agenda.py). Se mantiene
+# al reservar o liberar un Turno y se regenera con `manage.py regenerar_agenda`.
+class TurnoLibre(models.Model):
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
+    especialidad = models.ForeignKey(Especialidad, on_delete=models.CASCADE)
+    fecha = models.DateField()
+    hora = models.TimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['medico', 'fecha', 'hora'], name='turno_libre_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['especialidad', 'fecha', 'hora'], name='turno_libre_esp_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.medico_id} - {self.fecha} {self.hora}"
+
 # Modelo para Consultas Médicas
 class Consulta(models.Model):
-    cita = models.ForeignKey(Cita, on_delete=models.CASCADE)
+    # Sin restricción en la base: ver Cita
+    cita = models.ForeignKey(Cita, on_delete=models.CASCADE, db_constraint=False)
     motivo = models.TextField(max_length=255, verbose_name="Motivo de la consulta", default="Sin motivo")
     diagnostico = models.TextField()
     receta = models.TextField(verbose_name="Tratamiento/Receta")
@@ -106,6 +235,14 @@ class Consulta(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConsultaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Clave de orden de la paginación por cursor (pacientes/paginacion.py)
+            models.Index(fields=['created_at', 'id'], name='consulta_created_id_idx'),
+        ]
+
     def __str__(self):
         return f"Consulta para {self.cita.paciente} - {self.diagnostico}"
 
@@ -118,6 +255,15 @@ class Consulta(models.Model):
             raise ValidationError("El motivo de la consulta es obligatorio.")
 
 
+# Tarifa de consulta por especialidad (ver pacientes/facturacion.py)
+class Tarifa(models.Model):
+    especialidad = models.OneToOneField(Especialidad, on_delete=models.CASCADE, related_name='tarifa')
+    precio = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0.01)])
+    dias_vencimiento = models.PositiveSmallIntegerField(default=30)
+
+    def __str__(self):
+        return f"{self.especialidad}: {self.precio}"
+
 # Modelo para Facturas
 class Factura(models.Model):
     consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE)
@@ -128,6 +274,14 @@ class Factura(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # FacturaAdmin.list_filter: estado de pago + fecha de emisión
+            models.Index(fields=['estado_pago', 'fecha'], name='factura_estado_fecha_idx'),
+            # Cartera vencida: facturas pendientes por fecha de vencimiento
+            models.Index(fields=['estado_pago', 'fecha_vencimiento'], name='factura_estado_venc_idx'),
+        ]
+
     def __str__(self):
         return f"Factura de {self.consulta.cita.paciente} - Total: {self.total} - Estado: {self.estado_pago}"
 
@@ -146,6 +300,16 @@ class Usuario(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = UsuarioQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Clave de orden de la paginación por cursor (pacientes/paginacion.py)
+            models.Index(fields=['created_at', 'id'], name='usuario_created_id_idx'),
+            # UsuarioForm.clean_correo
+            models.Index(fields=['correo'], name='usuario_correo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.nombre} ({self.rol})"
 
@@ -155,6 +319,107 @@ class Usuario(models.Model):
         if self.rol not in ['Secretaria', 'Medico', 'Administrador']:
             raise ValidationError("El rol debe ser 'Secretaria', 'Medico' o 'Administrador'.")
 
+# Resumen diario de indicadores para el dashboard (ver pacientes/resumenes.py).
+# Se actualiza de forma incremental desde las señales de Cita, Consulta,
+# Factura y Paciente, y se reconstruye con `manage.py reconstruir_resumenes`.
+class ResumenDiario(models.Model):
+    # Fecha de las filas que acumulan todo el histórico (p. ej. saldo pendiente)
+    FECHA_ACUMULADO = datetime.date(1900, 1, 1)
+
+    fecha = models.DateField()
+    metrica = models.CharField(max_length=30)
+    clave = models.CharField(max_length=50, blank=True, default='')
+    cantidad = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'metrica', 'clave'], name='resumen_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.metrica} {self.clave}: {self.cantidad} / {self.monto}"
+
+# Índice invertido del texto de las consultas (ver pacientes/indice_consultas.py).
+# Una fila por término, consulta y campo, con las posiciones del término en el
+# campo para resolver frases. Se mantiene desde la señal de Consulta y se
+# reconstruye con `manage.py reindexar_consultas`.
+class TerminoConsulta(models.Model):
+    CAMPOS = [('m', 'Motivo'), ('d', 'Diagnóstico'), ('r', 'Receta'), ('i', 'Indicaciones')]
+
+    termino = models.CharField(max_length=40)
+    consulta = models.ForeignKey(Consulta, on_delete=models.CASCADE, related_name='terminos')
+    campo = models.CharField(max_length=1, choices=CAMPOS)
+    frecuencia = models.PositiveSmallIntegerField()
+    posiciones = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consulta', 'campo', 'termino'], name='termino_consulta_unico'),
+        ]
+        indexes = [
+            # Búsqueda por término exacto o prefijo (termino LIKE 'x%')
+            models.Index(fields=['termino', 'consulta'], name='termino_consulta_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.termino} ({self.get_campo_display()}) en consulta {self.consulta_id}"
+
+# Eliminación en segundo plano de médicos y pacientes (ver pacientes/archivo.py).
+# La tarea guarda la etapa en curso y las filas procesadas para poder retomarse.
+class TareaArchivo(models.Model):
+    ESTADOS = [('Pendiente', 'Pendiente'), ('En curso', 'En curso'), ('Terminada', 'Terminada'), ('Error', 'Error')]
+
+    modelo = models.CharField(max_length=20, choices=[('medico', 'Médico'), ('paciente', 'Paciente')])
+    objeto_id = models.BigIntegerField()
+    descripcion = models.CharField(max_length=255, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='Pendiente')
+    etapa = models.CharField(max_length=30, blank=True)
+    filas = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'id'], name='tarea_archivo_estado_idx')]
+
+    def __str__(self):
+        return f"Eliminar {self.get_modelo_display().lower()} {self.descripcion or self.objeto_id} ({self.estado})"
 
+# Copia de las filas eliminadas por una TareaArchivo: el modelo de origen, su
+# id y todos sus campos en JSON
+class RegistroArchivado(models.Model):
+    modelo = models.CharField(max_length=50)
+    objeto_id = models.BigIntegerField()
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    tarea = models.ForeignKey(TareaArchivo, on_delete=models.SET_NULL, null=True, blank=True)
+    archivado_en = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['modelo', 'objeto_id'], name='registro_archivado_idx')]
 
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id}"
+
+# Posible paciente duplicado (ver pacientes/duplicados.py): par ordenado por id
+# con su puntaje y los rasgos coincidentes, en cola para revisión. Un par
+# descartado no se vuelve a proponer.
+class ParDuplicado(models.Model):
+    ESTADOS = [('Pendiente', 'Pendiente'), ('Descartado', 'Descartado')]
+
+    paciente_a = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='+')
+    paciente_b = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='+')
+    puntaje = models.FloatField()
+    motivos = models.CharField(max_length=255)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='Pendiente')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['paciente_a', 'paciente_b'], name='par_duplicado_unico'),
+        ]
+        indexes = [models.Index(fields=['estado', '-puntaje'], name='par_duplicado_estado_idx')]
+
+    def __str__(self):
+        return f"{self.paciente_a} / {self.paciente_b} ({self.puntaje:.2f})"
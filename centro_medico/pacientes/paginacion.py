@@ -0,0 +1,139 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Paginación por cursor (keyset): cada página filtra por la clave de orden de
+# la última fila vista en lugar de usar OFFSET, así que la página 1 y la
+# página 10.000 cuestan lo mismo siempre que la clave tenga índice.
+
+ORDEN_POR_DEFECTO = ('created_at', 'id')
+ORDEN_CITAS = ('fecha', 'hora', 'id')
+# Los campos con '-' se recorren en orden descendente
+ORDEN_HISTORIAL = ('-fecha', '-hora', '-id')
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(valores):
+    datos = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in valores])
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, campos):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if len(valores) != len(campos):
+            raise CursorInvalido(cursor)
+        return [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise CursorInvalido(cursor) from exc
+
+
+def _nombre(campo):
+    return campo.lstrip('-')
+
+
+def _invertir(campo):
+    return _nombre(campo) if campo.startswith('-') else f'-{campo}'
+
+
+# Construye (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z);
+# en los campos descendentes la comparación es '<'
+def filtro_keyset(orden, valores, hacia_adelante=True):
+    condicion = Q()
+    for i, campo in enumerate(orden):
+        operador = 'gt' if hacia_adelante != campo.startswith('-') else 'lt'
+        paso = Q(**{f'{_nombre(campo)}__{operador}': valores[i]})
+        for anterior, valor in zip(orden[:i], valores[:i]):
+            paso &= Q(**{_nombre(anterior): valor})
+        condicion |= paso
+    return condicion
+
+
+class Pagina:
+    def __init__(self, objetos, request, siguiente=None, anterior=None):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+        self._request = request
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def _url(self, parametro, cursor):
+        query = self._request.GET.copy()
+        query.pop('despues', None)
+        query.pop('antes', None)
+        query[parametro] = cursor
+        return f'?{query.urlencode()}'
+
+    @property
+    def url_siguiente(self):
+        return self._url('despues', self.siguiente) if self.siguiente else None
+
+    @property
+    def url_anterior(self):
+        return self._url('antes', self.anterior) if self.anterior else None
+
+
+class PaginadorKeyset:
+    def __init__(self, queryset, orden=ORDEN_POR_DEFECTO, tamano=None):
+        self.queryset = queryset
+        self.orden = tuple(orden)
+        self.tamano = tamano or getattr(settings, 'PAGINACION_TAMANO', 50)
+        self.campos = [self._campo(_nombre(nombre)) for nombre in self.orden]
+
+    def _campo(self, nombre):
+        return self.queryset.model._meta.get_field(nombre)
+
+    def clave(self, objeto):
+        return codificar_cursor([getattr(objeto, campo.attname) for campo in self.campos])
+
+    def pagina(self, request):
+        despues = request.GET.get('despues')
+        antes = request.GET.get('antes')
+        try:
+            if antes:
+                return self._pagina_anterior(request, decodificar_cursor(antes, self.campos))
+            valores = decodificar_cursor(despues, self.campos) if despues else None
+        except CursorInvalido:
+            valores = None
+        return self._pagina_siguiente(request, valores)
+
+    def _pagina_siguiente(self, request, valores):
+        queryset = self.queryset.order_by(*self.orden)
+        if valores is not None:
+            queryset = queryset.filter(filtro_keyset(self.orden, valores))
+        objetos = list(queryset[:self.tamano + 1])
+        hay_mas = len(objetos) > self.tamano
+        objetos = objetos[:self.tamano]
+        return Pagina(
+            objetos, request,
+            siguiente=self.clave(objetos[-1]) if hay_mas else None,
+            anterior=self.clave(objetos[0]) if valores is not None and objetos else None,
+        )
+
+    def _pagina_anterior(self, request, valores):
+        queryset = self.queryset.order_by(*[_invertir(campo) for campo in self.orden])
+        queryset = queryset.filter(filtro_keyset(self.orden, valores, hacia_adelante=False))
+        objetos = list(queryset[:self.tamano + 1])
+        hay_mas = len(objetos) > self.tamano
+        objetos = objetos[:self.tamano][::-1]
+        return Pagina(
+            objetos, request,
+            siguiente=self.clave(objetos[-1]) if objetos else None,
+            anterior=self.clave(objetos[0]) if hay_mas else None,
+        )
+
+
+def paginar(request, queryset, orden=ORDEN_POR_DEFECTO, tamano=None):
+    return PaginadorKeyset(queryset, orden, tamano).pagina(request)
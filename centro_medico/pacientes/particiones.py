@@ -0,0 +1,243 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Cita
+
+# Particionado por año de la tabla de citas (solo MySQL). Cada
+# año cerrado queda en su propia partición (p2024, p2025, ...) y el año en
+# curso y el futuro en PARTICION_ACTUAL, el conjunto "caliente" que usan la
+# agenda, los recordatorios y los filtros del admin. MySQL descarta por sí
+# solo las particiones que no tocan una condición de rango sobre la columna
+# (fecha >= x AND fecha < y); por eso las consultas usan rangos y no __date.
+#
+# `manage.py particionar_historial` convierte una tabla existente sin cortar
+# el servicio: crea la tabla particionada vacía, copia las filas por lotes de
+# ids, vuelve a copiar las modificadas mientras tanto (por updated_at) y
+# repite en la copia los borrados, que un trigger anota en <tabla>_borradas.
+# Solo al final bloquea las tablas unos segundos para el último repaso (lo
+# cambiado y borrado desde el anterior) y el intercambio de nombres. La tabla
+# original queda como <tabla>_sin_particionar.
+# Cada enero, `--cerrar-anios` separa el año terminado de PARTICION_ACTUAL.
+#
+# MySQL no admite claves foráneas en tablas particionadas ni hacia ellas: las
+# relaciones de y hacia citas se declaran con db_constraint=False (migración
+# 0018), así que el esquema coincide con las migraciones antes y después del
+# intercambio, y el CASCADE lo hace Django. Si la tabla todavía tiene alguna
+# restricción (migraciones sin aplicar) el comando se niega a empezar. Las
+# consultas no se particionan: no tienen una fecha propia por la que se
+# filtren (las búsquedas usan cita__fecha) y el descarte de particiones ya
+# ocurre en citas al unir ambas tablas.
+
+TAMANO_LOTE = getattr(settings, 'PARTICIONES_TAMANO_LOTE', 5000)
+PARTICION_ACTUAL = 'pactual'
+SUFIJO_NUEVA = '_particionada'
+SUFIJO_ANTERIOR = '_sin_particionar'
+SUFIJO_BORRADAS = '_borradas'
+# Margen sobre el inicio de la copia para las transacciones que estaban en curso
+MARGEN = datetime.timedelta(minutes=5)
+
+# nombre -> (modelo, columna de partición)
+TABLAS = {
+    'citas': (Cita, 'fecha'),
+}
+
+
+class ParticionNoDisponible(Exception):
+    pass
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def nombre_particion(anio):
+    return f'p{anio}'
+
+
+# Las fechas se guardan en UTC, así que los límites de año también
+def particion_anual(anio):
+    return f"PARTITION {nombre_particion(anio)} VALUES LESS THAN (TO_DAYS('{anio + 1:04d}-01-01'))"
+
+
+def particion_actual():
+    return f"PARTITION {PARTICION_ACTUAL} VALUES LESS THAN MAXVALUE"
+
+
+def definicion(columna, anios):
+    partes = [particion_anual(anio) for anio in anios] + [particion_actual()]
+    return f"PARTITION BY RANGE (TO_DAYS({_q(columna)})) ({', '.join(partes)})"
+
+
+def _comprobar():
+    if connection.vendor != 'mysql':
+        raise ParticionNoDisponible("El particionado por año solo está disponible en MySQL.")
+
+
+def particiones(modelo):
+    _comprobar()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [modelo._meta.db_table],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+# Años anteriores al actual, desde el primero con datos
+def anios_cerrados(modelo, columna, ahora=None, desde=None):
+    actual = (ahora or timezone.now()).year
+    if desde is None:
+        primera = modelo.objects.order_by(columna).values_list(columna, flat=True).first()
+        if primera is None:
+            return []
+        desde = primera.year
+    return list(range(desde, actual))
+
+
+# Claves foráneas de la tabla y hacia la tabla: [(tabla que la define, nombre)]
+def claves_foraneas(cursor, tabla):
+    cursor.execute(
+        "SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+        [tabla, tabla],
+    )
+    return cursor.fetchall()
+
+
+def _columnas(modelo):
+    return ', '.join(_q(campo.column) for campo in modelo._meta.concrete_fields)
+
+
+# Borrar e insertar, no REPLACE: si cambió la columna de partición (una cita
+# reprogramada) la clave primaria (id, fecha) ya no coincide con la copiada
+def _copiar_modificadas(cursor, modelo, nueva, desde):
+    tabla = _q(modelo._meta.db_table)
+    columnas = _columnas(modelo)
+    cursor.execute(
+        f"DELETE FROM {_q(nueva)} WHERE id IN (SELECT id FROM {tabla} WHERE {tabla}.updated_at >= %s)", [desde],
+    )
+    cursor.execute(
+        f"INSERT INTO {_q(nueva)} ({columnas}) SELECT {columnas} FROM {tabla} WHERE {tabla}.updated_at >= %s",
+        [desde],
+    )
+
+
+# Registro de borrados durante la copia: un trigger anota el id de cada fila
+# borrada de la tabla original, en orden (seq)
+def _crear_registro_borradas(cursor, tabla):
+    registro, trigger = tabla + SUFIJO_BORRADAS, tabla + SUFIJO_BORRADAS + '_trg'
+    cursor.execute(f"DROP TRIGGER IF EXISTS {_q(trigger)}")
+    cursor.execute(f"DROP TABLE IF EXISTS {_q(registro)}")
+    cursor.execute(f"CREATE TABLE {_q(registro)} (seq BIGINT AUTO_INCREMENT PRIMARY KEY, id BIGINT NOT NULL)")
+    cursor.execute(
+        f"CREATE TRIGGER {_q(trigger)} AFTER DELETE ON {_q(tabla)} "
+        f"FOR EACH ROW INSERT INTO {_q(registro)} (id) VALUES (OLD.id)"
+    )
+
+
+def _quitar_registro_borradas(cursor, tabla):
+    registro = tabla + SUFIJO_BORRADAS
+    cursor.execute(f"DROP TRIGGER IF EXISTS {_q(registro + '_trg')}")
+    cursor.execute(f"DROP TABLE IF EXISTS {_q(registro)}")
+
+
+# Borra en la copia, por lotes, lo anotado después de `desde_seq`.
+# Devuelve el último seq aplicado.
+def _aplicar_borradas(cursor, tabla, nueva, desde_seq, tamano_lote):
+    registro = _q(tabla + SUFIJO_BORRADAS)
+    while True:
+        cursor.execute(
+            f"SELECT seq, id FROM {registro} WHERE seq > %s ORDER BY seq LIMIT %s", [desde_seq, tamano_lote],
+        )
+        filas = cursor.fetchall()
+        if not filas:
+            return desde_seq
+        ids = [id for _, id in filas]
+        cursor.execute(
+            f"DELETE FROM {_q(nueva)} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids,
+        )
+        desde_seq = filas[-1][0]
+
+
+def particionar(modelo, columna, tamano_lote=TAMANO_LOTE, progreso=None):
+    _comprobar()
+    tabla = modelo._meta.db_table
+    if particiones(modelo):
+        raise ParticionNoDisponible(f"La tabla {tabla} ya está particionada.")
+    nueva, anterior = tabla + SUFIJO_NUEVA, tabla + SUFIJO_ANTERIOR
+    columnas = _columnas(modelo)
+    inicio = timezone.now() - MARGEN
+    with connection.cursor() as cursor:
+        restantes = claves_foraneas(cursor, tabla)
+        if restantes:
+            raise ParticionNoDisponible(
+                f"La tabla {tabla} tiene claves foráneas ({', '.join(nombre for _, nombre in restantes)}); "
+                "aplique las migraciones antes de particionar."
+            )
+        # Una copia interrumpida se empieza de nuevo
+        cursor.execute(f"DROP TABLE IF EXISTS {_q(nueva)}")
+        cursor.execute(f"CREATE TABLE {_q(nueva)} LIKE {_q(tabla)}")
+        # La columna de partición tiene que formar parte de la clave primaria
+        cursor.execute(f"ALTER TABLE {_q(nueva)} DROP PRIMARY KEY, ADD PRIMARY KEY (id, {_q(columna)})")
+        cursor.execute(f"ALTER TABLE {_q(nueva)} {definicion(columna, anios_cerrados(modelo, columna))}")
+        # Antes de copiar: todo lo que se borre desde ahora queda anotado
+        _crear_registro_borradas(cursor, tabla)
+
+        # Copia por lotes de ids, cada uno en su propia transacción corta
+        total = 0
+        ultimo_id = 0
+        while True:
+            ids = list(modelo.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:tamano_lote])
+            if not ids:
+                break
+            cursor.execute(
+                f"INSERT INTO {_q(nueva)} ({columnas}) SELECT {columnas} FROM {_q(tabla)} WHERE id >= %s AND id <= %s",
+                [ids[0], ids[-1]],
+            )
+            total += len(ids)
+            ultimo_id = ids[-1]
+            if progreso:
+                progreso(total, ultimo_id)
+
+        # Filas nuevas, modificadas y borradas durante la copia, todavía sin bloquear
+        marca = timezone.now() - MARGEN
+        _copiar_modificadas(cursor, modelo, nueva, inicio)
+        seq = _aplicar_borradas(cursor, tabla, nueva, 0, tamano_lote)
+
+        # Último repaso con las escrituras detenidas: solo lo cambiado y lo
+        # borrado desde el repaso anterior, y el intercambio de nombres
+        registro = tabla + SUFIJO_BORRADAS
+        cursor.execute(f"LOCK TABLES {_q(tabla)} WRITE, {_q(nueva)} WRITE, {_q(registro)} WRITE")
+        try:
+            _copiar_modificadas(cursor, modelo, nueva, marca)
+            _aplicar_borradas(cursor, tabla, nueva, seq, tamano_lote)
+            cursor.execute(f"RENAME TABLE {_q(tabla)} TO {_q(anterior)}, {_q(nueva)} TO {_q(tabla)}")
+        finally:
+            cursor.execute("UNLOCK TABLES")
+        # El trigger siguió a la tabla original renombrada; se borra por nombre
+        _quitar_registro_borradas(cursor, tabla)
+    return total
+
+
+# Separa de PARTICION_ACTUAL los años ya terminados que no tienen partición.
+# Solo reescribe las filas de PARTICION_ACTUAL, no el historial.
+def cerrar_anios(modelo, columna, ahora=None):
+    existentes = particiones(modelo)
+    if not existentes:
+        raise ParticionNoDisponible(f"La tabla {modelo._meta.db_table} no está particionada.")
+    anuales = [int(nombre[1:]) for nombre in existentes if nombre != PARTICION_ACTUAL]
+    anios = anios_cerrados(modelo, columna, ahora, desde=max(anuales) + 1 if anuales else None)
+    if not anios:
+        return []
+    partes = [particion_anual(anio) for anio in anios] + [particion_actual()]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {_q(modelo._meta.db_table)} REORGANIZE PARTITION {PARTICION_ACTUAL} "
+            f"INTO ({', '.join(partes)})"
+        )
+    return anios
@@ -0,0 +1,74 @@
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.urls import resolve, Resolver404
+
+# Presupuesto de consultas SQL por petición: si una vista ejecuta más
+# consultas de las permitidas se considera una regresión (p. ej. un N+1).
+
+
+class PresupuestoExcedido(AssertionError):
+    pass
+
+
+class ContadorConsultas:
+    def __init__(self):
+        self.total = 0
+        self.sentencias = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        self.sentencias.append(sql)
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def contar_consultas(using=None):
+    contador = ContadorConsultas()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(contador))
+        yield contador
+
+
+# Uso en pruebas:
+#     with presupuesto_consultas(3):
+#         self.client.get(reverse('citas_lista'))
+@contextmanager
+def presupuesto_consultas(maximo, etiqueta='', using=None):
+    with contar_consultas(using) as contador:
+        yield contador
+    if contador.total > maximo:
+        detalle = '\n'.join(f'  {i}. {sql}' for i, sql in enumerate(contador.sentencias, 1))
+        raise PresupuestoExcedido(
+            f"{etiqueta or 'Bloque'} ejecutó {contador.total} consultas (máximo {maximo}):\n{detalle}"
+        )
+
+
+# Presupuesto configurado para un nombre de ruta (settings.PRESUPUESTO_CONSULTAS)
+def presupuesto_para(url_name):
+    presupuestos = getattr(settings, 'PRESUPUESTO_CONSULTAS', {})
+    return presupuestos.get(url_name, presupuestos.get('default'))
+
+
+# Middleware de depuración: falla la petición de lectura (GET/HEAD) que
+# supere su presupuesto. Los POST incluyen validaciones y escrituras cuyo
+# número depende del formulario, así que no se limitan aquí.
+class PresupuestoConsultasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            url_name = None
+        maximo = presupuesto_para(url_name)
+        if maximo is None:
+            return self.get_response(request)
+        with presupuesto_consultas(maximo, etiqueta=f"La vista '{url_name}'"):
+            return self.get_response(request)
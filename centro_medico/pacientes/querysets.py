@@ -0,0 +1,89 @@
+from django.db import models
+from django.db.models import Prefetch
+
+# Capa compartida de consultas: cada vista de listado o de selección usa estos
+# métodos para cargar en una sola consulta los datos que pinta su plantilla.
+
+
+# Consultas para Pacientes
+class PacienteQuerySet(models.QuerySet):
+    # pacientes/lista.html
+    def para_lista(self):
+        return self.only('id', 'nombre', 'apellido', 'telefono', 'created_at', 'citas_total', 'saldo_pendiente', 'ultima_visita')
+
+    # Opciones del <select> de pacientes en citas/nueva.html y citas/editar.html
+    def para_opciones(self):
+        return self.only('id', 'nombre', 'apellido').order_by('apellido', 'nombre', 'id')
+
+
+# Consultas para Médicos
+class MedicoQuerySet(models.QuerySet):
+    # medicos/lista.html (muestra la especialidad de cada médico)
+    def para_lista(self):
+        return self.select_related('especialidad').only(
+            'id', 'nombre', 'apellido', 'especialidad__nombre', 'created_at',
+        )
+
+    # Opciones del <select> de médicos: "nombre (especialidad)"
+    def para_opciones(self):
+        return self.select_related('especialidad').only(
+            'id', 'nombre', 'apellido', 'especialidad__nombre',
+        ).order_by('apellido', 'nombre', 'id')
+
+
+# Consultas para Citas Médicas
+class CitaQuerySet(models.QuerySet):
+    # citas/lista.html (nombre del paciente y del médico por fila)
+    def para_lista(self):
+        return self.select_related('paciente', 'medico').only(
+            'id', 'fecha', 'hora', 'estado', 'motivo',
+            'paciente__nombre', 'medico__nombre',
+        )
+
+    # Opciones del <select> de citas: usa Cita.__str__, que recorre
+    # paciente, médico y la especialidad del médico.
+    def para_opciones(self):
+        return self.select_related('paciente', 'medico__especialidad').only(
+            'id', 'fecha',
+            'paciente__nombre', 'paciente__apellido',
+            'medico__nombre', 'medico__apellido', 'medico__especialidad__nombre',
+        ).order_by('-fecha', '-id')
+
+    # pacientes/historial.html: médico y especialidad por cita, y sus
+    # consultas con sus facturas en dos consultas más (Prefetch), sin pasar
+    # por Consulta.__str__ ni Factura.__str__, que recorren cita.paciente.
+    def para_historial(self):
+        from .models import Consulta, Factura  # models.py importa este módulo
+        facturas = Prefetch(
+            'factura_set', to_attr='facturas',
+            queryset=Factura.objects.only(
+                'id', 'consulta_id', 'fecha', 'total', 'estado_pago', 'fecha_vencimiento', 'updated_at',
+            ).order_by('fecha', 'id'),
+        )
+        consultas = Prefetch(
+            'consulta_set', to_attr='consultas',
+            queryset=Consulta.objects.only(
+                'id', 'cita_id', 'motivo', 'diagnostico', 'receta', 'indicaciones', 'created_at', 'updated_at',
+            ).order_by('created_at', 'id').prefetch_related(facturas),
+        )
+        return self.select_related('medico__especialidad').only(
+            'id', 'paciente_id', 'fecha', 'hora', 'estado', 'motivo',
+            'medico__nombre', 'medico__apellido', 'medico__especialidad__nombre',
+        ).prefetch_related(consultas)
+
+
+# Consultas para Consultas Médicas
+class ConsultaQuerySet(models.QuerySet):
+    # consultas/lista.html (paciente y médico a través de la cita)
+    def para_lista(self):
+        return self.select_related('cita__paciente', 'cita__medico').only(
+            'id', 'diagnostico', 'created_at',
+            'cita__paciente__nombre', 'cita__medico__nombre',
+        )
+
+
+# Consultas para Usuarios
+class UsuarioQuerySet(models.QuerySet):
+    # usuarios/lista.html
+    def para_lista(self):
+        return self.only('id', 'nombre', 'rol', 'created_at')
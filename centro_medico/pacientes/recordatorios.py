@@ -0,0 +1,152 @@
+import datetime
+import json
+import logging
+import sys
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cita
+from .resumenes import sumar, CITAS_POR_ESTADO
+from . import tablero
+
+# Trabajo periódico sobre las citas próximas y pasadas:
+#   1. recordatorios para las citas de las próximas 24-48 h, enviados en lotes
+#      por un "enviador" configurable (settings.RECORDATORIOS_ENVIADOR);
+#   2. las citas pendientes que ya pasaron se marcan como 'Ausente'.
+# Ambas tareas trabajan por lotes: una consulta para leer el lote y un solo
+# UPDATE para marcarlo, nunca una consulta o transacción por cita.
+
+logger = logging.getLogger(__name__)
+
+ESTADO_AUSENTE = 'Ausente'
+ESTADOS_A_RECORDAR = ('Pendiente', 'Confirmada')
+
+DESDE_HORAS = getattr(settings, 'RECORDATORIOS_DESDE_HORAS', 24)
+HASTA_HORAS = getattr(settings, 'RECORDATORIOS_HASTA_HORAS', 48)
+# Tiempo de espera tras la hora de la cita antes de marcarla como ausente
+GRACIA_HORAS = getattr(settings, 'RECORDATORIOS_GRACIA_HORAS', 2)
+TAMANO_LOTE = getattr(settings, 'RECORDATORIOS_TAMANO_LOTE', 500)
+
+Recordatorio = namedtuple('Recordatorio', 'cita_id paciente correo telefono medico fecha')
+
+
+# Enviadores: reciben la lista completa del lote y la envían de una vez
+class EnvioConsola:
+    def __init__(self, salida=None):
+        self.salida = salida or sys.stdout
+
+    def enviar(self, recordatorios):
+        for r in recordatorios:
+            self.salida.write(f"Recordatorio: {r.paciente} <{r.correo}> - cita con {r.medico} el {r.fecha:%Y-%m-%d %H:%M}\n")
+
+
+class EnvioArchivo:
+    def __init__(self, ruta=None):
+        self.ruta = ruta or getattr(settings, 'RECORDATORIOS_ARCHIVO', 'recordatorios.jsonl')
+
+    def enviar(self, recordatorios):
+        with open(self.ruta, 'a', encoding='utf-8') as archivo:
+            for r in recordatorios:
+                archivo.write(json.dumps(dict(r._asdict(), fecha=r.fecha.isoformat()), ensure_ascii=False) + '\n')
+
+
+class EnvioCorreo:
+    def enviar(self, recordatorios):
+        # send_mass_mail abre una sola conexión SMTP para todo el lote
+        send_mass_mail([
+            (
+                "Recordatorio de cita",
+                f"Hola {r.paciente}, le recordamos su cita con {r.medico} el {r.fecha:%d/%m/%Y a las %H:%M}.",
+                None,
+                [r.correo],
+            )
+            for r in recordatorios if r.correo
+        ])
+
+
+def enviador_configurado():
+    ruta = getattr(settings, 'RECORDATORIOS_ENVIADOR', 'pacientes.recordatorios.EnvioConsola')
+    return import_string(ruta)()
+
+
+def citas_a_recordar(ahora=None):
+    ahora = ahora or timezone.now()
+    # Rango sobre el índice (estado, fecha)
+    return (
+        Cita.objects.filter(
+            estado__in=ESTADOS_A_RECORDAR,
+            fecha__gte=ahora + datetime.timedelta(hours=DESDE_HORAS),
+            fecha__lt=ahora + datetime.timedelta(hours=HASTA_HORAS),
+            recordatorio_enviado__isnull=True,
+        )
+        .select_related('paciente', 'medico')
+        .only('id', 'fecha', 'paciente__nombre', 'paciente__apellido', 'paciente__correo', 'paciente__telefono',
+              'medico__nombre', 'medico__apellido')
+    )
+
+
+# Envía un lote y lo marca con un UPDATE. Si el envío falla no se marca
+# nada y el lote se reintenta en la siguiente pasada (al menos una vez).
+def enviar_recordatorios(enviador=None, ahora=None, tamano_lote=TAMANO_LOTE):
+    enviador = enviador or enviador_configurado()
+    ahora = ahora or timezone.now()
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(citas_a_recordar(ahora).filter(id__gt=ultimo_id).order_by('id')[:tamano_lote])
+        if not lote:
+            return total
+        enviador.enviar([
+            Recordatorio(
+                cita.id, f"{cita.paciente.nombre} {cita.paciente.apellido}", cita.paciente.correo,
+                cita.paciente.telefono, f"Dr. {cita.medico.nombre} {cita.medico.apellido}", timezone.localtime(cita.fecha),
+            )
+            for cita in lote
+        ])
+        Cita.objects.filter(id__in=[cita.id for cita in lote]).update(recordatorio_enviado=ahora, updated_at=ahora)
+        total += len(lote)
+        if len(lote) < tamano_lote:
+            return total
+        ultimo_id = lote[-1].id
+
+
+def _dia(fecha):
+    return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+
+
+# Marca como ausentes las citas pendientes ya pasadas. Cada lote es una
+# transacción con un UPDATE y el ajuste de los resúmenes del dashboard
+# (el UPDATE masivo no emite señales).
+def marcar_ausencias(ahora=None, tamano_lote=TAMANO_LOTE):
+    ahora = ahora or timezone.now()
+    limite = ahora - datetime.timedelta(hours=GRACIA_HORAS)
+    total = 0
+    while True:
+        with transaction.atomic():
+            lote = list(
+                Cita.objects.select_for_update().filter(estado='Pendiente', fecha__lt=limite)
+                .order_by('id').values_list('id', 'fecha')[:tamano_lote]
+            )
+            if not lote:
+                return total
+            Cita.objects.filter(id__in=[id for id, _ in lote]).update(estado=ESTADO_AUSENTE, updated_at=ahora)
+            for dia, cantidad in Counter(_dia(fecha) for _, fecha in lote).items():
+                sumar(CITAS_POR_ESTADO, 'Pendiente', dia, -cantidad)
+                sumar(CITAS_POR_ESTADO, ESTADO_AUSENTE, dia, cantidad)
+            tablero.publicar(tablero.ACTUALIZADA, [id for id, _ in lote])
+        total += len(lote)
+        if len(lote) < tamano_lote:
+            return total
+
+
+def procesar(enviador=None, ahora=None):
+    enviados = enviar_recordatorios(enviador, ahora)
+    ausentes = marcar_ausencias(ahora)
+    if enviados or ausentes:
+        logger.info("Recordatorios enviados: %d; citas marcadas como ausentes: %d", enviados, ausentes)
+    return enviados, ausentes
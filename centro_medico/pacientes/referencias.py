@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Especialidad, Factura
+
+# Caché de lectura para los datos de referencia de los formularios
+# (especialidades y opciones de los <select>). Cada grupo tiene un número de
+# versión en la caché; invalidar un grupo solo incrementa ese número, así
+# que las claves anteriores dejan de usarse y caducan por sí solas.
+
+TIMEOUT = getattr(settings, 'REFERENCIAS_CACHE_TIMEOUT', 3600)
+ALIAS = getattr(settings, 'REFERENCIAS_CACHE_ALIAS', 'default')
+
+ESPECIALIDADES = 'especialidades'
+# Informe de antigüedad de cartera (pacientes/cartera.py)
+CARTERA = 'cartera'
+
+# Grupos que dependen de cada modelo. Pacientes, médicos y citas se eligen
+# con autocompletado (pacientes/busqueda.py) y no se guardan aquí.
+DEPENDENCIAS = {
+    Especialidad: [ESPECIALIDADES],
+    Factura: [CARTERA],
+}
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def version(grupo):
+    return _cache().get_or_set(f'referencias:{grupo}:version', 1, timeout=None)
+
+
+def invalidar(*grupos):
+    cache = _cache()
+    for grupo in grupos:
+        clave = f'referencias:{grupo}:version'
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 2, timeout=None)
+
+
+def invalidar_modelo(modelo):
+    invalidar(*DEPENDENCIAS.get(modelo, []))
+
+
+def obtener(grupo, calcular):
+    clave = f'referencias:{grupo}:v{version(grupo)}'
+    cache = _cache()
+    valor = cache.get(clave)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave, valor, TIMEOUT)
+    return valor
+
+
+# Los valores en caché son tuplas simples (no instancias de modelos) para que
+# se serialicen rápido en cualquier backend.
+def especialidades():
+    return obtener(ESPECIALIDADES, lambda: list(Especialidad.objects.order_by('nombre').values_list('id', 'nombre')))
+
+
+# Pares (valor, etiqueta) para el widget Select de un ModelChoiceField
+def choices_especialidades():
+    return [('', '---------')] + especialidades()
@@ -0,0 +1,84 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Cita, Turno
+
+# Motor de reservas de citas. La unicidad del horario de cada médico la
+# garantiza la restricción única de Turno, no una consulta previa, así que
+# dos recepciones que reservan el mismo turno a la vez no pueden duplicarlo:
+# una de las dos recibe ConflictoDeTurno con la cita que ya lo ocupa.
+
+ESTADO_CANCELADA = 'Cancelada'
+
+
+class ConflictoDeTurno(Exception):
+    def __init__(self, turno):
+        self.turno = turno
+        self.cita = turno.cita if turno else None
+        super().__init__(
+            f"El médico ya tiene una cita el {turno.fecha:%Y-%m-%d} a las {turno.hora:%H:%M}." if turno
+            else "El turno ya está ocupado."
+        )
+
+
+def fecha_del_turno(fecha):
+    if isinstance(fecha, datetime.datetime):
+        return timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+def turno_ocupado(medico_id, fecha, hora, excluir_cita=None):
+    turnos = Turno.objects.select_related('cita').filter(
+        medico_id=medico_id, fecha=fecha_del_turno(fecha), hora=hora,
+    )
+    if excluir_cita is not None:
+        turnos = turnos.exclude(cita_id=excluir_cita)
+    return turnos.first()
+
+
+def _ocupar_turno(cita):
+    try:
+        with transaction.atomic():
+            Turno.objects.create(
+                medico_id=cita.medico_id, fecha=fecha_del_turno(cita.fecha), hora=cita.hora, cita=cita,
+            )
+    except IntegrityError:
+        raise ConflictoDeTurno(turno_ocupado(cita.medico_id, cita.fecha, cita.hora, excluir_cita=cita.id))
+
+
+def reservar_cita(cita):
+    try:
+        with transaction.atomic():
+            cita.save()
+            if cita.estado != ESTADO_CANCELADA:
+                _ocupar_turno(cita)
+    except ConflictoDeTurno:
+        # La transacción se revirtió: la cita vuelve a no estar guardada
+        cita.pk = None
+        cita._state.adding = True
+        raise
+    return cita
+
+
+# Guarda los cambios de una cita existente moviendo su turno si hace falta
+def reprogramar_cita(cita):
+    with transaction.atomic():
+        anterior = Cita.objects.filter(pk=cita.pk).values_list('fecha', 'hora').first()
+        if anterior and anterior != (cita.fecha, cita.hora):
+            # El recordatorio ya enviado era para la fecha anterior
+            cita.recordatorio_enviado = None
+        cita.save()
+        Turno.objects.filter(cita=cita).delete()
+        if cita.estado != ESTADO_CANCELADA:
+            _ocupar_turno(cita)
+    return cita
+
+
+def cancelar_cita(cita):
+    with transaction.atomic():
+        cita.estado = ESTADO_CANCELADA
+        cita.save(update_fields=['estado', 'updated_at'])
+        Turno.objects.filter(cita=cita).delete()
+    return cita
@@ -0,0 +1,151 @@
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Cita, Consulta, Factura, Medico, Paciente, ResumenDiario
+
+# Indicadores del dashboard mantenidos de forma incremental. Cada objeto
+# aporta una o más "contribuciones" (metrica, clave, fecha, cantidad, monto);
+# al guardarlo se restan las contribuciones anteriores y se suman las nuevas.
+
+CITAS_POR_ESTADO = 'citas_estado'
+CONSULTAS_POR_MEDICO = 'consultas_medico'
+FACTURAS_POR_ESTADO = 'facturas_estado'
+PACIENTES_NUEVOS = 'pacientes_nuevos'
+# Carga de cada médico por día: citas no canceladas (clave = id del médico)
+CITAS_POR_MEDICO = 'citas_medico'
+ESTADO_CANCELADA = 'Cancelada'
+
+ACUMULADO = ResumenDiario.FECHA_ACUMULADO
+DIAS_REGISTROS = 7
+
+
+def _dia(valor):
+    if isinstance(valor, datetime.datetime):
+        return timezone.localdate(valor) if timezone.is_aware(valor) else valor.date()
+    return valor
+
+
+def contribuciones(objeto):
+    if isinstance(objeto, Cita):
+        filas = [(CITAS_POR_ESTADO, objeto.estado, _dia(objeto.fecha), 1, Decimal(0))]
+        if objeto.estado != ESTADO_CANCELADA:
+            filas.append((CITAS_POR_MEDICO, str(objeto.medico_id), _dia(objeto.fecha), 1, Decimal(0)))
+        return filas
+    if isinstance(objeto, Consulta):
+        medico_id = Cita.objects.filter(id=objeto.cita_id).values_list('medico_id', flat=True).first()
+        if medico_id is None:
+            return []
+        return [(CONSULTAS_POR_MEDICO, str(medico_id), _dia(objeto.created_at), 1, Decimal(0))]
+    if isinstance(objeto, Factura):
+        return [(FACTURAS_POR_ESTADO, objeto.estado_pago, ACUMULADO, 1, Decimal(objeto.total))]
+    if isinstance(objeto, Paciente):
+        return [(PACIENTES_NUEVOS, '', _dia(objeto.fecha_registro), 1, Decimal(0))]
+    return []
+
+
+def sumar(metrica, clave, fecha, cantidad=1, monto=0):
+    filas = ResumenDiario.objects.filter(fecha=fecha, metrica=metrica, clave=clave)
+    if filas.update(cantidad=F('cantidad') + cantidad, monto=F('monto') + monto):
+        return
+    try:
+        with transaction.atomic():
+            ResumenDiario.objects.create(fecha=fecha, metrica=metrica, clave=clave, cantidad=cantidad, monto=monto)
+    except IntegrityError:
+        # Otra petición creó la fila entre el UPDATE y el INSERT
+        filas.update(cantidad=F('cantidad') + cantidad, monto=F('monto') + monto)
+
+
+def aplicar(anteriores, nuevas):
+    if anteriores == nuevas:
+        return
+    for metrica, clave, fecha, cantidad, monto in anteriores:
+        sumar(metrica, clave, fecha, -cantidad, -monto)
+    for metrica, clave, fecha, cantidad, monto in nuevas:
+        sumar(metrica, clave, fecha, cantidad, monto)
+
+
+def reconstruir():
+    filas = []
+    citas = (
+        Cita.objects.annotate(dia=TruncDate('fecha')).values('dia', 'estado')
+        .annotate(n=Count('id')).order_by()
+    )
+    filas += [ResumenDiario(fecha=f['dia'], metrica=CITAS_POR_ESTADO, clave=f['estado'], cantidad=f['n']) for f in citas]
+    carga = (
+        Cita.objects.exclude(estado=ESTADO_CANCELADA).annotate(dia=TruncDate('fecha')).values('dia', 'medico_id')
+        .annotate(n=Count('id')).order_by()
+    )
+    filas += [
+        ResumenDiario(fecha=f['dia'], metrica=CITAS_POR_MEDICO, clave=str(f['medico_id']), cantidad=f['n'])
+        for f in carga
+    ]
+    consultas = (
+        Consulta.objects.annotate(dia=TruncDate('created_at')).values('dia', 'cita__medico_id')
+        .annotate(n=Count('id')).order_by()
+    )
+    filas += [
+        ResumenDiario(fecha=f['dia'], metrica=CONSULTAS_POR_MEDICO, clave=str(f['cita__medico_id']), cantidad=f['n'])
+        for f in consultas
+    ]
+    facturas = Factura.objects.values('estado_pago').annotate(n=Count('id'), total=Sum('total')).order_by()
+    filas += [
+        ResumenDiario(fecha=ACUMULADO, metrica=FACTURAS_POR_ESTADO, clave=f['estado_pago'], cantidad=f['n'], monto=f['total'])
+        for f in facturas
+    ]
+    pacientes = (
+        Paciente.objects.annotate(dia=TruncDate('fecha_registro')).values('dia')
+        .annotate(n=Count('id')).order_by()
+    )
+    filas += [ResumenDiario(fecha=f['dia'], metrica=PACIENTES_NUEVOS, clave='', cantidad=f['n']) for f in pacientes]
+    with transaction.atomic():
+        ResumenDiario.objects.all().delete()
+        ResumenDiario.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+# Indicadores del dashboard: una sola lectura por el índice único más una
+# para los nombres de los médicos que aparecen en el día.
+def indicadores(hoy=None):
+    hoy = hoy or timezone.localdate()
+    desde = hoy - datetime.timedelta(days=DIAS_REGISTROS - 1)
+    filas = ResumenDiario.objects.filter(
+        Q(fecha=hoy, metrica__in=[CITAS_POR_ESTADO, CONSULTAS_POR_MEDICO])
+        | Q(fecha=ACUMULADO, metrica=FACTURAS_POR_ESTADO)
+        | Q(fecha__range=(desde, hoy), metrica=PACIENTES_NUEVOS)
+    ).exclude(cantidad=0)
+    datos = {
+        'citas_por_estado': {},
+        'consultas_por_medico': [],
+        'facturas_por_estado': {},
+        'pacientes_nuevos': {desde + datetime.timedelta(days=i): 0 for i in range(DIAS_REGISTROS)},
+    }
+    consultas = {}
+    for fila in filas:
+        if fila.metrica == CITAS_POR_ESTADO:
+            datos['citas_por_estado'][fila.clave] = fila.cantidad
+        elif fila.metrica == CONSULTAS_POR_MEDICO:
+            consultas[int(fila.clave)] = fila.cantidad
+        elif fila.metrica == FACTURAS_POR_ESTADO:
+            datos['facturas_por_estado'][fila.clave] = {'cantidad': fila.cantidad, 'monto': fila.monto}
+        else:
+            datos['pacientes_nuevos'][fila.fecha] = fila.cantidad
+    if consultas:
+        medicos = Medico.objects.only('id', 'nombre', 'apellido').in_bulk(list(consultas))
+        datos['consultas_por_medico'] = sorted(
+            ((f"{medicos[i].nombre} {medicos[i].apellido}" if i in medicos else f"#{i}", n) for i, n in consultas.items()),
+            key=lambda par: -par[1],
+        )
+    return datos
+
+
+# Citas del día por médico (id -> cantidad), en una lectura por el índice único
+def carga_del_dia(hoy=None):
+    filas = ResumenDiario.objects.filter(
+        fecha=hoy or timezone.localdate(), metrica=CITAS_POR_MEDICO,
+    ).exclude(cantidad=0).values_list('clave', 'cantidad')
+    return {int(clave): cantidad for clave, cantidad in filas}
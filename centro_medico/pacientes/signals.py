@@ -0,0 +1,122 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Medico, Turno, Cita, Consulta, Factura, Paciente, Especialidad
+from . import agenda, contadores, resumenes, referencias, indice_consultas, tablero
+
+
+# Al guardar un médico se reinterpreta su disponibilidad y se recalcula su agenda
+@receiver(post_save, sender=Medico)
+def medico_guardado(sender, instance, **kwargs):
+    agenda.sincronizar_horarios(instance)
+    agenda.regenerar_turnos_libres(instance)
+
+
+# Índice de turnos libres: reservar un turno lo quita, liberarlo lo devuelve
+@receiver(post_save, sender=Turno)
+def turno_ocupado(sender, instance, created, **kwargs):
+    if created:
+        agenda.ocupar_turno_libre(instance)
+
+
+@receiver(post_delete, sender=Turno)
+def turno_liberado(sender, instance, **kwargs):
+    transaction.on_commit(lambda: agenda.liberar_turno(instance))
+
+
+# Resúmenes del dashboard y contadores de cada paciente: se guardan las
+# contribuciones previas antes de guardar y se aplica la diferencia después,
+# en la misma transacción.
+MODELOS_CON_RESUMEN = (Cita, Consulta, Factura, Paciente)
+
+
+def resumen_antes_de_guardar(sender, instance, **kwargs):
+    anterior = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._anterior = anterior
+    instance._contribuciones_previas = resumenes.contribuciones(anterior) if anterior else []
+    instance._contadores_previos = contadores.contribuciones(anterior) if anterior else []
+
+
+def resumen_despues_de_guardar(sender, instance, **kwargs):
+    resumenes.aplicar(getattr(instance, '_contribuciones_previas', []), resumenes.contribuciones(instance))
+    contadores.aplicar(getattr(instance, '_contadores_previos', []), contadores.contribuciones(instance))
+
+
+def resumen_al_eliminar(sender, instance, **kwargs):
+    resumenes.aplicar(resumenes.contribuciones(instance), [])
+    contadores.aplicar(contadores.contribuciones(instance), [])
+
+
+# Última visita: una consulta nueva la adelanta; mover o borrar una consulta
+# (o la cita que la tiene) obliga a recalcularla
+@receiver(post_save, sender=Consulta)
+def visita_registrada(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_anterior', None)
+    if created:
+        paciente_id, fecha = Cita.objects.filter(id=instance.cita_id).values_list('paciente_id', 'fecha').get()
+        contadores.registrar_visita(paciente_id, fecha)
+    elif anterior is not None and anterior.cita_id != instance.cita_id:
+        contadores.recalcular_visitas(
+            Cita.objects.filter(id__in=[anterior.cita_id, instance.cita_id]).values_list('paciente_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Cita)
+def visita_movida(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_anterior', None)
+    if anterior is None or (anterior.paciente_id, anterior.fecha) == (instance.paciente_id, instance.fecha):
+        return
+    if Consulta.objects.filter(cita_id=instance.pk).exists():
+        contadores.recalcular_visitas([anterior.paciente_id, instance.paciente_id])
+
+
+@receiver(pre_delete, sender=Consulta)
+def visita_antes_de_eliminar(sender, instance, **kwargs):
+    instance._paciente_visita = Cita.objects.filter(id=instance.cita_id).values_list('paciente_id', flat=True).first()
+
+
+@receiver(post_delete, sender=Consulta)
+def visita_eliminada(sender, instance, **kwargs):
+    contadores.recalcular_visitas([getattr(instance, '_paciente_visita', None)])
+
+
+for modelo in MODELOS_CON_RESUMEN:
+    pre_save.connect(resumen_antes_de_guardar, sender=modelo)
+    post_save.connect(resumen_despues_de_guardar, sender=modelo)
+    pre_delete.connect(resumen_al_eliminar, sender=modelo)
+
+
+# Caché de datos de referencia y del informe de cartera: cualquier cambio
+# invalida los grupos afectados
+def invalidar_referencias(sender, **kwargs):
+    referencias.invalidar_modelo(sender)
+
+
+for modelo in (Especialidad, Factura):
+    post_save.connect(invalidar_referencias, sender=modelo)
+    post_delete.connect(invalidar_referencias, sender=modelo)
+
+
+# Tablero en vivo: cada cambio de una cita se publica al confirmarse la
+# transacción (las operaciones en lote publican por su cuenta)
+@receiver(post_save, sender=Cita)
+def cita_publicada(sender, instance, created, **kwargs):
+    anterior = None if created else getattr(instance, '_anterior', None)
+    tipo = tablero.CREADA if created else tablero.tipo_de_cambio(anterior, instance)
+    lugares = {}
+    if tipo == tablero.REPROGRAMADA:
+        lugares[instance.pk] = (anterior.medico_id, anterior.fecha)
+    tablero.publicar(tipo, [instance.pk], lugares)
+
+
+@receiver(post_delete, sender=Cita)
+def cita_eliminada(sender, instance, **kwargs):
+    tablero.publicar_eliminadas([(instance.pk, instance.medico_id, instance.fecha)])
+
+
+# Índice invertido del texto de las consultas (los UPDATE masivos y
+# bulk_create no pasan por aquí: ver `manage.py reindexar_consultas`)
+@receiver(post_save, sender=Consulta)
+def consulta_guardada(sender, instance, **kwargs):
+    indice_consultas.indexar(instance)
@@ -0,0 +1,252 @@
+import asyncio
+import datetime
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Cita
+from .reservas import fecha_del_turno
+
+# Tablero en vivo de la sala de espera y la agenda. En lugar de recargar
+# citas_lista cada pocos segundos, la página citas/tablero/ abre un
+# EventSource contra citas/eventos/ (Server-Sent Events) y aplica en el
+# navegador los cambios de cada cita: creada, confirmada, cancelada,
+# reprogramada, actualizada o eliminada.
+#
+# Los cambios salen de las señales de Cita y de las operaciones en lote
+# (que no emiten señales) y se publican al confirmarse la transacción en un
+# broker. El predeterminado, BrokerMemoria, vive en el proceso: cada conexión
+# es una cola asyncio y el broker guarda los últimos eventos para que un
+# navegador que se reconecta (cabecera Last-Event-ID) recupere lo perdido.
+# Con varios procesos cada uno solo ve sus propios cambios y numera sus
+# eventos por su cuenta, de modo que el Last-Event-ID de un worker no sirve
+# en otro: con BrokerMemoria el servidor corre con un único worker.
+# TABLERO_BROKER permite enchufar otro broker (p. ej. Redis pub/sub, con ids
+# compartidos) con la misma interfaz. El flujo es asíncrono: se sirve con un
+# servidor ASGI (centro_medico/asgi.py); con WSGI la vista responde 501.
+
+CREADA = 'creada'
+CONFIRMADA = 'confirmada'
+CANCELADA = 'cancelada'
+REPROGRAMADA = 'reprogramada'
+ACTUALIZADA = 'actualizada'
+ELIMINADA = 'eliminada'
+
+LATIDO_SEGUNDOS = getattr(settings, 'TABLERO_LATIDO_SEGUNDOS', 15)
+HISTORIAL = getattr(settings, 'TABLERO_HISTORIAL', 500)
+REINTENTO_MS = 3000
+COLA_MAXIMA = 1000
+
+CAMPOS = ('id', 'estado', 'fecha', 'hora', 'medico_id', 'medico__nombre', 'medico__apellido',
+          'paciente__nombre', 'paciente__apellido')
+
+
+# Médico y/o día que sigue una conexión (día en formato ISO, hora local)
+class Filtro:
+    def __init__(self, medico_id=None, fecha=None):
+        self.medico_id = medico_id
+        self.fecha = fecha.isoformat() if fecha else None
+
+    def _coincide(self, medico_id, fecha):
+        return (self.medico_id is None or medico_id == self.medico_id) and (self.fecha is None or fecha == self.fecha)
+
+    # Una cita reprogramada interesa tanto donde estaba como donde queda
+    def coincide(self, evento):
+        anterior = evento.get('anterior')
+        return self._coincide(evento['medico_id'], evento['fecha']) or bool(
+            anterior and self._coincide(anterior['medico_id'], anterior['fecha'])
+        )
+
+
+class Suscripcion:
+    def __init__(self, filtro, loop):
+        self.filtro = filtro
+        self.loop = loop
+        self.cola = asyncio.Queue(COLA_MAXIMA)
+
+    # Corre en el bucle de la conexión. Si el navegador no da abasto se
+    # vacía la cola y se le pide recargar (None)
+    def entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+
+class BrokerMemoria:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+        self._historial = deque(maxlen=HISTORIAL)
+        self._ids = itertools.count(1)
+        self._ultimo_id = 0
+
+    def activo(self):
+        return bool(self._suscripciones)
+
+    # La página del tablero lo pasa al abrir el flujo (?desde=) para recibir
+    # lo ocurrido entre que se generó y que se conectó
+    def ultimo_id(self):
+        return self._ultimo_id
+
+    # Sin conexiones no se arma el evento; se salta un id para que quien se
+    # reconecte después note el hueco y recargue
+    def omitir(self):
+        with self._lock:
+            self._ultimo_id = next(self._ids)
+            self._historial.clear()
+
+    # Se puede llamar desde cualquier hilo (las señales corren en los de Django)
+    def publicar(self, evento):
+        with self._lock:
+            self._ultimo_id = next(self._ids)
+            evento = {**evento, 'id': self._ultimo_id}
+            self._historial.append(evento)
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            if suscripcion.filtro.coincide(evento):
+                try:
+                    suscripcion.loop.call_soon_threadsafe(suscripcion.entregar, evento)
+                except RuntimeError:
+                    # El bucle de esa conexión ya se cerró
+                    self.cancelar(suscripcion)
+        return evento
+
+    def suscribir(self, filtro, desde_id=None):
+        suscripcion = Suscripcion(filtro, asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if desde_id is not None and desde_id != self._ultimo_id:
+                primero = self._historial[0]['id'] if self._historial else self._ultimo_id + 1
+                if desde_id > self._ultimo_id or primero > desde_id + 1:
+                    # Lo perdido ya no está en el historial (o el proceso se reinició)
+                    suscripcion.entregar(None)
+                else:
+                    for evento in self._historial:
+                        if evento['id'] > desde_id and filtro.coincide(evento):
+                            suscripcion.entregar(evento)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+
+_broker = None
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'TABLERO_BROKER', 'pacientes.tablero.BrokerMemoria'))()
+    return _broker
+
+
+def tipo_de_cambio(anterior, cita):
+    if anterior is None:
+        return CREADA
+    if (anterior.medico_id, anterior.fecha) != (cita.medico_id, cita.fecha):
+        return REPROGRAMADA
+    if anterior.estado != cita.estado and cita.estado == 'Cancelada':
+        return CANCELADA
+    if anterior.estado != cita.estado and cita.estado == 'Confirmada':
+        return CONFIRMADA
+    return ACTUALIZADA
+
+
+def _lugar(medico_id, fecha):
+    return {'medico_id': medico_id, 'fecha': fecha_del_turno(fecha).isoformat()}
+
+
+def _evento(tipo, fila, anterior=None):
+    evento = {
+        'tipo': tipo,
+        'cita': fila['id'],
+        **_lugar(fila['medico_id'], fila['fecha']),
+        'hora': fila['hora'].strftime('%H:%M'),
+        'estado': fila['estado'],
+        'paciente': f"{fila['paciente__nombre']} {fila['paciente__apellido']}",
+        'medico': f"Dr. {fila['medico__nombre']} {fila['medico__apellido']}",
+    }
+    if anterior:
+        evento['anterior'] = _lugar(*anterior)
+    return evento
+
+
+# Citas de un día (y médico) con el mismo formato que los eventos
+def citas_del_dia(fecha, medico_id=None):
+    inicio = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+    fin = timezone.make_aware(datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min))
+    citas = Cita.objects.filter(fecha__gte=inicio, fecha__lt=fin)
+    if medico_id:
+        citas = citas.filter(medico_id=medico_id)
+    return [_evento(None, fila) for fila in citas.order_by('hora', 'id').values(*CAMPOS)]
+
+
+def _publicar(tipo, ids, anteriores):
+    destino = broker()
+    if not destino.activo():
+        destino.omitir()
+        return
+    # Una sola lectura para todas las citas del cambio
+    for fila in Cita.objects.filter(id__in=ids).values(*CAMPOS):
+        destino.publicar(_evento(tipo, fila, anteriores.get(fila['id'])))
+
+
+# Publica el cambio de las citas cuando se confirma la transacción en curso.
+# anteriores: id -> (medico_id, fecha) previos de las citas reprogramadas
+def publicar(tipo, ids, anteriores=None):
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: _publicar(tipo, ids, anteriores or {}))
+
+
+# Las citas eliminadas ya no se pueden leer: basta con su lugar en la agenda
+def publicar_eliminadas(citas):
+    citas = [(id, medico_id, fecha) for id, medico_id, fecha in citas]
+
+    def enviar():
+        destino = broker()
+        if not destino.activo():
+            destino.omitir()
+            return
+        for id, medico_id, fecha in citas:
+            destino.publicar({'tipo': ELIMINADA, 'cita': id, **_lugar(medico_id, fecha)})
+
+    if citas:
+        transaction.on_commit(enviar)
+
+
+def formato_sse(evento):
+    return f"id: {evento['id']}\nevent: cita\ndata: {json.dumps(evento, cls=DjangoJSONEncoder)}\n\n"
+
+
+# Flujo SSE de una conexión: eventos que coinciden con el filtro, un
+# comentario de latido para que los proxies no corten la conexión, y
+# "recargar" cuando el navegador perdió eventos que ya no se pueden reponer
+async def flujo(filtro, desde_id=None):
+    destino = broker()
+    suscripcion = destino.suscribir(filtro, desde_id)
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n"
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            if evento is None:
+                yield "event: recargar\ndata: {}\n\n"
+                return
+            yield formato_sse(evento)
+    finally:
+        destino.cancelar(suscripcion)
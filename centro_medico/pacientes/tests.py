@@ -1,3 +1,1388 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import zipfile
+from unittest import mock, skipUnless
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .models import (
+    Paciente, Medico, Cita, Consulta, Usuario, Especialidad, Turno, TurnoLibre, Factura, Tarifa, ResumenDiario, TerminoConsulta,
+    TareaArchivo, RegistroArchivado, ParDuplicado,
+)
+from .presupuesto import presupuesto_consultas, PresupuestoExcedido
+from .busqueda import buscar_pacientes, LIMITE_RESULTADOS
+from .reservas import reservar_cita, reprogramar_cita, cancelar_cita, fecha_del_turno, ConflictoDeTurno
+from .agenda import interpretar_disponibilidad
+from .importacion import importar_pacientes, leer_filas, COLUMNAS
+from .resumenes import indicadores, reconstruir, carga_del_dia
+from .generador import generar_datos
+from .cartera import filas_cartera, consulta_cartera
+from .facturacion import facturar, consultas_sin_factura, FacturacionEnCurso, BLOQUEO
+from .bloqueos import bloqueo
+from .recordatorios import EnvioConsola, enviar_recordatorios, marcar_ausencias
+from .instrumentacion import Medicion, registro
+from .indice_consultas import buscar_consultas, reindexar, LIMITE_RESULTADOS as LIMITE_CONSULTAS
+from .citas_lote import filtrar_citas, reprogramar_citas, cancelar_citas
+from .archivo import ETAPAS, encolar, ejecutar, procesar_tareas, _procesar_lote
+from .particiones import (
+    anios_cerrados, definicion, particionar, particiones, ParticionNoDisponible, SUFIJO_ANTERIOR, SUFIJO_BORRADAS,
+)
+from .contadores import reconciliar
+from .duplicados import claves, descartar, detectar, fusionar
+from .texto import fonetica
+from .tablero import BrokerMemoria, Filtro, flujo
+from .enrutador import EnrutadorLecturas, EnrutadorMiddleware, COOKIE_PRIMARIO, ALIAS_REPLICA
+from . import api, benchmark, referencias, tablero
+
+
+# Pruebas de listados e informes: con una réplica configurada sus lecturas
+# irían a ella, y una réplica espejo no ve los datos sin confirmar de la
+# transacción de TestCase. El enrutado se prueba en EnrutadorTests.
+sin_replica = override_settings(DATABASE_ROUTERS=[])
+
+
+# La caché en memoria sobrevive entre pruebas, pero la base de datos no
+class CentroMedicoTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+# Datos mínimos compartidos por las pruebas
+def crear_datos(n=5):
+    especialidad = Especialidad.objects.create(nombre='Cardiología')
+    for i in range(n):
+        paciente = Paciente.objects.create(
+            nombre=f'Ana{i}', apellido=f'Pérez{i}', documento_identidad=f'DOC{i}',
+            direccion='Calle 1', telefono='0991234567', correo=f'ana{i}@correo.com',
+            fecha_nacimiento=datetime.date(1990, 1, 1),
+        )
+        medico = Medico.objects.create(
+            nombre=f'Luis{i}', apellido=f'Mora{i}', especialidad=especialidad,
+            telefono='0991234567', correo=f'luis{i}@correo.com',
+            disponibilidad='Lunes a Viernes, 9:00 AM - 5:00 PM',
+        )
+        cita = Cita.objects.create(
+            paciente=paciente, medico=medico, hora=datetime.time(9 + i % 8, 0), motivo='Control',
+        )
+        Consulta.objects.create(cita=cita, motivo='Control', diagnostico='Sano', receta='Nada', indicaciones='Reposo')
+        Usuario.objects.create(nombre=f'User{i}', correo=f'u{i}@correo.com', rol='Secretaria', contrasena='x')
+
+
+@sin_replica
+class PresupuestoConsultasTests(CentroMedicoTestCase):
+    def test_listados_no_crecen_con_las_filas(self):
+        crear_datos(5)
+        for nombre in ['pacientes_lista', 'medicos_lista', 'citas_lista', 'consultas_lista',
+                       'usuarios_lista', 'citas_nueva', 'consultas_nueva']:
+            with presupuesto_consultas(2, etiqueta=nombre):
+                respuesta = self.client.get(reverse(nombre))
+            self.assertEqual(respuesta.status_code, 200)
+
+    def test_presupuesto_excedido(self):
+        crear_datos(3)
+        with self.assertRaises(PresupuestoExcedido):
+            with presupuesto_consultas(1):
+                for cita in Cita.objects.all():
+                    str(cita.paciente)
+
+
+@sin_replica
+class PaginacionKeysetTests(CentroMedicoTestCase):
+    def setUp(self):
+        crear_datos(7)
+
+    def recorrer(self, nombre, clave):
+        url, vistos = reverse(nombre), []
+        parametros = {}
+        while True:
+            respuesta = self.client.get(url, parametros)
+            pagina = respuesta.context[clave]
+            vistos.extend(objeto.id for objeto in pagina)
+            if not pagina.siguiente:
+                return vistos, pagina
+            parametros = {'despues': pagina.siguiente}
+
+    def test_recorre_todas_las_filas_sin_repetir(self):
+        with self.settings(PAGINACION_TAMANO=3):
+            for nombre, clave, modelo in [('pacientes_lista', 'pacientes', Paciente),
+                                          ('citas_lista', 'citas', Cita),
+                                          ('consultas_lista', 'consultas', Consulta)]:
+                vistos, _ = self.recorrer(nombre, clave)
+                self.assertEqual(sorted(vistos), sorted(modelo.objects.values_list('id', flat=True)))
+                self.assertEqual(len(vistos), len(set(vistos)))
+
+    def test_pagina_anterior(self):
+        with self.settings(PAGINACION_TAMANO=3):
+            primera = self.client.get(reverse('usuarios_lista')).context['usuarios']
+            segunda = self.client.get(reverse('usuarios_lista'), {'despues': primera.siguiente}).context['usuarios']
+            volver = self.client.get(reverse('usuarios_lista'), {'antes': segunda.anterior}).context['usuarios']
+        self.assertEqual([u.id for u in volver], [u.id for u in primera])
+        self.assertIsNone(volver.anterior)
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        respuesta = self.client.get(reverse('medicos_lista'), {'despues': 'basura'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.context['medicos']), 7)
+
+
+@sin_replica
+class BusquedaPacientesTests(CentroMedicoTestCase):
+    def setUp(self):
+        for i, (nombre, apellido) in enumerate([('José', 'Ñúñez'), ('Josefa', 'Andrade'), ('María', 'Jiménez')]):
+            Paciente.objects.create(
+                nombre=nombre, apellido=apellido, documento_identidad=f'17{i}0001',
+                direccion='Calle 1', telefono='0991234567', correo=f'p{i}@correo.com',
+                fecha_nacimiento=datetime.date(1980, 1, 1),
+            )
+
+    def test_documento_exacto(self):
+        resultado = buscar_pacientes('1710001')
+        self.assertEqual([p.apellido for p in resultado], ['Andrade'])
+
+    def test_prefijo_sin_acentos_ni_mayusculas(self):
+        self.assertEqual([p.apellido for p in buscar_pacientes('nunez')], ['Ñúñez'])
+        self.assertEqual({p.apellido for p in buscar_pacientes('JOS')}, {'Ñúñez', 'Andrade'})
+        self.assertEqual([p.nombre for p in buscar_pacientes('jose nun')], ['José'])
+
+    def test_coincidencia_aproximada(self):
+        self.assertEqual([p.apellido for p in buscar_pacientes('jimenes')], ['Jiménez'])
+
+    def test_vista_buscar(self):
+        respuesta = self.client.get(reverse('pacientes_buscar'), {'q': 'maria'})
+        self.assertContains(respuesta, 'Jiménez')
+
+    def test_admin_sin_tope_de_resultados(self):
+        for i in range(LIMITE_RESULTADOS):
+            Paciente.objects.create(
+                nombre='Josué', apellido=f'Paz{i}', documento_identidad=f'18{i}0001',
+                direccion='Calle 1', telefono='0991234567', correo=f'q{i}@correo.com',
+                fecha_nacimiento=datetime.date(1980, 1, 1),
+            )
+        self.assertEqual(len(buscar_pacientes('jos')), LIMITE_RESULTADOS)
+        modelo_admin = admin.site._registry[Paciente]
+        resultados, _ = modelo_admin.get_search_results(RequestFactory().get('/'), Paciente.objects.all(), 'jos')
+        self.assertEqual(resultados.count(), LIMITE_RESULTADOS + 2)
+
+
+class ReservasTests(CentroMedicoTestCase):
+    def setUp(self):
+        crear_datos(2)
+        self.paciente = Paciente.objects.first()
+        self.medico, self.otro_medico = Medico.objects.order_by('id')[:2]
+        self.manana = timezone.localdate() + datetime.timedelta(days=1)
+
+    def datos(self, medico, hora='10:00'):
+        return {'paciente': self.paciente.id, 'medico': medico.id, 'fecha': self.manana.isoformat(),
+                'hora': hora, 'estado': 'Pendiente', 'motivo': 'Control'}
+
+    def nueva_cita(self, medico, hora=datetime.time(10, 0)):
+        fecha = timezone.make_aware(datetime.datetime.combine(self.manana, hora))
+        return Cita(paciente=self.paciente, medico=medico, fecha=fecha, hora=hora, motivo='Control')
+
+    def test_turno_duplicado_devuelve_la_cita_en_conflicto(self):
+        primera = reservar_cita(self.nueva_cita(self.medico))
+        with self.assertRaises(ConflictoDeTurno) as contexto:
+            reservar_cita(self.nueva_cita(self.medico))
+        self.assertEqual(contexto.exception.cita, primera)
+        self.assertEqual(Cita.objects.filter(medico=self.medico, hora=datetime.time(10, 0)).count(), 1)
+
+    def test_otro_medico_puede_usar_el_mismo_horario(self):
+        reservar_cita(self.nueva_cita(self.medico))
+        reservar_cita(self.nueva_cita(self.otro_medico))
+        self.assertEqual(Turno.objects.count(), 2)
+
+    def test_cancelar_libera_el_turno(self):
+        cita = reservar_cita(self.nueva_cita(self.medico))
+        cancelar_cita(cita)
+        reservar_cita(self.nueva_cita(self.medico))
+        self.assertEqual(Turno.objects.count(), 1)
+
+    def test_vistas_nueva_y_editar(self):
+        respuesta = self.client.post(reverse('citas_nueva'), self.datos(self.medico))
+        self.assertRedirects(respuesta, reverse('citas_lista'))
+        respuesta = self.client.post(reverse('citas_nueva'), self.datos(self.medico))
+        self.assertContains(respuesta, 'El médico ya tiene una cita')
+        cita = Cita.objects.get(turno__isnull=False, medico=self.medico)
+        respuesta = self.client.post(reverse('citas_editar', args=[cita.id]), self.datos(self.medico, '11:30'))
+        self.assertRedirects(respuesta, reverse('citas_lista'))
+        cita.turno.refresh_from_db()
+        self.assertEqual(cita.turno.hora, datetime.time(11, 30))
+
+
+class AgendaTests(CentroMedicoTestCase):
+    def test_interpretar_disponibilidad(self):
+        ventanas = interpretar_disponibilidad('Lunes a Viernes, 9:00 AM - 5:00 PM; Sábado 8:00 - 12:00')
+        self.assertEqual(len(ventanas), 6)
+        self.assertEqual(ventanas[0], (0, datetime.time(9, 0), datetime.time(17, 0)))
+        self.assertEqual(ventanas[-1], (5, datetime.time(8, 0), datetime.time(12, 0)))
+        self.assertEqual(
+            interpretar_disponibilidad('Martes y Jueves 8:00 a 10:00'),
+            [(1, datetime.time(8, 0), datetime.time(10, 0)), (3, datetime.time(8, 0), datetime.time(10, 0))],
+        )
+
+    def test_indice_de_turnos_libres(self):
+        crear_datos(1)
+        medico = Medico.objects.get()
+        self.assertEqual(medico.horarios.count(), 5)
+        manana = timezone.localdate() + datetime.timedelta(days=1)
+        while manana.weekday() > 4:
+            manana += datetime.timedelta(days=1)
+        libres = TurnoLibre.objects.filter(medico=medico, fecha=manana)
+        self.assertEqual(libres.count(), 16)
+
+        hora = datetime.time(9, 0)
+        cita = reservar_cita(Cita(
+            paciente=Paciente.objects.get(), medico=medico, hora=hora, motivo='Control',
+            fecha=timezone.make_aware(datetime.datetime.combine(manana, hora)),
+        ))
+        self.assertFalse(libres.filter(hora=hora).exists())
+        # Editar sin cambiar médico, fecha ni hora no devuelve el turno al índice
+        cita.motivo = 'Control anual'
+        with self.captureOnCommitCallbacks(execute=True):
+            reprogramar_cita(cita)
+        self.assertFalse(libres.filter(hora=hora).exists())
+        self.assertTrue(Turno.objects.filter(cita=cita).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            cancelar_cita(cita)
+        self.assertTrue(libres.filter(hora=hora).exists())
+
+    def test_endpoint_proximos_turnos(self):
+        crear_datos(2)
+        especialidad = Especialidad.objects.get()
+        respuesta = self.client.get(reverse('agenda_proximos_turnos'), {'especialidad': especialidad.id, 'n': 3})
+        turnos = respuesta.json()['turnos']
+        self.assertEqual(len(turnos), 3)
+        self.assertEqual(turnos, sorted(turnos, key=lambda t: (t['fecha'], t['hora'])))
+        self.assertEqual(self.client.get(reverse('agenda_proximos_turnos')).status_code, 400)
+
+
+@sin_replica
+class ImportacionPacientesTests(CentroMedicoTestCase):
+    CSV = (
+        "nombre,apellido,documento_identidad,direccion,telefono,correo,fecha_nacimiento\n"
+        "Ana,Ruiz,100,Calle 1,0991234567,ana@correo.com,1990-05-01\n"
+        "Beto,Lara,101,Calle 2,0991234567,beto@correo.com,1985-02-03\n"
+        "Caro,Paz,100,Calle 3,0991234567,caro@correo.com,1970-01-01\n"
+        "Dani,Sol,102,Calle 4,abc,dani@correo.com,1970-01-01\n"
+        "Eva,Mar,103,Calle 5,0991234567,eva@correo.com,2990-01-01\n"
+    )
+
+    def test_importa_en_lotes_y_rechaza_filas_invalidas(self):
+        Paciente.objects.create(
+            nombre='Beto', apellido='Lara', documento_identidad='101', direccion='x',
+            telefono='0991234567', correo='b@correo.com', fecha_nacimiento=datetime.date(1985, 2, 3),
+        )
+        rechazos = io.StringIO()
+        resumen = importar_pacientes(leer_filas(io.StringIO(self.CSV)), tamano_lote=2, rechazos=rechazos)
+        self.assertEqual((resumen.insertados, resumen.rechazados), (1, 4))
+        self.assertEqual(len(rechazos.getvalue().strip().splitlines()), 5)
+        self.assertEqual(Paciente.objects.get(documento_identidad='100').apellido_normalizado, 'ruiz')
+
+    def test_rechaza_valores_mas_largos_que_la_columna(self):
+        filas = [
+            {'nombre': 'Ana', 'apellido': 'Ruiz', 'documento_identidad': '300', 'direccion': 'x',
+             'telefono': '+593 (09912) 1234 5678 9012', 'correo': 'a@correo.com', 'fecha_nacimiento': '1990-01-01'},
+            {'nombre': 'Ana', 'apellido': 'Ruiz', 'documento_identidad': '3' * 21, 'direccion': 'x',
+             'telefono': '0991234567', 'correo': 'a@correo.com', 'fecha_nacimiento': '1990-01-01'},
+        ]
+        rechazos = io.StringIO()
+        resumen = importar_pacientes(filas, rechazos=rechazos)
+        self.assertEqual((resumen.insertados, resumen.rechazados), (0, 2))
+        self.assertIn('telefono:', rechazos.getvalue())
+        self.assertIn('documento_identidad:', rechazos.getvalue())
+
+    def test_documento_insertado_en_paralelo_se_rechaza_por_fila(self):
+        Paciente.objects.create(
+            nombre='Beto', apellido='Lara', documento_identidad='101', direccion='x',
+            telefono='0991234567', correo='b@correo.com', fecha_nacimiento=datetime.date(1985, 2, 3),
+        )
+        # La consulta de existentes no lo ve, como si otro proceso lo hubiera insertado después
+        vacio = mock.Mock(**{'values_list.return_value': []})
+        with mock.patch.object(Paciente.objects, 'filter', return_value=vacio):
+            resumen = importar_pacientes(leer_filas(io.StringIO(self.CSV)))
+        self.assertEqual((resumen.insertados, resumen.rechazados), (1, 4))
+        self.assertEqual(Paciente.objects.filter(documento_identidad='100').count(), 1)
+
+    def test_jsonl(self):
+        lineas = io.StringIO(
+            '{"nombre": "Ana", "apellido": "Ruiz", "documento_identidad": "200", "direccion": "x", '
+            '"telefono": "0991234567", "correo": "a@correo.com", "fecha_nacimiento": "1990-01-01"}\n'
+            'no es json\n'
+        )
+        resumen = importar_pacientes(leer_filas(lineas, 'jsonl'))
+        self.assertEqual((resumen.insertados, resumen.rechazados), (1, 1))
+
+    def test_vista_rechazos_solo_para_la_sesion(self):
+        with tempfile.TemporaryDirectory() as carpeta, mock.patch('pacientes.views.RECHAZOS_DIR', carpeta):
+            subido = SimpleUploadedFile('pacientes.csv', self.CSV.encode())
+            respuesta = self.client.post(reverse('pacientes_importar'), {'archivo': subido})
+            url = respuesta.context['rechazos_url']
+            self.assertEqual(url, reverse('pacientes_importar_rechazos'))
+            contenido = b''.join(self.client.get(url).streaming_content).decode()
+            self.assertIn('abc', contenido)
+            self.assertEqual(Client().get(url).status_code, 404)
+            # Nombre aleatorio, fuera de MEDIA_ROOT
+            archivo, = os.listdir(carpeta)
+            self.assertNotRegex(archivo, r'\d{14}')
+
+    def test_archivo_que_no_es_utf8(self):
+        subido = SimpleUploadedFile('pacientes.csv', self.CSV.replace('Ruiz', 'Muñoz').encode('cp1252'))
+        respuesta = self.client.post(reverse('pacientes_importar'), {'archivo': subido})
+        self.assertContains(respuesta, 'UTF-8', status_code=400)
+        self.assertFalse(Paciente.objects.exists())
+
+    def test_exportar_en_streaming(self):
+        importar_pacientes(leer_filas(io.StringIO(self.CSV)))
+        respuesta = self.client.get(reverse('pacientes_exportar'))
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertEqual(contenido.splitlines()[0], ','.join(COLUMNAS))
+        self.assertEqual(len(contenido.strip().splitlines()), 3)
+
+
+class ResumenesDashboardTests(CentroMedicoTestCase):
+    def test_incremental_coincide_con_reconstruccion(self):
+        crear_datos(3)
+        cita = Cita.objects.first()
+        cancelar_cita(cita)
+        consulta = Consulta.objects.first()
+        Factura.objects.create(consulta=consulta, total=Decimal('25.00'), estado_pago='Pendiente')
+        factura = Factura.objects.create(consulta=consulta, total=Decimal('10.00'), estado_pago='Pendiente')
+        factura.estado_pago = 'Pagado'
+        factura.save()
+        Consulta.objects.last().delete()
+
+        incremental = indicadores()
+        self.assertEqual(incremental['citas_por_estado'], {'Pendiente': 2, 'Cancelada': 1})
+        self.assertEqual(incremental['facturas_por_estado']['Pendiente']['monto'], Decimal('25.00'))
+        self.assertEqual(incremental['facturas_por_estado']['Pagado']['cantidad'], 1)
+        self.assertEqual(sum(n for _, n in incremental['consultas_por_medico']), 2)
+        self.assertEqual(incremental['pacientes_nuevos'][timezone.localdate()], 3)
+
+        reconstruir()
+        self.assertEqual(indicadores(), incremental)
+
+    def test_dashboard_con_pocas_consultas(self):
+        crear_datos(3)
+        with presupuesto_consultas(2):
+            respuesta = self.client.get(reverse('dashboard'))
+        self.assertContains(respuesta, 'Pendiente')
+
+
+class IndicesTests(CentroMedicoTestCase):
+    # Consultas frecuentes y el índice que debe resolverlas (EXPLAIN)
+    def test_consultas_frecuentes_usan_indice(self):
+        ahora = timezone.now()
+        hoy = timezone.localdate()
+        casos = [
+            (Cita.objects.filter(estado='Pendiente', fecha__gte=ahora), 'cita_estado_fecha_idx'),
+            (Cita.objects.filter(medico_id=1, fecha__gte=ahora), 'cita_medico_fecha_hora_idx'),
+            (Factura.objects.filter(estado_pago='Pendiente', fecha__gte=hoy), 'factura_estado_fecha_idx'),
+            (Factura.objects.filter(estado_pago='Pendiente', fecha_vencimiento__lt=hoy), 'factura_estado_venc_idx'),
+            (Paciente.objects.filter(fecha_registro__gte=ahora), 'paciente_fecha_registro_idx'),
+            (Medico.objects.filter(correo='a@correo.com'), 'medico_correo_idx'),
+            (Usuario.objects.filter(correo='a@correo.com'), 'usuario_correo_idx'),
+        ]
+        for queryset, indice in casos:
+            with self.subTest(indice=indice):
+                self.assertIn(indice, queryset.explain())
+
+
+class CacheReferenciasTests(CentroMedicoTestCase):
+    def test_formularios_sin_consultas_con_cache_caliente(self):
+        crear_datos(3)
+        self.client.get(reverse('medicos_nuevo'))
+        with presupuesto_consultas(0):
+            self.assertEqual(self.client.get(reverse('medicos_nuevo')).status_code, 200)
+
+    def test_invalidacion_al_guardar(self):
+        crear_datos(1)
+        self.assertEqual(referencias.especialidades()[0][1], 'Cardiología')
+        Especialidad.objects.update(nombre='x')  # update() no emite señales
+        self.assertEqual(referencias.especialidades()[0][1], 'Cardiología')
+        especialidad = Especialidad.objects.get()
+        especialidad.save()
+        self.assertEqual(referencias.especialidades()[0][1], 'x')
+
+
+class AutocompletarTests(CentroMedicoTestCase):
+    def test_formularios_no_cargan_opciones(self):
+        crear_datos(5)
+        with presupuesto_consultas(0):
+            respuesta = self.client.get(reverse('citas_nueva'))
+        self.assertNotContains(respuesta, 'Ana0')
+        self.assertContains(respuesta, reverse('autocompletar_pacientes'))
+        cita = Cita.objects.get(paciente__nombre='Ana3')
+        respuesta = self.client.get(reverse('citas_editar', args=[cita.id]))
+        self.assertContains(respuesta, 'Ana3 Pérez3')
+        self.assertNotContains(respuesta, 'Ana1 Pérez1')
+
+    def test_pacientes_por_prefijo_y_documento(self):
+        crear_datos(3)
+        Paciente.objects.create(
+            nombre='José', apellido='Núñez', documento_identidad='1712345678',
+            direccion='x', telefono='1', correo='jose@correo.com', fecha_nacimiento=datetime.date(1980, 1, 1),
+        )
+        datos = self.client.get(reverse('autocompletar_pacientes'), {'q': 'nun'}).json()
+        self.assertEqual([r['etiqueta'] for r in datos['resultados']], ['José Núñez (1712345678)'])
+        datos = self.client.get(reverse('autocompletar_pacientes'), {'q': '17123'}).json()
+        self.assertEqual(len(datos['resultados']), 1)
+        datos = self.client.get(reverse('autocompletar_pacientes'), {'q': 'ana', 'n': 2}).json()
+        self.assertEqual(len(datos['resultados']), 2)
+        self.assertEqual(self.client.get(reverse('autocompletar_pacientes')).json(), {'resultados': []})
+
+    def test_medicos_y_citas(self):
+        crear_datos(3)
+        datos = self.client.get(reverse('autocompletar_medicos'), {'q': 'luis1', 'especialidad': 'x'}).json()
+        self.assertEqual(len(datos['resultados']), 1)
+        cita = Cita.objects.get(paciente__nombre='Ana2')
+        cancelar_cita(Cita.objects.get(paciente__nombre='Ana1'))
+        datos = self.client.get(reverse('autocompletar_citas'), {'q': 'ana'}).json()
+        ids = [r['id'] for r in datos['resultados']]
+        self.assertIn(cita.id, ids)
+        self.assertEqual(len(ids), 2)
+
+
+@sin_replica
+class GeneradorBenchmarkTests(CentroMedicoTestCase):
+    def test_generador_respeta_proporciones_y_turnos(self):
+        resultado = generar_datos(800, semilla=1, tamano_lote=300)
+        self.assertEqual(resultado['pacientes'], 800)
+        self.assertEqual(Paciente.objects.count(), 800)
+        self.assertEqual(Medico.objects.count(), resultado['medicos'])
+        # Una cita activa = un turno, sin choques de horario
+        self.assertEqual(Turno.objects.count(), Cita.objects.exclude(estado='Cancelada').count())
+        self.assertFalse(Paciente.objects.filter(nombre_normalizado='').exists())
+        self.assertGreater(Paciente.objects.dates('fecha_registro', 'year').count(), 1)
+        self.assertEqual(Factura.objects.count(), resultado['facturas'])
+        # Los indicadores derivados se reconstruyen al terminar
+        antes = indicadores()
+        reconstruir()
+        self.assertEqual(indicadores(), antes)
+
+    def test_benchmark_y_comparacion(self):
+        crear_datos(3)
+        resultado = benchmark.ejecutar(repeticiones=2, incluir=['pacientes_lista', 'pacientes_editar'])
+        self.assertEqual(set(resultado['rutas']), {'pacientes_lista', 'pacientes_editar'})
+        medida = resultado['rutas']['pacientes_lista']
+        self.assertEqual(medida['estado'], 200)
+        self.assertLessEqual(medida['p50_ms'], medida['p99_ms'])
+        self.assertEqual(benchmark.comparar(resultado, resultado), [])
+        peor = {'rutas': {'pacientes_lista': dict(medida, consultas=medida['consultas'] + 5, p95_ms=medida['p95_ms'] * 3 + 10)}}
+        self.assertEqual(len(benchmark.comparar(resultado, peor)), 2)
+
+
+@sin_replica
+class InstrumentacionTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        registro.reiniciar()
+
+    def test_server_timing_log_y_metricas(self):
+        crear_datos(3)
+        with self.assertLogs('pacientes.rendimiento', 'DEBUG') as logs:
+            respuesta = self.client.get(reverse('citas_lista'))
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        plantillas_ms = float(respuesta['Server-Timing'].split('tpl;dur=')[1].split(',')[0])
+        self.assertGreater(plantillas_ms, 0)
+        self.assertIn('ruta=citas_lista metodo=GET estado=200', logs.output[0])
+        self.assertIn(f'bytes={len(respuesta.content)}', logs.output[0])
+        texto = self.client.get(reverse('metricas')).content.decode()
+        self.assertIn('centro_medico_peticion_segundos_count{ruta="citas_lista"} 1', texto)
+        self.assertIn('centro_medico_peticiones_total{ruta="citas_lista",metodo="GET",estado="200"} 1', texto)
+        self.assertIn('centro_medico_consultas_bucket{ruta="citas_lista",le="+Inf"} 1', texto)
+        # El propio endpoint de métricas no se registra
+        self.assertNotIn('ruta="metricas"', self.client.get(reverse('metricas')).content.decode())
+
+    def test_consultas_duplicadas(self):
+        crear_datos(1)
+        paciente = Paciente.objects.get()
+        with self.assertLogs('pacientes.rendimiento', 'DEBUG') as logs:
+            self.client.get(reverse('pacientes_editar', args=[paciente.id]))
+        self.assertIn('duplicadas=0', logs.output[0])
+        medicion = Medicion()
+        with connection.execute_wrapper(medicion):
+            for _ in range(3):
+                list(Paciente.objects.filter(id=paciente.id))
+            list(Paciente.objects.filter(id=paciente.id + 1))
+        self.assertEqual((medicion.consultas, medicion.duplicadas), (4, 2))
+
+
+class FacturacionTests(CentroMedicoTestCase):
+    def test_corrida_idempotente_con_tarifa(self):
+        crear_datos(5)
+        Tarifa.objects.create(especialidad=Especialidad.objects.get(), precio=Decimal('40.00'), dias_vencimiento=15)
+        ya_facturada = Consulta.objects.order_by('id').first()
+        Factura.objects.create(consulta=ya_facturada, total=Decimal('10'), estado_pago='Pagado')
+        resumen = facturar(tamano_lote=2)
+        self.assertEqual((resumen.facturas, resumen.monto), (4, Decimal('160.00')))
+        self.assertEqual(Factura.objects.filter(consulta=ya_facturada).count(), 1)
+        factura = Factura.objects.filter(estado_pago='Pendiente').first()
+        self.assertEqual(factura.fecha_vencimiento, factura.fecha + datetime.timedelta(days=15))
+        self.assertEqual(facturar().facturas, 0)
+        self.assertFalse(consultas_sin_factura().exists())
+        self.assertEqual(indicadores()['facturas_por_estado']['Pendiente'], {'cantidad': 4, 'monto': Decimal('160.00')})
+
+    def test_sin_tarifa_y_simulacion(self):
+        crear_datos(2)
+        self.assertEqual(facturar().sin_tarifa, 2)
+        Tarifa.objects.create(especialidad=Especialidad.objects.get(), precio=Decimal('25'))
+        self.assertEqual(facturar(simular=True).facturas, 2)
+        self.assertFalse(Factura.objects.exists())
+
+    def test_una_sola_corrida_a_la_vez(self):
+        crear_datos(2)
+        Tarifa.objects.create(especialidad=Especialidad.objects.get(), precio=Decimal('25'))
+        with bloqueo(BLOQUEO):
+            with self.assertRaises(FacturacionEnCurso):
+                facturar()
+            # La simulación no escribe: no espera a la otra corrida
+            self.assertEqual(facturar(simular=True).facturas, 2)
+        self.assertEqual(facturar().facturas, 2)
+
+
+@sin_replica
+class CarteraTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3)
+        self.hoy = timezone.localdate()
+        consultas = list(Consulta.objects.order_by('id'))
+        # Vencidas hace 10, 45 y 120 días, una por vencer y una pagada
+        for consulta, dias, estado in [(consultas[0], 10, 'Pendiente'), (consultas[0], 45, 'Pendiente'),
+                                       (consultas[1], 120, 'Pendiente'), (consultas[2], -5, 'Pendiente'),
+                                       (consultas[2], 200, 'Pagado')]:
+            Factura.objects.create(
+                consulta=consulta, total=Decimal('100'), estado_pago=estado,
+                fecha_vencimiento=self.hoy - datetime.timedelta(days=dias),
+            )
+
+    def test_tramos_en_una_consulta(self):
+        with presupuesto_consultas(1):
+            filas = list(consulta_cartera('paciente', self.hoy))
+        por_documento = {fila[1]: fila[4:] for fila in filas}
+        cero = Decimal('0')
+        self.assertEqual(por_documento['DOC0'], (2, cero, Decimal('100'), Decimal('100'), cero, cero, Decimal('200')))
+        self.assertEqual(por_documento['DOC1'][5], Decimal('100'))
+        self.assertEqual(por_documento['DOC2'][:2], (1, Decimal('100')))
+        (especialidad,) = consulta_cartera('especialidad', self.hoy)
+        self.assertEqual(especialidad[1:3], ('Cardiología', 4))
+
+    def test_cache_diaria_invalidada_al_pagar(self):
+        list(filas_cartera('especialidad'))
+        with presupuesto_consultas(0):
+            self.assertEqual(list(filas_cartera('especialidad'))[0][-1], Decimal('400'))
+        factura = Factura.objects.filter(estado_pago='Pendiente').first()
+        factura.estado_pago = 'Pagado'
+        factura.save()
+        self.assertEqual(list(filas_cartera('especialidad'))[0][-1], Decimal('300'))
+
+    def test_exportaciones(self):
+        respuesta = self.client.get(reverse('cartera_exportar'), {'agrupacion': 'paciente', 'formato': 'csv'})
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertIn('DOC0,Ana0,Pérez0,2', contenido)
+        respuesta = self.client.get(reverse('cartera_exportar'), {'agrupacion': 'especialidad', 'formato': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(b''.join(respuesta.streaming_content))) as archivo:
+            hoja = archivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertIn('<t>Cardiología</t>', hoja)
+        self.assertEqual(self.client.get(reverse('cartera_exportar'), {'formato': 'pdf'}).status_code, 400)
+        self.assertContains(self.client.get(reverse('cartera_informe')), 'Cardiología')
+
+    def test_informe_por_agrupacion(self):
+        respuesta = self.client.get(reverse('cartera_informe'), {'agrupacion': 'paciente'})
+        self.assertContains(respuesta, '<td>DOC0</td>', html=True)
+        self.assertContains(respuesta, 'agrupacion=paciente&formato=xlsx')
+        self.assertNotContains(respuesta, 'agrupacion=especialidad&formato=csv')
+        self.assertEqual(self.client.get(reverse('cartera_informe'), {'agrupacion': 'medico'}).status_code, 400)
+
+    def test_comando(self):
+        salida = io.StringIO()
+        call_command('informe_cartera', stdout=salida)
+        self.assertIn('DOC0,Ana0,Pérez0,2', salida.getvalue())
+        with self.assertRaisesMessage(CommandError, "El formato xlsx requiere --salida."):
+            call_command('informe_cartera', formato='xlsx', stdout=io.StringIO())
+
+
+class RecordatoriosTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(6)
+        self.ahora = timezone.now()
+        citas = list(Cita.objects.order_by('id'))
+        # Dos citas dentro de la ventana de 24-48 h, una fuera y una cancelada dentro
+        for cita, horas in zip(citas, [30, 40, 60, 30, -5, -30]):
+            Cita.objects.filter(id=cita.id).update(fecha=self.ahora + datetime.timedelta(hours=horas))
+        Cita.objects.filter(id=citas[3].id).update(estado='Cancelada')
+        Cita.objects.filter(id=citas[5].id).update(estado='Confirmada')
+        self.citas = citas
+
+    def test_recordatorios_por_lotes_una_sola_vez(self):
+        salida = io.StringIO()
+        with presupuesto_consultas(5):
+            enviados = enviar_recordatorios(EnvioConsola(salida), self.ahora, tamano_lote=1)
+        self.assertEqual(enviados, 2)
+        self.assertEqual(salida.getvalue().count('Recordatorio:'), 2)
+        self.assertIn('Ana0 Pérez0 <ana0@correo.com>', salida.getvalue())
+        self.assertEqual(enviar_recordatorios(EnvioConsola(io.StringIO()), self.ahora), 0)
+
+    def test_reprogramar_reenvia_el_recordatorio(self):
+        enviar_recordatorios(EnvioConsola(io.StringIO()), self.ahora)
+        cita = Cita.objects.get(id=self.citas[0].id)
+        cita.motivo = 'Control anual'
+        reprogramar_cita(cita)
+        self.assertIsNotNone(Cita.objects.get(id=cita.id).recordatorio_enviado)
+        cita.fecha += datetime.timedelta(hours=1)
+        reprogramar_cita(cita)
+        self.assertIsNone(Cita.objects.get(id=cita.id).recordatorio_enviado)
+        self.assertEqual(enviar_recordatorios(EnvioConsola(io.StringIO()), self.ahora), 1)
+
+    def test_reprogramar_en_lote_reenvia_el_recordatorio(self):
+        # Las citas de crear_datos ya tienen consulta y no se reprograman
+        Consulta.objects.filter(cita_id=self.citas[0].id).delete()
+        enviar_recordatorios(EnvioConsola(io.StringIO()), self.ahora)
+        cita = Cita.objects.get(id=self.citas[0].id)
+        self.assertIsNotNone(cita.recordatorio_enviado)
+        reprogramar_citas(filtrar_citas(ids=[cita.id]), timezone.localdate() + datetime.timedelta(days=10))
+        cita.refresh_from_db()
+        self.assertIsNone(cita.recordatorio_enviado)
+        salida = io.StringIO()
+        self.assertEqual(enviar_recordatorios(EnvioConsola(salida), cita.fecha - datetime.timedelta(hours=30)), 1)
+        self.assertIn('Ana0 Pérez0', salida.getvalue())
+
+    def test_ausencias_en_bloque(self):
+        reconstruir()
+        with presupuesto_consultas(9):
+            self.assertEqual(marcar_ausencias(self.ahora), 1)
+        self.assertEqual(Cita.objects.get(id=self.citas[5].id).estado, 'Confirmada')
+        self.assertEqual(list(Cita.objects.filter(estado='Ausente').values_list('id', flat=True)), [self.citas[4].id])
+        antes = list(ResumenDiario.objects.exclude(cantidad=0).order_by('fecha', 'metrica', 'clave').values_list('fecha', 'metrica', 'clave', 'cantidad'))
+        reconstruir()
+        despues = list(ResumenDiario.objects.order_by('fecha', 'metrica', 'clave').values_list('fecha', 'metrica', 'clave', 'cantidad'))
+        self.assertEqual(antes, despues)
+
+
+class HistorialPacienteTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3)
+        self.paciente = Paciente.objects.get(nombre='Ana0')
+        medicos = list(Medico.objects.all())
+        inicio = timezone.now() - datetime.timedelta(days=100)
+        for i in range(24):
+            cita = Cita.objects.create(
+                paciente=self.paciente, medico=medicos[i % 3], fecha=inicio + datetime.timedelta(days=i),
+                hora=datetime.time(10, 0), motivo='Control',
+            )
+            consulta = Consulta.objects.create(cita=cita, motivo='Control', diagnostico=f'Diagnóstico {i}', receta='R', indicaciones='I')
+            Factura.objects.create(consulta=consulta, total=Decimal('30'), estado_pago='Pendiente')
+        self.url = reverse('pacientes_historial', args=[self.paciente.id])
+
+    def test_consultas_fijas_y_orden_descendente(self):
+        with presupuesto_consultas(4):
+            respuesta = self.client.get(self.url)
+        citas = list(respuesta.context['citas'])
+        self.assertEqual(len(citas), 20)
+        self.assertGreater(citas[0].fecha, citas[-1].fecha)
+        self.assertContains(respuesta, 'Diagnóstico 23')
+        self.assertContains(respuesta, 'Factura #')
+        siguiente = self.client.get(self.url + respuesta.context['citas'].url_siguiente)
+        self.assertEqual(len(siguiente.context['citas']), 5)
+        self.assertContains(siguiente, 'Diagnóstico 0')
+        self.assertNotContains(siguiente, 'Diagnóstico 23')
+
+    def test_fragmentos_se_invalidan_con_consulta_o_factura(self):
+        self.client.get(self.url)
+        consulta = Consulta.objects.get(diagnostico='Diagnóstico 23')
+        Consulta.objects.filter(id=consulta.id).update(diagnostico='Cambiado sin updated_at')
+        self.assertNotContains(self.client.get(self.url), 'Cambiado sin updated_at')
+        consulta.refresh_from_db()
+        consulta.diagnostico = 'Migraña crónica'
+        consulta.save()
+        self.assertContains(self.client.get(self.url), 'Migraña crónica')
+        Factura.objects.create(consulta=consulta, total=Decimal('99.50'), estado_pago='Pagado')
+        self.assertContains(self.client.get(self.url), '99.50')
+
+
+# Réplica real: el alias 'replica' de centro_medico/settings_pruebas.py apunta
+# a la base de prueba del primario (TEST['MIRROR']). Una espejo no comparte la
+# transacción de TestCase, así que los datos de estas pruebas se confirman.
+@skipUnless(ALIAS_REPLICA in settings.DATABASES, "Requiere --settings=centro_medico.settings_pruebas")
+class EnrutadorTests(TransactionTestCase):
+    databases = {'default', ALIAS_REPLICA} if ALIAS_REPLICA in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        crear_datos(2)
+
+    # Cuántas consultas atendió cada conexión durante la petición
+    def pedir(self, metodo, url, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primario, \
+                CaptureQueriesContext(connections[ALIAS_REPLICA]) as replica:
+            respuesta = getattr(self.client, metodo)(url, **kwargs)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+        return respuesta, len(primario), len(replica)
+
+    def test_listados_leen_de_la_replica(self):
+        respuesta, primario, replica = self.pedir('get', reverse('pacientes_lista'))
+        self.assertContains(respuesta, 'Ana0')
+        self.assertEqual(primario, 0)
+        self.assertGreater(replica, 0)
+        paciente = Paciente.objects.first()
+        _, primario, replica = self.pedir('get', reverse('pacientes_editar', args=[paciente.id]))
+        self.assertGreater(primario, 0)
+        self.assertEqual(replica, 0)
+
+    def test_exportacion_lee_de_la_replica_mientras_se_envia(self):
+        respuesta, primario, replica = self.pedir('get', reverse('pacientes_exportar'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(primario, 0)
+        self.assertGreater(replica, 0)
+
+    def test_tras_modificar_datos_se_lee_del_primario(self):
+        datos = {
+            'nombre': 'Eva', 'apellido': 'Ruiz', 'documento_identidad': 'DOC99', 'direccion': 'Calle 2',
+            'telefono': '0991234567', 'correo': 'eva@correo.com', 'fecha_nacimiento': '1985-05-05',
+        }
+        respuesta, primario, replica = self.pedir('post', reverse('pacientes_nuevo'), data=datos)
+        self.assertRedirects(respuesta, reverse('pacientes_lista'), fetch_redirect_response=False)
+        self.assertIn(COOKIE_PRIMARIO, respuesta.cookies)
+        self.assertEqual(replica, 0)
+        # El cliente reenvía la cookie: el listado sale del primario
+        respuesta, primario, replica = self.pedir('get', reverse('pacientes_lista'))
+        self.assertContains(respuesta, 'Eva')
+        self.assertGreater(primario, 0)
+        self.assertEqual(replica, 0)
+        # Vencida la cookie se vuelve a la réplica
+        del self.client.cookies[COOKIE_PRIMARIO]
+        _, primario, replica = self.pedir('get', reverse('pacientes_lista'))
+        self.assertEqual(primario, 0)
+        self.assertGreater(replica, 0)
+
+    # Ninguna vista de listado escribe: se pasa una por el middleware, que
+    # decide en process_view igual que dentro de la cadena de Django
+    def test_tras_escribir_en_la_peticion_se_lee_del_primario(self):
+        def vista(request):
+            middleware.process_view(request, vista, (), {})
+            list(Paciente.objects.all())
+            Paciente.objects.filter(documento_identidad='DOC0').update(direccion='Calle 3')
+            list(Paciente.objects.all())
+            return HttpResponse()
+        middleware = EnrutadorMiddleware(vista)
+        peticion = RequestFactory().get(reverse('pacientes_lista'))
+        peticion.resolver_match = resolve(peticion.path)
+        with CaptureQueriesContext(connections['default']) as primario, \
+                CaptureQueriesContext(connections[ALIAS_REPLICA]) as replica:
+            middleware(peticion)
+        self.assertEqual(len(replica), 1)
+        self.assertEqual(len(primario), 2)
+
+    def test_fuera_de_una_peticion_se_usa_el_primario(self):
+        with CaptureQueriesContext(connections[ALIAS_REPLICA]) as replica:
+            self.assertEqual(Paciente.objects.count(), 2)
+        self.assertEqual(len(replica), 0)
+        self.assertIsNone(EnrutadorLecturas().db_for_read(Paciente))
+        self.assertEqual(EnrutadorLecturas().db_for_write(Paciente), 'default')
+        self.assertFalse(EnrutadorLecturas().allow_migrate(ALIAS_REPLICA, 'pacientes'))
+
+
+@sin_replica
+class IndiceConsultasTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3)
+        self.consultas = list(Consulta.objects.order_by('id'))
+        textos = [
+            ('Dolor de cabeza intenso', 'Amoxicilina 500 mg cada 8 horas'),
+            ('Cabeza y dolor lumbar', 'Ibuprofeno 400 mg'),
+            ('Migraña con dolor de cabeza', 'Amoxicilina 250 mg; amoxicilina en suspensión'),
+        ]
+        for consulta, (diagnostico, receta) in zip(self.consultas, textos):
+            consulta.diagnostico = diagnostico
+            consulta.receta = receta
+            consulta.save()
+
+    def ids(self, texto, **kwargs):
+        return [consulta.id for consulta in buscar_consultas(texto, **kwargs)]
+
+    def test_terminos_prefijos_y_frases(self):
+        primera, segunda, tercera = (consulta.id for consulta in self.consultas)
+        self.assertCountEqual(self.ids('dolor cabeza'), [primera, segunda, tercera])
+        self.assertCountEqual(self.ids('"dolor de cabeza"'), [primera, tercera])
+        self.assertCountEqual(self.ids('ibupro*'), [segunda])
+        self.assertEqual(self.ids('ibupro'), [])
+        # Más apariciones en la receta, mayor relevancia
+        self.assertEqual(self.ids('amoxicilina'), [tercera, primera])
+        self.assertEqual(self.ids('amoxicilina', campos=['d']), [])
+
+    def test_rango_de_fechas_y_actualizacion(self):
+        cita = self.consultas[0].cita
+        cita.fecha = timezone.now() - datetime.timedelta(days=400)
+        cita.save()
+        hace_un_ano = timezone.localdate() - datetime.timedelta(days=365)
+        self.assertNotIn(self.consultas[0].id, self.ids('amoxicilina', desde=hace_un_ano))
+        self.assertIn(self.consultas[0].id, self.ids('amoxicilina', hasta=hace_un_ano))
+        self.consultas[0].receta = 'Paracetamol'
+        self.consultas[0].save()
+        self.assertEqual(self.ids('amoxicilina'), [self.consultas[2].id])
+
+    def test_reindexar_en_lotes(self):
+        TerminoConsulta.objects.all().delete()
+        self.assertEqual(reindexar(tamano_lote=2), 3)
+        self.assertCountEqual(self.ids('"dolor de cabeza"'), [self.consultas[0].id, self.consultas[2].id])
+        respuesta = self.client.get(reverse('consultas_buscar'), {'q': 'amoxi*', 'campo': 'r'})
+        self.assertEqual([c.id for c in respuesta.context['consultas']], [self.consultas[2].id, self.consultas[0].id])
+        datos = self.client.get(reverse('autocompletar_consultas'), {'q': 'ibupro'}).json()
+        self.assertEqual([r['id'] for r in datos['resultados']], [self.consultas[1].id])
+
+    def test_admin_busca_por_paciente_y_por_texto(self):
+        modelo_admin = admin.site._registry[Consulta]
+        peticion = RequestFactory().get('/')
+
+        def buscar(texto):
+            resultados, _ = modelo_admin.get_search_results(peticion, Consulta.objects.all(), texto)
+            return sorted(resultados.values_list('id', flat=True))
+
+        self.assertEqual(buscar('Ana1'), [self.consultas[1].id])
+        self.assertEqual(buscar('Pérez2'), [self.consultas[2].id])
+        self.assertEqual(buscar('ibupro*'), [self.consultas[1].id])
+
+    def test_admin_sin_tope_de_resultados(self):
+        cita = self.consultas[0].cita
+        for i in range(LIMITE_CONSULTAS + 1):
+            otra = Cita.objects.create(
+                paciente_id=cita.paciente_id, medico_id=cita.medico_id,
+                fecha=cita.fecha + datetime.timedelta(days=i + 1), hora=cita.hora, motivo='Control',
+            )
+            Consulta.objects.create(cita=otra, motivo='Control', diagnostico='Control de rutina', receta='Nada', indicaciones='Reposo')
+        self.assertEqual(len(buscar_consultas('rutina')), LIMITE_CONSULTAS)
+        modelo_admin = admin.site._registry[Consulta]
+        resultados, _ = modelo_admin.get_search_results(RequestFactory().get('/'), Consulta.objects.all(), 'rutina')
+        self.assertEqual(resultados.count(), LIMITE_CONSULTAS + 1)
+        resultados, _ = modelo_admin.get_search_results(RequestFactory().get('/'), Consulta.objects.all(), 'control rutina')
+        self.assertEqual(resultados.count(), LIMITE_CONSULTAS + 1)
+
+
+@sin_replica
+class ApiTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3)
+        Factura.objects.create(consulta=Consulta.objects.first(), total=Decimal('40.50'), estado_pago='Pendiente')
+
+    def test_campos_inclusiones_y_paginacion(self):
+        url = reverse('api_lista', args=['citas'])
+        with presupuesto_consultas(1):
+            respuesta = self.client.get(url, {'campos': 'estado,fecha', 'incluir': 'paciente,medico', 'limite': 2})
+        datos = respuesta.json()
+        self.assertEqual(respuesta['Content-Type'], 'application/json')
+        self.assertEqual(len(datos['datos']), 2)
+        self.assertEqual(set(datos['datos'][0]), {'id', 'estado', 'fecha', 'paciente', 'medico'})
+        self.assertEqual(datos['datos'][0]['paciente']['nombre'], 'Ana0')
+        siguiente = self.client.get(datos['siguiente']).json()
+        self.assertEqual(len(siguiente['datos']), 1)
+        self.assertIsNone(siguiente['siguiente'])
+        with presupuesto_consultas(2):
+            consultas = self.client.get(reverse('api_lista', args=['consultas']), {'incluir': 'facturas'}).json()
+        self.assertEqual(consultas['datos'][0]['facturas'][0]['total'], '40.50')
+        self.assertEqual(self.client.get(url, {'campos': 'contrasena'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_lista', args=['usuarios'])).status_code, 404)
+
+    def test_etag_y_no_modificado(self):
+        paciente = Paciente.objects.order_by('id').first()
+        url = reverse('api_detalle', args=['pacientes', paciente.id])
+        respuesta = self.client.get(url, {'incluir': 'citas'})
+        self.assertEqual(respuesta.json()['documento_identidad'], 'DOC0')
+        etag = respuesta['ETag']
+        self.assertIn('Last-Modified', respuesta)
+        self.assertEqual(self.client.get(url, {'incluir': 'citas'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Un cambio en una relación incluida cambia la versión
+        cita = paciente.cita_set.first()
+        cita.estado = 'Confirmada'
+        cita.save()
+        respuesta = self.client.get(url, {'incluir': 'citas'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['citas'][0]['estado'], 'Confirmada')
+        self.assertEqual(self.client.get(reverse('api_detalle', args=['pacientes', 0])).status_code, 404)
+
+    def test_mismo_json_con_y_sin_orjson(self):
+        datos = {
+            'creado': datetime.datetime(2026, 3, 1, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'fecha': datetime.date(2026, 3, 1), 'hora': datetime.time(9, 30, 0, 500000),
+            'total': Decimal('40.50'), 'nombre': 'Núñez', 'ids': {1},
+        }
+        esperado = (
+            '{"creado":"2026-03-01T09:30:15.123Z","fecha":"2026-03-01","hora":"09:30:00.500",'
+            '"total":"40.50","nombre":"Núñez","ids":[1]}'
+        ).encode()
+        self.assertEqual(api.a_json(datos), esperado)
+        with mock.patch.object(api, 'orjson', None):
+            self.assertEqual(api.a_json(datos), esperado)
+
+
+class CitasLoteTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(2)
+        self.paciente = Paciente.objects.first()
+        self.medico, self.otro_medico = Medico.objects.order_by('id')[:2]
+        self.dia = self.dia_habil(timezone.localdate() + datetime.timedelta(days=1))
+        self.otro_dia = self.dia_habil(self.dia + datetime.timedelta(days=1))
+        for hora in (datetime.time(9, 0), datetime.time(9, 30), datetime.time(10, 0)):
+            self.reservar(self.medico, self.dia, hora)
+        self.reservar(self.otro_medico, self.otro_dia, datetime.time(9, 30))
+
+    def dia_habil(self, fecha):
+        while fecha.weekday() > 4:
+            fecha += datetime.timedelta(days=1)
+        return fecha
+
+    def reservar(self, medico, fecha, hora):
+        return reservar_cita(Cita(
+            paciente=self.paciente, medico=medico, hora=hora, motivo='Control',
+            fecha=timezone.make_aware(datetime.datetime.combine(fecha, hora)),
+        ))
+
+    def resumenes(self):
+        return sorted(ResumenDiario.objects.exclude(cantidad=0).values_list('fecha', 'metrica', 'clave', 'cantidad'))
+
+    def assertResumenesCoinciden(self):
+        incremental = self.resumenes()
+        reconstruir()
+        self.assertEqual(self.resumenes(), incremental)
+
+    def test_confirmar_y_cancelar_por_medico_y_fecha(self):
+        datos = {'medico': self.medico.id, 'fecha': self.dia.isoformat()}
+        respuesta = self.client.post(reverse('citas_lote'), {**datos, 'accion': 'confirmar'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(respuesta.json()['actualizadas'], 3)
+        self.assertEqual(Cita.objects.filter(estado='Confirmada').count(), 3)
+        libres = TurnoLibre.objects.filter(medico=self.medico, fecha=self.dia)
+        ocupados = libres.count()
+        respuesta = self.client.post(reverse('citas_lote'), {**datos, 'accion': 'cancelar'})
+        self.assertRedirects(respuesta, reverse('citas_lista'))
+        self.assertEqual(Cita.objects.filter(medico=self.medico, estado='Cancelada').count(), 3)
+        self.assertFalse(Turno.objects.filter(medico=self.medico).exists())
+        self.assertEqual(libres.count(), ocupados + 3)
+        self.assertResumenesCoinciden()
+        # Sin filtro ni citas marcadas no se toca nada
+        respuesta = self.client.post(reverse('citas_lote'), {'accion': 'cancelar'}, HTTP_ACCEPT='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_reprogramar_omite_conflictos(self):
+        citas = filtrar_citas(medico=self.medico, fecha=self.dia)
+        # Constante respecto del número de citas: depende de los médicos y días afectados
+        with self.assertNumQueries(27):
+            resultado = reprogramar_citas(citas, self.otro_dia, self.otro_medico)
+        self.assertEqual(resultado.actualizadas, 2)
+        self.assertEqual([motivo for _, motivo in resultado.omitidas], ['el turno de las 09:30 ya está ocupado'])
+        movidas = Cita.objects.filter(medico=self.otro_medico, fecha__date=self.otro_dia).order_by('hora')
+        self.assertEqual([cita.hora for cita in movidas], [datetime.time(9, 0), datetime.time(9, 30), datetime.time(10, 0)])
+        self.assertEqual(Turno.objects.filter(medico=self.otro_medico, fecha=self.otro_dia).count(), 3)
+        self.assertFalse(TurnoLibre.objects.filter(medico=self.otro_medico, fecha=self.otro_dia, hora=datetime.time(9, 0)).exists())
+        self.assertTrue(TurnoLibre.objects.filter(medico=self.medico, fecha=self.dia, hora=datetime.time(9, 0)).exists())
+        self.assertResumenesCoinciden()
+
+
+class ArchivoTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3)
+        self.medico = Medico.objects.order_by('id').first()
+        paciente = Paciente.objects.order_by('id').last()
+        for dia in range(4):
+            cita = Cita.objects.create(
+                paciente=paciente, medico=self.medico, hora=datetime.time(11, 0), motivo='Control',
+                fecha=timezone.now() - datetime.timedelta(days=dia + 1),
+            )
+            consulta = Consulta.objects.create(cita=cita, motivo='Control', diagnostico='Sano', receta='R', indicaciones='I')
+            Factura.objects.create(consulta=consulta, total=Decimal('20.00'), estado_pago='Pendiente')
+
+    def resumenes(self):
+        return sorted(ResumenDiario.objects.exclude(cantidad=0).values_list('fecha', 'metrica', 'clave', 'cantidad', 'monto'))
+
+    def test_la_vista_encola_y_el_proceso_archiva_por_lotes(self):
+        respuesta = self.client.post(reverse('medicos_eliminar', args=[self.medico.id]))
+        self.assertRedirects(respuesta, reverse('medicos_lista'))
+        self.assertTrue(Medico.objects.filter(id=self.medico.id).exists())
+        self.client.post(reverse('medicos_eliminar', args=[self.medico.id]))
+        tarea = TareaArchivo.objects.get()
+        self.assertEqual(tarea.estado, 'Pendiente')
+
+        procesar_tareas(tamano_lote=2)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'Terminada')
+        self.assertFalse(Medico.objects.filter(id=self.medico.id).exists())
+        self.assertEqual(Cita.objects.count(), 2)
+        self.assertEqual(Factura.objects.count(), 0)
+        archivados = dict(RegistroArchivado.objects.values_list('modelo').annotate(n=Count('id')))
+        self.assertEqual(archivados, {'pacientes.factura': 4, 'pacientes.consulta': 5, 'pacientes.cita': 5, 'pacientes.medico': 1})
+        self.assertEqual(RegistroArchivado.objects.get(modelo='pacientes.medico').datos['nombre'], 'Luis0')
+        incremental = self.resumenes()
+        reconstruir()
+        self.assertEqual(self.resumenes(), incremental)
+
+    def test_el_admin_encola_en_lugar_de_borrar(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@correo.com', 'clave'))
+        url = reverse('admin:pacientes_medico_delete', args=[self.medico.id])
+        self.assertContains(self.client.get(url), str(self.medico))
+        self.client.post(url, {'post': 'yes'})
+        pacientes = list(Paciente.objects.order_by('id')[:2])
+        self.client.post(reverse('admin:pacientes_paciente_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', admin.helpers.ACTION_CHECKBOX_NAME: [p.id for p in pacientes],
+        })
+        self.assertTrue(Medico.objects.filter(id=self.medico.id).exists())
+        self.assertEqual(Paciente.objects.filter(id__in=[p.id for p in pacientes]).count(), 2)
+        self.assertCountEqual(
+            TareaArchivo.objects.values_list('modelo', 'objeto_id'),
+            [('medico', self.medico.id)] + [('paciente', p.id) for p in pacientes],
+        )
+
+    def test_retoma_la_etapa_interrumpida(self):
+        paciente = Paciente.objects.order_by('id').last()
+        tarea = encolar('paciente', paciente)
+        # Simula un proceso que se detuvo tras el primer lote de consultas
+        for etapa in ETAPAS['paciente'][:2]:
+            _procesar_lote(tarea, etapa, 100)
+        _procesar_lote(tarea, ETAPAS['paciente'][2], 1)
+        self.assertEqual(tarea.etapa, 'consultas')
+        ejecutar(TareaArchivo.objects.get(id=tarea.id), tamano_lote=2)
+        self.assertFalse(Paciente.objects.filter(id=paciente.id).exists())
+        self.assertFalse(Consulta.objects.filter(cita__paciente_id=paciente.id).exists())
+        self.assertEqual(RegistroArchivado.objects.filter(modelo='pacientes.consulta').count(), 5)
+
+    def test_no_toma_las_tareas_de_otro_proceso(self):
+        paciente = Paciente.objects.order_by('id').first()
+        tarea = encolar('paciente', paciente)
+        # Otro proceso la tomó y sigue avanzando
+        TareaArchivo.objects.filter(id=tarea.id).update(estado='En curso', updated_at=timezone.now())
+        self.assertEqual(procesar_tareas(), [])
+        self.assertTrue(Paciente.objects.filter(id=paciente.id).exists())
+        # Dejó de avanzar: el proceso murió y la tarea se retoma
+        TareaArchivo.objects.filter(id=tarea.id).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual([terminada.id for terminada in procesar_tareas()], [tarea.id])
+        self.assertFalse(Paciente.objects.filter(id=paciente.id).exists())
+
+
+class ParticionesTests(CentroMedicoTestCase):
+    def test_definicion_por_anio_con_particion_actual(self):
+        sql = definicion('fecha', [2024, 2025])
+        self.assertIn("RANGE (TO_DAYS(", sql)
+        self.assertIn("PARTITION p2024 VALUES LESS THAN (TO_DAYS('2025-01-01'))", sql)
+        self.assertIn("PARTITION p2025 VALUES LESS THAN (TO_DAYS('2026-01-01'))", sql)
+        self.assertTrue(sql.endswith("PARTITION pactual VALUES LESS THAN MAXVALUE)"))
+
+    def test_anios_cerrados_desde_el_primer_dato(self):
+        ahora = datetime.datetime(2026, 3, 1, tzinfo=datetime.timezone.utc)
+        self.assertEqual(anios_cerrados(Cita, 'fecha', ahora), [])
+        crear_datos(1)
+        Cita.objects.update(fecha=datetime.datetime(2023, 6, 1, 12, tzinfo=datetime.timezone.utc))
+        self.assertEqual(anios_cerrados(Cita, 'fecha', ahora), [2023, 2024, 2025])
+        self.assertEqual(anios_cerrados(Cita, 'fecha', ahora, desde=2025), [2025])
+
+    def test_solo_mysql(self):
+        if connection.vendor == 'mysql':
+            self.skipTest("Prueba para los motores sin particiones")
+        with self.assertRaises(ParticionNoDisponible):
+            particionar(Cita, 'fecha')
+        with self.assertRaises(CommandError):
+            call_command('particionar_historial', 'citas', stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('particionar_historial', 'consultas', stdout=io.StringIO())
+        # Las relaciones con citas no tienen restricción en la base (igual que
+        # tras particionar); las demás sí
+        with connection.cursor() as cursor:
+            turnos = connection.introspection.get_constraints(cursor, Turno._meta.db_table)
+            facturas = connection.introspection.get_constraints(cursor, Factura._meta.db_table)
+        self.assertNotIn(('pacientes_cita', 'id'), [r['foreign_key'] for r in turnos.values()])
+        self.assertIn(('pacientes_consulta', 'id'), [r['foreign_key'] for r in facturas.values()])
+
+
+# La conversión real: DDL y LOCK TABLES confirman por su cuenta, así que no
+# puede correr dentro de la transacción de TestCase
+@skipUnless(connection.vendor == 'mysql', "El particionado solo está disponible en MySQL")
+class ParticionarMySQLTests(TransactionTestCase):
+    tabla = Cita._meta.db_table
+
+    def tearDown(self):
+        # Vuelve a la tabla sin particionar para el resto de las pruebas
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW TABLES LIKE %s", [self.tabla + SUFIJO_ANTERIOR])
+            if cursor.fetchone():
+                cursor.execute(f"DROP TABLE {self.tabla}")
+                cursor.execute(f"RENAME TABLE {self.tabla + SUFIJO_ANTERIOR} TO {self.tabla}")
+        super().tearDown()
+
+    def test_copia_borrados_durante_la_copia_e_intercambio(self):
+        crear_datos(4)
+        citas = list(Cita.objects.order_by('id'))
+        Cita.objects.filter(id=citas[1].id).update(fecha=datetime.datetime(2024, 6, 1, 12, tzinfo=datetime.timezone.utc))
+
+        # Escrituras mientras se copia: un borrado de una fila ya copiada y
+        # un cambio en una que todavía no
+        def progreso(total, ultimo_id):
+            if total == 2:
+                Cita.objects.filter(id=citas[0].id).delete()
+                Cita.objects.filter(id=citas[3].id).update(motivo='Cambiada', updated_at=timezone.now())
+
+        self.assertEqual(particionar(Cita, 'fecha', tamano_lote=2, progreso=progreso), 4)
+        self.assertIn('p2024', particiones(Cita))
+        self.assertEqual(list(Cita.objects.order_by('id').values_list('id', flat=True)), [c.id for c in citas[1:]])
+        self.assertEqual(Cita.objects.get(id=citas[3].id).motivo, 'Cambiada')
+        self.assertEqual(Cita.objects.filter(fecha__year=2024).count(), 1)
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW TABLES LIKE %s", [self.tabla + SUFIJO_BORRADAS])
+            self.assertIsNone(cursor.fetchone())
+            cursor.execute("SHOW TRIGGERS LIKE %s", [self.tabla])
+            self.assertFalse(cursor.fetchall())
+        with self.assertRaises(ParticionNoDisponible):
+            particionar(Cita, 'fecha')
+
+
+class DuplicadosTests(CentroMedicoTestCase):
+    def paciente(self, nombre, apellido, documento, telefono, nacimiento):
+        return Paciente.objects.create(
+            nombre=nombre, apellido=apellido, documento_identidad=documento, direccion='Calle 1',
+            telefono=telefono, correo='x@correo.com', fecha_nacimiento=nacimiento,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.original = self.paciente('José', 'Vásquez', '12.345.678', '+54 11 4555-1234', datetime.date(1980, 5, 1))
+        self.copia = self.paciente('Jose', 'Basques', '12345678', '11 4555 1234', datetime.date(1980, 5, 1))
+        self.paciente('Ana', 'Vásquez', '99887766', '0991234567', datetime.date(1980, 5, 1))
+        self.paciente('Rosa', 'Mora', '55443322', '0981111111', datetime.date(1975, 2, 3))
+
+    def test_claves_normalizan_apellido_telefono_y_documento(self):
+        self.assertEqual(fonetica('Vásquez'), fonetica('Basques'))
+        self.assertEqual(fonetica('Llepez'), fonetica('Yepes'))
+        self.assertEqual(
+            claves('jose', 'vasquez', '12.345.678', '+54 11 4555-1234', datetime.date(1980, 5, 1)),
+            ['a:baskes:j', 'f:1980-05-01', 't:45551234', 'd:12345678'],
+        )
+
+    def test_detecta_el_par_una_sola_vez(self):
+        self.assertEqual(detectar(), 1)
+        par = ParDuplicado.objects.get()
+        self.assertEqual((par.paciente_a_id, par.paciente_b_id), (self.original.id, self.copia.id))
+        self.assertIn('documento', par.motivos)
+        self.assertIn('fecha', par.motivos)
+        self.assertEqual(detectar(), 0)
+        # Un par descartado no se vuelve a proponer
+        descartar(ParDuplicado.objects.all())
+        ParDuplicado.objects.filter(estado='Pendiente').delete()
+        self.assertEqual(detectar(), 0)
+        self.assertEqual(ParDuplicado.objects.get().estado, 'Descartado')
+
+    def test_detecta_por_tandas_de_bloques(self):
+        # Con lotes de 2 pacientes cada bloque se lee en su propia tanda y el
+        # par, que comparte cuatro bloques, se cuenta una vez
+        self.assertEqual(detectar(tamano_lote=2), 1)
+        self.assertEqual(detectar(tamano_lote=2), 0)
+
+    def test_fusionar_reasigna_las_citas_en_un_update(self):
+        especialidad = Especialidad.objects.create(nombre='Clínica')
+        medico = Medico.objects.create(
+            nombre='Luis', apellido='Mora', especialidad=especialidad, telefono='0991234567',
+            correo='luis@correo.com', disponibilidad='Lunes a Viernes, 9:00 AM - 5:00 PM',
+        )
+        for hora in (9, 10, 11):
+            Cita.objects.create(paciente=self.copia, medico=medico, hora=datetime.time(hora, 0), motivo='Control')
+        detectar()
+        copia_id = self.copia.id
+        movidas = fusionar(self.original, self.copia)
+        self.assertEqual(movidas, 3)
+        self.assertEqual(Cita.objects.filter(paciente=self.original).count(), 3)
+        self.assertFalse(Paciente.objects.filter(id=copia_id).exists())
+        self.assertFalse(ParDuplicado.objects.exists())
+        registro = RegistroArchivado.objects.get(modelo='pacientes.paciente', objeto_id=copia_id)
+        self.assertEqual(registro.datos['fusionado_en'], self.original.id)
+
+
+@sin_replica
+class ContadoresTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(2)
+        self.paciente = Paciente.objects.order_by('id').first()
+        self.cita = Cita.objects.get(paciente=self.paciente)
+
+    def contadores(self):
+        return Paciente.objects.values_list('citas_total', 'saldo_pendiente', 'ultima_visita').get(id=self.paciente.id)
+
+    def test_se_mantienen_con_cada_escritura(self):
+        self.assertEqual(self.contadores(), (1, Decimal('0'), self.cita.fecha))
+        consulta = Consulta.objects.get(cita=self.cita)
+        factura = Factura.objects.create(consulta=consulta, total=Decimal('40.00'), estado_pago='Pendiente')
+        self.assertEqual(self.contadores()[1], Decimal('40.00'))
+        factura.estado_pago = 'Pagado'
+        factura.save()
+        self.assertEqual(self.contadores()[1], Decimal('0'))
+        consulta.delete()
+        self.assertIsNone(self.contadores()[2])
+        self.cita.delete()
+        self.assertEqual(self.contadores(), (0, Decimal('0'), None))
+        self.assertEqual(reconciliar(), 0)
+
+    def test_facturacion_en_lote_y_reconciliacion(self):
+        Tarifa.objects.create(especialidad=Especialidad.objects.get(), precio=Decimal('25.00'))
+        facturar()
+        self.assertEqual(self.contadores()[1], Decimal('25.00'))
+        self.assertEqual(reconciliar(), 0)
+        Paciente.objects.filter(id=self.paciente.id).update(citas_total=7, saldo_pendiente=0)
+        self.assertEqual(reconciliar(tamano_lote=1), 1)
+        self.assertEqual(self.contadores()[:2], (1, Decimal('25.00')))
+
+    def test_carga_del_dia_de_los_medicos(self):
+        hoy = fecha_del_turno(self.cita.fecha)
+        otra = Cita.objects.exclude(id=self.cita.id).get()
+        self.assertEqual(carga_del_dia(hoy), {self.cita.medico_id: 1, otra.medico_id: 1})
+        cancelar_citas(Cita.objects.filter(id=self.cita.id))
+        self.assertNotIn(self.cita.medico_id, carga_del_dia(hoy))
+        respuesta = self.client.get(reverse('medicos_lista'))
+        self.assertContains(respuesta, 'Citas hoy')
+        respuesta = self.client.get(reverse('pacientes_lista'), {'orden': 'saldo', 'con_saldo': 1})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+# Broker de prueba: registra lo publicado como si hubiera un tablero abierto
+class BrokerRegistro:
+    def __init__(self):
+        self.eventos = []
+
+    def activo(self):
+        return True
+
+    def ultimo_id(self):
+        return len(self.eventos)
+
+    def publicar(self, evento):
+        self.eventos.append(evento)
+
+
+class TableroTests(CentroMedicoTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(2)
+        self.cita = Cita.objects.order_by('id').first()
+        self.dia = fecha_del_turno(self.cita.fecha)
+        self.broker = BrokerRegistro()
+        patcher = mock.patch.object(tablero, '_broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def evento(self, id, medico_id=1, fecha='2026-10-19', **extra):
+        return {'tipo': tablero.ACTUALIZADA, 'cita': id, 'medico_id': medico_id, 'fecha': fecha, **extra}
+
+    def test_filtro_por_medico_y_dia(self):
+        filtro = Filtro(1, datetime.date(2026, 10, 19))
+        self.assertTrue(filtro.coincide(self.evento(1)))
+        self.assertFalse(filtro.coincide(self.evento(1, medico_id=2)))
+        self.assertFalse(filtro.coincide(self.evento(1, fecha='2026-10-20')))
+        # Una cita que se fue del día también le interesa a quien lo mira
+        movida = self.evento(1, fecha='2026-10-20', anterior={'medico_id': 1, 'fecha': '2026-10-19'})
+        self.assertTrue(filtro.coincide(movida))
+        self.assertTrue(Filtro().coincide(self.evento(1, medico_id=2)))
+
+    def test_broker_reenvia_lo_perdido_al_reconectar(self):
+        async def escenario():
+            broker = BrokerMemoria()
+            filtro = Filtro(1)
+            suscripcion = broker.suscribir(filtro)
+            broker.publicar(self.evento(1))
+            broker.publicar(self.evento(2, medico_id=2))
+            broker.publicar(self.evento(3))
+            recibidos = [(await suscripcion.cola.get())['cita'] for _ in range(2)]
+            broker.cancelar(suscripcion)
+            # Reconexión desde el primer evento: solo falta el 3
+            repetidos = broker.suscribir(filtro, desde_id=1)
+            recibidos.append((await repetidos.cola.get())['cita'])
+            # Un id que el broker no conoce obliga a recargar
+            perdido = broker.suscribir(filtro, desde_id=99)
+            return recibidos, await perdido.cola.get()
+
+        recibidos, recargar = asyncio.run(escenario())
+        self.assertEqual(recibidos, [1, 3, 3])
+        self.assertIsNone(recargar)
+
+    def test_flujo_sse(self):
+        async def escenario():
+            broker = BrokerMemoria()
+            with mock.patch.object(tablero, '_broker', broker):
+                sse = flujo(Filtro(1))
+                partes = [await sse.__anext__()]
+                broker.publicar(self.evento(7))
+                partes.append(await sse.__anext__())
+                await sse.aclose()
+            return partes, broker.activo()
+
+        (reintento, mensaje), activo = asyncio.run(escenario())
+        self.assertTrue(reintento.startswith('retry:'))
+        self.assertTrue(mensaje.startswith('id: 1\nevent: cita\ndata: '))
+        self.assertEqual(json.loads(mensaje.split('data: ', 1)[1])['cita'], 7)
+        self.assertFalse(activo)
+
+    def test_cambios_se_publican_al_confirmar(self):
+        cita_id = self.cita.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.estado = 'Confirmada'
+            self.cita.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            cancelar_citas(Cita.objects.filter(id=self.cita.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cita.delete()
+        self.assertEqual(
+            [(evento['tipo'], evento['cita']) for evento in self.broker.eventos],
+            [('confirmada', cita_id), ('cancelada', cita_id), ('eliminada', cita_id)],
+        )
+        self.assertEqual(self.broker.eventos[0]['fecha'], self.dia.isoformat())
+        self.assertEqual(self.broker.eventos[0]['paciente'], 'Ana0 Pérez0')
+
+    def test_vistas(self):
+        respuesta = self.client.get(reverse('citas_tablero'), {'fecha': self.dia.isoformat()})
+        self.assertContains(respuesta, 'Ana0 Pérez0')
+        # El médico se elige con autocompletado, sin cargar la lista completa
+        self.assertContains(respuesta, reverse('autocompletar_medicos'))
+        self.assertNotContains(respuesta, '<option')
+        respuesta = self.client.get(reverse('citas_tablero'), {'medico': self.cita.medico_id, 'fecha': self.dia.isoformat()})
+        self.assertEqual(respuesta.context['medico_id'], self.cita.medico_id)
+        self.assertContains(respuesta, 'data-cita="%s"' % self.cita.id)
+        # Lo publicado mientras se leen las citas queda después de `desde`
+        leer_citas = tablero.citas_del_dia
+
+        def con_cambio(*args):
+            self.broker.publicar(self.evento(self.cita.id))
+            return leer_citas(*args)
+
+        with mock.patch.object(tablero, 'citas_del_dia', con_cambio):
+            respuesta = self.client.get(reverse('citas_tablero'))
+        self.assertEqual(respuesta.context['desde'], 0)
+        # El flujo solo se sirve con ASGI
+        self.assertEqual(self.client.get(reverse('citas_eventos')).status_code, 501)
+
+    async def test_vista_eventos(self):
+        cliente = AsyncClient()
+        respuesta = await cliente.get(reverse('citas_eventos'), {'medico': self.cita.medico_id}, headers={'Last-Event-ID': '3'})
+        self.assertTrue(respuesta.streaming)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        respuesta.close()
+        respuesta = await cliente.get(reverse('citas_eventos'), {'fecha': 'ayer'})
+        self.assertEqual(respuesta.status_code, 400)
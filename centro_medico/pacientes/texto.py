@@ -0,0 +1,64 @@
+import re
+import unicodedata
+
+# Utilidades de normalización de texto compartidas por las búsquedas.
+
+
+# "  José  PÉREZ " -> "jose perez"
+def normalizar(valor):
+    if not valor:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(valor))
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.casefold().split())
+
+
+def tokens(valor):
+    return [t for t in re.split(r'[^\w]+', normalizar(valor)) if t]
+
+
+def trigramas(valor):
+    texto = f'  {normalizar(valor)} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Similitud de Jaccard entre los trigramas de dos textos (0.0 a 1.0)
+def similitud(a, b):
+    ta, tb = trigramas(a), trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+# Clave fonética para el español: agrupa las grafías que suenan igual
+# ("Vásquez", "Basques" -> "baskes"; "Yepes", "Llepez" -> "yepes")
+REGLAS_FONETICAS = [
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'ch'), 'x'),
+    # Mayúsculas como marcas provisionales para que las reglas siguientes no las toquen
+    (re.compile(r'qu([ei])'), r'K\1'),
+    (re.compile(r'gu([ei])'), r'G\1'),
+    (re.compile(r'c([ei])'), r's\1'),
+    (re.compile(r'g([ei])'), r'j\1'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'[cqk]'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'[vw]'), 'b'),
+]
+REPETIDAS = re.compile(r'(.)\1+')
+
+
+def fonetica(valor):
+    codigos = []
+    for palabra in tokens(valor):
+        codigo = re.sub(r'[^a-z]', '', palabra)
+        for patron, reemplazo in REGLAS_FONETICAS:
+            codigo = patron.sub(reemplazo, codigo)
+        codigos.append(REPETIDAS.sub(r'\1', codigo.lower()))
+    return ' '.join(codigo for codigo in codigos if codigo)
+
+
+# "+54 (11) 4555-1234" -> "541145551234"
+def digitos(valor):
+    return re.sub(r'\D', '', valor or '')
@@ -1,15 +1,56 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages 
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+import io
+import secrets
+from pathlib import Path
 from .models import Paciente, Medico, Cita, Consulta, Usuario
-from .forms import PacienteForm, MedicoForm, CitaForm, ConsultaForm, UsuarioForm
+from .forms import (
+    PacienteForm, MedicoForm, CitaForm, ConsultaForm, UsuarioForm, BusquedaConsultasForm, CitasLoteForm, TableroForm,
+)
+from .paginacion import paginar, ORDEN_CITAS, ORDEN_HISTORIAL, ORDEN_POR_DEFECTO
+from .busqueda import (
+    buscar_pacientes, autocompletar_pacientes, autocompletar_medicos, autocompletar_citas, LIMITE_AUTOCOMPLETAR,
+)
+from .agenda import proximos_turnos_libres
+from .resumenes import indicadores, carga_del_dia
+from .importacion import es_utf8, importar_pacientes, leer_filas, exportar_pacientes_csv, COLUMNAS
+from .reservas import reservar_cita, reprogramar_cita, cancelar_cita, ConflictoDeTurno
+from .citas_lote import filtrar_citas, ejecutar
+from .instrumentacion import registro
+from .cartera import AGRUPACIONES, filas_cartera, encabezados, totales, exportar_csv
+from .xlsx import generar_xlsx
+from .indice_consultas import buscar_consultas
+from .archivo import encolar
+from . import api, tablero
 
 def dashboard(request):
-    return render(request, 'dashboard.html')
+    return render(request, 'dashboard.html', indicadores())
 
 # Vistas para Pacientes
+# Orden del listado por los contadores desnormalizados (columnas con índice)
+ORDENES_PACIENTES = {
+    'saldo': ('-saldo_pendiente', '-id'),
+    'citas': ('-citas_total', '-id'),
+}
+
 def pacientes_lista(request):
-    pacientes = Paciente.objects.all()
-    return render(request, 'pacientes/lista.html', {'pacientes': pacientes})
+    orden = request.GET.get('orden')
+    queryset = Paciente.objects.para_lista()
+    if request.GET.get('con_saldo'):
+        queryset = queryset.filter(saldo_pendiente__gt=0)
+    pacientes = paginar(request, queryset, ORDENES_PACIENTES.get(orden, ORDEN_POR_DEFECTO))
+    return render(request, 'pacientes/lista.html', {
+        'pacientes': pacientes, 'orden': orden if orden in ORDENES_PACIENTES else '',
+        'con_saldo': bool(request.GET.get('con_saldo')),
+    })
 
 def pacientes_nuevo(request):
     if request.method == 'POST':
@@ -37,19 +78,122 @@ def pacientes_editar(request, id):
 def pacientes_eliminar(request, id):
     paciente = get_object_or_404(Paciente, id=id)
     if request.method == 'POST':
-        paciente.delete()
-        messages.success(request, "Paciente eliminado exitosamente.")
+        # Se elimina en segundo plano junto con sus citas, consultas y facturas
+        encolar('paciente', paciente)
+        messages.success(request, "El paciente y su historial se eliminarán en segundo plano.")
         return redirect('pacientes_lista')
     return render(request, 'pacientes/eliminar.html', {'paciente': paciente})
 
 def pacientes_buscar(request):
     query = request.GET.get('q', '')
-    pacientes = Paciente.objects.filter(nombre__icontains=query)
+    pacientes = buscar_pacientes(query)
     return render(request, 'pacientes/buscar.html', {'pacientes': pacientes, 'query': query})
 
+# Historial clínico: citas del paciente (más recientes primero) con sus
+# consultas y facturas. Cada consulta se pinta en un fragmento en caché cuya
+# clave cambia si se modifica la consulta o alguna de sus facturas.
+HISTORIAL_TAMANO = 20
+
+def pacientes_historial(request, id):
+    paciente = get_object_or_404(
+        Paciente.objects.only(
+            'id', 'nombre', 'apellido', 'documento_identidad', 'fecha_nacimiento', 'telefono', 'correo',
+            'citas_total', 'saldo_pendiente', 'ultima_visita',
+        ),
+        id=id,
+    )
+    citas = paginar(request, Cita.objects.filter(paciente=paciente).para_historial(), ORDEN_HISTORIAL, HISTORIAL_TAMANO)
+    for cita in citas:
+        for consulta in cita.consultas:
+            ultima = max([consulta.updated_at] + [factura.updated_at for factura in consulta.facturas])
+            consulta.version = f"{ultima.timestamp()}-{len(consulta.facturas)}"
+    return render(request, 'pacientes/historial.html', {'paciente': paciente, 'citas': citas})
+
+# Importación masiva de pacientes (CSV o JSONL). Las filas rechazadas llevan
+# datos personales: se guardan fuera de MEDIA_ROOT con un nombre aleatorio y
+# solo las descarga la sesión que hizo la importación
+RECHAZOS_DIR = getattr(settings, 'IMPORTACION_RECHAZOS_DIR', settings.BASE_DIR / 'importaciones')
+SESION_RECHAZOS = 'importacion_rechazos'
+
+def pacientes_importar(request):
+    contexto = {'columnas': COLUMNAS}
+    if request.method == 'POST' and 'archivo' in request.FILES:
+        subido = request.FILES['archivo']
+        if not es_utf8(subido):
+            messages.error(request, "El archivo debe estar en UTF-8. En Excel, guárdelo como \"CSV UTF-8\".")
+            return render(request, 'pacientes/importar.html', contexto, status=400)
+        formato = 'jsonl' if subido.name.endswith(('.jsonl', '.json')) else 'csv'
+        archivo = io.TextIOWrapper(subido.file, encoding='utf-8-sig', newline='')
+        carpeta = Path(RECHAZOS_DIR)
+        carpeta.mkdir(parents=True, exist_ok=True)
+        nombre = f"rechazos_{secrets.token_urlsafe(16)}.csv"
+        with open(carpeta / nombre, 'w', newline='', encoding='utf-8') as rechazos:
+            resumen = importar_pacientes(leer_filas(archivo, formato), rechazos=rechazos)
+        # Los rechazos de la importación anterior de esta sesión ya no se ofrecen
+        anterior = request.session.pop(SESION_RECHAZOS, None)
+        if anterior:
+            (carpeta / anterior).unlink(missing_ok=True)
+        if resumen.rechazados:
+            messages.warning(request, str(resumen))
+            request.session[SESION_RECHAZOS] = nombre
+            contexto['rechazos_url'] = reverse('pacientes_importar_rechazos')
+        else:
+            (carpeta / nombre).unlink()
+            messages.success(request, str(resumen))
+            return redirect('pacientes_lista')
+    return render(request, 'pacientes/importar.html', contexto)
+
+def pacientes_importar_rechazos(request):
+    nombre = request.session.get(SESION_RECHAZOS)
+    ruta = Path(RECHAZOS_DIR) / nombre if nombre else None
+    if ruta is None or not ruta.is_file():
+        raise Http404("No hay filas rechazadas para descargar.")
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename='rechazos.csv', content_type='text/csv; charset=utf-8')
+
+def pacientes_exportar(request):
+    respuesta = StreamingHttpResponse(exportar_pacientes_csv(), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = 'attachment; filename="pacientes.csv"'
+    return respuesta
+
+# Antigüedad de la cartera (facturas pendientes por tramos de vencimiento)
+def cartera_informe(request):
+    agrupacion = request.GET.get('agrupacion', 'especialidad')
+    if agrupacion not in AGRUPACIONES:
+        return HttpResponse("Agrupación inválida.", status=400)
+    filas = list(filas_cartera(agrupacion))
+    return render(request, 'cartera/informe.html', {
+        'encabezados': encabezados(agrupacion),
+        'filas': filas,
+        'totales': totales(filas),
+        'agrupacion': agrupacion,
+        'agrupaciones': list(AGRUPACIONES),
+        # Columnas descriptivas que ocupa la etiqueta "Total" (sin el id)
+        'columnas_etiqueta': len(AGRUPACIONES[agrupacion]['encabezados']) - 1,
+    })
+
+def cartera_exportar(request):
+    agrupacion = request.GET.get('agrupacion', 'paciente')
+    formato = request.GET.get('formato', 'csv')
+    if agrupacion not in AGRUPACIONES or formato not in ('csv', 'xlsx'):
+        return JsonResponse({'error': "Parámetros 'agrupacion' o 'formato' inválidos."}, status=400)
+    nombre = f"cartera_{agrupacion}_{timezone.localdate().isoformat()}"
+    if formato == 'xlsx':
+        respuesta = StreamingHttpResponse(
+            generar_xlsx(encabezados(agrupacion), filas_cartera(agrupacion), hoja='Cartera'),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        respuesta = StreamingHttpResponse(exportar_csv(agrupacion), content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return respuesta
+
 # Vistas para Médicos
 def medicos_lista(request):
-    medicos = Medico.objects.all()
+    medicos = paginar(request, Medico.objects.para_lista())
+    # Carga del día desde ResumenDiario: una lectura para toda la página
+    carga = carga_del_dia()
+    for medico in medicos:
+        medico.citas_hoy = carga.get(medico.id, 0)
     return render(request, 'medicos/lista.html', {'medicos': medicos})
 
 def medicos_nuevo(request):
@@ -78,80 +222,143 @@ def medicos_editar(request, id):
 def medicos_eliminar(request, id):
     medico = get_object_or_404(Medico, id=id)
     if request.method == 'POST':
-        medico.delete()
-        messages.success(request, "Médico eliminado exitosamente.")
+        encolar('medico', medico)
+        messages.success(request, "El médico y sus citas se eliminarán en segundo plano.")
         return redirect('medicos_lista')
     return render(request, 'medicos/eliminar.html', {'medico': medico})
 
 # Vistas para Citas Médicas
 # Listar Citas
 def citas_lista(request):
-    citas = Cita.objects.all()
+    citas = paginar(request, Cita.objects.para_lista(), orden=ORDEN_CITAS)
     return render(request, 'citas/lista.html', {'citas': citas})
 
 # Crear Nueva Cita
 def citas_nueva(request):
-    pacientes = Paciente.objects.all()
-    medicos = Medico.objects.all()
-
     if request.method == 'POST':
-        paciente_id = request.POST['paciente']
-        medico_id = request.POST['medico']
-        fecha = request.POST['fecha']
-        hora = request.POST['hora']
-        estado = request.POST['estado']
-        motivo = request.POST['motivo']
-
-        cita = Cita(
-            paciente_id=paciente_id,
-            medico_id=medico_id,
-            fecha=fecha,
-            hora=hora,
-            estado=estado,
-            motivo=motivo
-        )
-        cita.save()
-        messages.success(request, "Cita creada correctamente.")
-        return redirect('citas_lista')
+        form = CitaForm(request.POST)
+        if form.is_valid():
+            try:
+                reservar_cita(form.save(commit=False))
+            except ConflictoDeTurno as conflicto:
+                form.add_error(None, str(conflicto))
+            else:
+                messages.success(request, "Cita creada correctamente.")
+                return redirect('citas_lista')
+    else:
+        form = CitaForm()
 
-    return render(request, 'citas/nueva.html', {'pacientes': pacientes, 'medicos': medicos})
+    return render(request, 'citas/nueva.html', {'form': form})
 
 # Editar Cita
-def citas_editar(request, cita_id):
-    cita = get_object_or_404(Cita, id=cita_id)
-    pacientes = Paciente.objects.all()
-    medicos = Medico.objects.all()
+def citas_editar(request, id):
+    cita = get_object_or_404(Cita, id=id)
 
     if request.method == 'POST':
-        cita.paciente_id = request.POST['paciente']
-        cita.medico_id = request.POST['medico']
-        cita.fecha = request.POST['fecha']
-        cita.hora = request.POST['hora']
-        cita.estado = request.POST['estado']
-        cita.motivo = request.POST['motivo']
-        cita.save()
-        messages.success(request, "Cita actualizada correctamente.")
-        return redirect('citas_lista')
+        form = CitaForm(request.POST, instance=cita)
+        if form.is_valid():
+            try:
+                reprogramar_cita(form.save(commit=False))
+            except ConflictoDeTurno as conflicto:
+                form.add_error(None, str(conflicto))
+            else:
+                messages.success(request, "Cita actualizada correctamente.")
+                return redirect('citas_lista')
+    else:
+        form = CitaForm(instance=cita)
 
-    return render(request, 'citas/editar.html', {
-        'cita': cita,
-        'pacientes': pacientes,
-        'medicos': medicos
-    })
+    return render(request, 'citas/editar.html', {'form': form, 'cita': cita})
 
 # cancelar Cita
 def citas_cancelar(request, cita_id):
     cita = get_object_or_404(Cita, id=cita_id)
     if request.method == 'POST':
-        cita.estado = 'Cancelada'
-        cita.save()
+        cancelar_cita(cita)
         messages.success(request, "La cita fue cancelada correctamente.")
         return redirect('citas_lista')
     return render(request, 'citas/cancelar.html', {'cita': cita})
 
+# Confirmar, cancelar o reprogramar en lote las citas marcadas o filtradas
+# (p. ej. todas las de un médico en un día). Responde JSON si se pide.
+def citas_lote(request):
+    form = CitasLoteForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        datos = form.cleaned_data
+        citas = filtrar_citas(datos['ids'], datos['medico'], datos['fecha'])
+        try:
+            resultado = ejecutar(datos['accion'], citas, datos['nueva_fecha'], datos['nuevo_medico'])
+        except ConflictoDeTurno as conflicto:
+            form.add_error(None, str(conflicto))
+        else:
+            if request.accepts('application/json') and not request.accepts('text/html'):
+                return JsonResponse(resultado.como_dict())
+            messages.success(request, str(resultado))
+            return redirect('citas_lista')
+    if request.method == 'POST' and request.accepts('application/json') and not request.accepts('text/html'):
+        return JsonResponse({'errores': form.errors.get_json_data()}, status=400)
+    return render(request, 'citas/lote.html', {'form': form})
+
+# Tablero en vivo de la sala de espera: las citas del día (y médico) y un
+# EventSource que aplica los cambios sin recargar la página
+def citas_tablero(request):
+    form = TableroForm(request.GET or None)
+    valido = form.is_valid()
+    fecha = (valido and form.cleaned_data['fecha']) or timezone.localdate()
+    medico_id = form.medico_id() if valido else None
+    # Antes de leer las citas: lo publicado mientras tanto se reenvía al conectar
+    desde = tablero.broker().ultimo_id()
+    return render(request, 'citas/tablero.html', {
+        'form': form,
+        'fecha': fecha,
+        'medico_id': medico_id,
+        'citas': tablero.citas_del_dia(fecha, medico_id),
+        'desde': desde,
+    })
+
+# Flujo de cambios de las citas (Server-Sent Events). Requiere un servidor
+# ASGI: con WSGI cada conexión abierta ocupa un hilo
+async def citas_eventos(request):
+    # Con WSGI (o runserver sin daphne) la conexión abierta ocuparía un hilo
+    # y el flujo asíncrono se consumiría entero antes de responder
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': "El tablero en vivo requiere un servidor ASGI."}, status=501)
+    form = TableroForm(request.GET)
+    # Validar el médico consulta la base
+    if not await sync_to_async(form.is_valid)():
+        return JsonResponse({'errores': form.errors.get_json_data()}, status=400)
+    desde = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+    try:
+        desde = int(desde) if desde else None
+    except ValueError:
+        desde = None
+    filtro = tablero.Filtro(form.medico_id(), form.cleaned_data['fecha'])
+    response = StreamingHttpResponse(tablero.flujo(filtro, desde), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sin búfer en nginx: cada evento sale apenas se publica
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Próximos turnos libres de una especialidad (JSON)
+def agenda_proximos_turnos(request):
+    try:
+        especialidad_id = int(request.GET['especialidad'])
+        cantidad = min(int(request.GET.get('n', 10)), 100)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Parámetros 'especialidad' y 'n' deben ser enteros."}, status=400)
+    turnos = proximos_turnos_libres(especialidad_id, cantidad)
+    return JsonResponse({'turnos': [
+        {
+            'medico_id': turno.medico_id,
+            'medico': f"Dr. {turno.medico.nombre} {turno.medico.apellido}",
+            'fecha': turno.fecha.isoformat(),
+            'hora': turno.hora.strftime('%H:%M'),
+        }
+        for turno in turnos
+    ]})
+
 # Vistas para Consultas Médicas
 def consultas_lista(request):
-    consultas = Consulta.objects.all()
+    consultas = paginar(request, Consulta.objects.para_lista())
     return render(request, 'consultas/lista.html', {'consultas': consultas})
 
 def consultas_nueva(request):
@@ -163,9 +370,7 @@ def consultas_nueva(request):
             return redirect('consultas_lista')
     else:
         form = ConsultaForm()
-    
-    citas = Cita.objects.all()
-    return render(request, 'consultas/nueva.html', {'form': form, 'citas': citas})
+    return render(request, 'consultas/nueva.html', {'form': form})
 
 def consultas_editar(request, id):
     consulta = get_object_or_404(Consulta, id=id)
@@ -177,9 +382,7 @@ def consultas_editar(request, id):
             return redirect('consultas_lista')
     else:
         form = ConsultaForm(instance=consulta)
-    
-    citas = Cita.objects.all()
-    return render(request, 'consultas/editar.html', {'form': form, 'consulta': consulta, 'citas': citas})
+    return render(request, 'consultas/editar.html', {'form': form, 'consulta': consulta})
 
 def consultas_eliminar(request, id):
     consulta = get_object_or_404(Consulta, id=id)
@@ -189,10 +392,21 @@ def consultas_eliminar(request, id):
         return redirect('consultas_lista')
     return render(request, 'consultas/eliminar_confirmar.html', {'consulta': consulta})
 
+# Búsqueda en diagnósticos, recetas e indicaciones (índice invertido)
+def consultas_buscar(request):
+    form = BusquedaConsultasForm(request.GET or None)
+    consultas = []
+    if form.is_valid():
+        datos = form.cleaned_data
+        consultas = buscar_consultas(
+            datos['q'], datos['desde'], datos['hasta'], [datos['campo']] if datos['campo'] else None,
+        )
+    return render(request, 'consultas/buscar.html', {'form': form, 'consultas': consultas})
+
 
 # Vistas para Usuarios
 def usuarios_lista(request):
-    usuarios = Usuario.objects.all()
+    usuarios = paginar(request, Usuario.objects.para_lista())
     return render(request, 'usuarios/lista.html', {'usuarios': usuarios})
 
 def usuarios_nuevo(request):
@@ -226,3 +440,95 @@ def usuarios_eliminar(request, id):
         return redirect('usuarios_lista')
     return render(request, 'usuarios/eliminar.html', {'usuario': usuario})
 
+
+# Autocompletado (vistas asíncronas; JSON con los primeros N resultados)
+def _limite(request):
+    try:
+        return max(1, min(int(request.GET.get('n', LIMITE_AUTOCOMPLETAR)), 50))
+    except ValueError:
+        return LIMITE_AUTOCOMPLETAR
+
+async def autocompletar_pacientes_json(request):
+    queryset = autocompletar_pacientes(request.GET.get('q', ''))[:_limite(request)]
+    resultados = [
+        {'id': p.id, 'etiqueta': f"{p.nombre} {p.apellido} ({p.documento_identidad})"}
+        async for p in queryset
+    ]
+    return JsonResponse({'resultados': resultados})
+
+async def autocompletar_medicos_json(request):
+    especialidad = request.GET.get('especialidad', '')
+    queryset = autocompletar_medicos(
+        request.GET.get('q', ''), int(especialidad) if especialidad.isdigit() else None,
+    )[:_limite(request)]
+    resultados = [{'id': m.id, 'etiqueta': str(m)} async for m in queryset]
+    return JsonResponse({'resultados': resultados})
+
+async def autocompletar_citas_json(request):
+    queryset = autocompletar_citas(request.GET.get('q', ''))[:_limite(request)]
+    resultados = [{'id': c.id, 'etiqueta': str(c)} async for c in queryset]
+    return JsonResponse({'resultados': resultados})
+
+# Mientras se escribe, la última palabra se busca como prefijo
+async def autocompletar_consultas_json(request):
+    texto = request.GET.get('q', '')
+    if texto and not texto[-1].isspace() and texto.count('"') % 2 == 0 and not texto.endswith('*'):
+        texto += '*'
+    consultas = await sync_to_async(buscar_consultas)(texto, limite=_limite(request))
+    resultados = [
+        {
+            'id': c.id,
+            'etiqueta': f"{c.cita.paciente.nombre} {c.cita.paciente.apellido} - {c.diagnostico[:80]}",
+            'url': reverse('consultas_editar', args=[c.id]),
+        }
+        for c in consultas
+    ]
+    return JsonResponse({'resultados': resultados})
+
+# API JSON de solo lectura (ver pacientes/api.py)
+def _api_error(mensaje, status):
+    return JsonResponse({'error': mensaje}, status=status)
+
+def _api_respuesta(request, etag, ultima, contenido):
+    segundos = int(ultima.timestamp()) if ultima else None
+    # 304 si el cliente ya tiene esta versión: no se serializa nada
+    respuesta = get_conditional_response(request, etag=etag, last_modified=segundos)
+    if respuesta is None:
+        respuesta = HttpResponse(contenido(), content_type='application/json')
+    respuesta.headers['ETag'] = etag
+    if segundos is not None:
+        respuesta.headers['Last-Modified'] = http_date(segundos)
+    return respuesta
+
+def api_lista(request, recurso):
+    if recurso not in api.RECURSOS:
+        return _api_error(f"Recurso desconocido: {recurso}.", 404)
+    definicion = api.RECURSOS[recurso]
+    try:
+        campos, incluir = api.interpretar(definicion, request.GET)
+        pagina = api.pagina(request, definicion, campos, incluir)
+    except api.ParametroInvalido as exc:
+        return _api_error(str(exc), 400)
+    etag, ultima = api.version(pagina, definicion, campos, incluir)
+    return _api_respuesta(request, etag, ultima, lambda: api.a_json({
+        'datos': [api.serializar(objeto, definicion, campos, incluir) for objeto in pagina],
+        'siguiente': request.path + pagina.url_siguiente if pagina.siguiente else None,
+    }))
+
+def api_detalle(request, recurso, id):
+    if recurso not in api.RECURSOS:
+        return _api_error(f"Recurso desconocido: {recurso}.", 404)
+    definicion = api.RECURSOS[recurso]
+    try:
+        campos, incluir = api.interpretar(definicion, request.GET)
+    except api.ParametroInvalido as exc:
+        return _api_error(str(exc), 400)
+    objeto = api.consulta(definicion, campos, incluir).filter(id=id).first()
+    if objeto is None:
+        return _api_error("No encontrado.", 404)
+    etag, ultima = api.version([objeto], definicion, campos, incluir)
+    return _api_respuesta(request, etag, ultima, lambda: api.a_json(api.serializar(objeto, definicion, campos, incluir)))
+
+# Histogramas de pacientes/instrumentacion.py en formato de texto de Prometheus
+def metricas(request):
+    return HttpResponse(registro.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,57 @@
+// Autocompletado para los selectores de paciente, médico y cita.
+// Cada contenedor [data-autocompletar] tiene un input oculto con el id y un
+// cuadro de texto; al escribir se consulta el endpoint JSON indicado.
+// Si un resultado trae 'url', elegirlo abre esa página.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('[data-autocompletar]').forEach(function (contenedor) {
+        var url = contenedor.dataset.autocompletar;
+        var oculto = contenedor.querySelector('input[type=hidden]');
+        var texto = contenedor.querySelector('input[type=text]');
+        var lista = contenedor.querySelector('.list-group');
+        var espera = null;
+        var peticion = null;
+
+        function limpiar() {
+            lista.innerHTML = '';
+        }
+
+        function mostrar(resultados) {
+            limpiar();
+            resultados.forEach(function (item) {
+                var opcion = document.createElement('button');
+                opcion.type = 'button';
+                opcion.className = 'list-group-item list-group-item-action';
+                opcion.textContent = item.etiqueta;
+                opcion.addEventListener('click', function () {
+                    if (item.url) {
+                        window.location = item.url;
+                        return;
+                    }
+                    oculto.value = item.id;
+                    texto.value = item.etiqueta;
+                    limpiar();
+                });
+                lista.appendChild(opcion);
+            });
+        }
+
+        texto.addEventListener('input', function () {
+            oculto.value = '';
+            clearTimeout(espera);
+            espera = setTimeout(function () {
+                if (peticion) {
+                    peticion.abort();
+                }
+                peticion = new AbortController();
+                fetch(url + '?q=' + encodeURIComponent(texto.value), {signal: peticion.signal})
+                    .then(function (respuesta) { return respuesta.json(); })
+                    .then(function (datos) { mostrar(datos.resultados); })
+                    .catch(function () {});
+            }, 200);
+        });
+
+        texto.addEventListener('blur', function () {
+            setTimeout(limpiar, 200);
+        });
+    });
+});
@@ -0,0 +1,67 @@
+// Tablero en vivo de citas. Se suscribe al flujo de citas/eventos/ y aplica
+// cada cambio sobre la tabla: agrega o actualiza la fila de la cita, la quita
+// si salió del día/médico mostrado (reprogramada o eliminada) y recarga la
+// página cuando el servidor avisa que se perdieron eventos.
+document.addEventListener('DOMContentLoaded', function () {
+    var tabla = document.getElementById('tablero');
+    if (!tabla || !window.EventSource) {
+        return;
+    }
+    var cuerpo = tabla.querySelector('tbody');
+    var estado = document.getElementById('tablero-estado');
+    var fecha = tabla.dataset.fecha;
+    var medico = tabla.dataset.medico;
+
+    function visible(evento) {
+        return evento.tipo !== 'eliminada' && evento.fecha === fecha &&
+            (!medico || String(evento.medico_id) === medico);
+    }
+
+    function celdas(evento) {
+        return [evento.hora, evento.paciente, evento.medico, evento.estado].map(function (valor) {
+            var celda = document.createElement('td');
+            celda.textContent = valor;
+            return celda;
+        });
+    }
+
+    function aplicar(evento) {
+        var fila = cuerpo.querySelector('tr[data-cita="' + evento.cita + '"]');
+        if (!visible(evento)) {
+            if (fila) {
+                fila.remove();
+            }
+            return;
+        }
+        if (!fila) {
+            fila = document.createElement('tr');
+            fila.dataset.cita = evento.cita;
+        }
+        fila.dataset.hora = evento.hora;
+        fila.replaceChildren.apply(fila, celdas(evento));
+        // Se inserta (o mueve) en orden de hora
+        var siguiente = Array.prototype.find.call(cuerpo.rows, function (otra) {
+            return otra !== fila && otra.dataset.hora > evento.hora;
+        });
+        cuerpo.insertBefore(fila, siguiente || null);
+        fila.classList.add('table-info');
+        setTimeout(function () { fila.classList.remove('table-info'); }, 2000);
+    }
+
+    var fuente = new EventSource(tabla.dataset.eventos);
+    fuente.addEventListener('open', function () {
+        estado.textContent = 'En vivo';
+        estado.className = 'badge bg-success';
+    });
+    fuente.addEventListener('error', function () {
+        estado.textContent = 'Reconectando…';
+        estado.className = 'badge bg-warning';
+    });
+    fuente.addEventListener('cita', function (mensaje) {
+        aplicar(JSON.parse(mensaje.data));
+    });
+    fuente.addEventListener('recargar', function () {
+        fuente.close();
+        window.location.reload();
+    });
+});